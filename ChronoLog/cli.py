@@ -37,7 +37,9 @@ def check_env():
         return False
     
     load_dotenv()
-    required_vars = ["DB_CONNECTION_STRING"]
+    # the embedded SQLite backend needs no connection string
+    sqlite = (os.getenv("STORAGE_BACKEND") or "mssql").strip().lower() == "sqlite"
+    required_vars = [] if sqlite else ["DB_CONNECTION_STRING"]
     missing = [var for var in required_vars if not os.getenv(var)]
     
     if missing:
@@ -50,6 +52,13 @@ def check_env():
 def check_db_connection():
     """Check database connection."""
     try:
+        from config import STORAGE_BACKEND
+        if STORAGE_BACKEND == "sqlite":
+            from sqlite_backend import SQLiteBackend
+            backend = SQLiteBackend()
+            backend.connect()
+            print(f"[OK] SQLite database opened: {backend.path}")
+            return True
         from db import SQLConnection, DatabaseConnectionError
         print("   Attempting to connect to database...")
         # This will also try to create the DB if it doesn't exist (based on src/db.py logic)
@@ -81,6 +90,10 @@ def check_input_files():
 def check_db_initialized():
     """Check if database schema is initialized."""
     try:
+        from config import STORAGE_BACKEND
+        if STORAGE_BACKEND == "sqlite":
+            # SQLiteBackend applies database/sqlite/schema.sql whenever it opens the file
+            return True
         from db import SQLConnection
         conn = SQLConnection()
         # Try to select from a table that should exist
@@ -256,6 +269,156 @@ def cmd_test(args):
         sys.exit(1)
     print("\n[OK] All tests passed.")
 
+def cmd_template_report(args):
+    """Report how much typed placeholders reduce the number of message templates."""
+    from config import INPUT_FILE_PATH, MASK_TYPES
+    from masking import template_report
+
+    input_path = Path(getattr(args, 'input', None) or INPUT_FILE_PATH)
+    if not input_path.exists():
+        print(f"[FAILED] Input file not found: {input_path}")
+        return None
+
+    types = MASK_TYPES
+    if getattr(args, 'types', None):
+        types = [t.strip() for t in args.types.split(",") if t.strip()]
+    top = getattr(args, 'top', None) or 10
+
+    print(f"Analyzing templates in {input_path}...")
+    with open(input_path, "r", encoding="utf-8", errors="replace") as f:
+        report = template_report(f, types=types, top=top)
+
+    print(f"Lines:                      {report['lines']}")
+    print(f"Message lines:              {report['message_lines']}")
+    print(f"Templates ({{num}} only):     {report['templates_num_only']}")
+    print(f"Templates (typed):          {report['templates_typed']}")
+    print(f"Reduction:                  {report['reduction']:.1%}")
+    if report['placeholders']:
+        print("Placeholders: " + ", ".join(f"{{{t}}} x{n}" for t, n in report['placeholders'].items()))
+    print(f"\nTop {len(report['top_templates'])} templates:")
+    for template, count in report['top_templates']:
+        print(f"  {count:>8}  {template}")
+    return report
+
+def cmd_status(args):
+    """Show pipeline throughput, latencies and cache hit rate from the metrics the processes publish."""
+    import time
+    from config import METRICS_DIR
+    from metrics import collect, histogram_mean
+
+    interval = getattr(args, 'interval', None) or 1.0
+    before = collect(METRICS_DIR)
+    time.sleep(interval)
+    after = collect(METRICS_DIR)
+    if not after["processes"] and not after["counters"]:
+        print(f"[FAILED] No pipeline metrics found in {METRICS_DIR}. Is the processor running?")
+        return None
+
+    counters, gauges = after["counters"], after["gauges"]
+
+    def rate(name):
+        return max(0, counters.get(name, 0) - before["counters"].get(name, 0)) / interval
+
+    hits = counters.get("template_cache_hits_total", 0)
+    lookups = hits + counters.get("template_cache_misses_total", 0)
+    processes = ", ".join(f"{role} x{n}" for role, n in sorted(after["processes"].items())) or "none running"
+    print(f"Processes:            {processes}")
+    print(f"Lines read:           {counters.get('lines_read_total', 0)} ({rate('lines_read_total'):.0f}/s)")
+    print(f"Rows inserted:        {counters.get('rows_inserted_total', 0)} ({rate('rows_inserted_total'):.0f}/s)")
+    print(f"Parse time/chunk:     {histogram_mean(after['histograms'].get('parse_seconds')) * 1000:.1f} ms avg")
+    print(f"Insert latency:       {histogram_mean(after['histograms'].get('insert_seconds')) * 1000:.1f} ms avg")
+    print(f"Queue depth:          {gauges.get('queue_depth', 0)}")
+    print(f"Chunks in flight:     {gauges.get('chunks_in_flight', 0)}")
+    print(f"Spilled segments:     {gauges.get('spilled_segments', 0)}")
+    print(f"Template cache:       {hits / lookups if lookups else 0.0:.1%} hit rate")
+    print(f"Dropped chunks:       {counters.get('dropped_chunks_total', 0)}")
+    print(f"Failed flushes:       {counters.get('flush_failures_total', 0)}")
+    return after
+
+def cmd_retention(args):
+    """Purge events older than the retention period and pre-create the coming partitions."""
+    from config import RETENTION_DAYS, STORAGE_BACKEND
+    from storage import create_storage
+
+    days = getattr(args, 'days', None)
+    days = RETENTION_DAYS if days is None else days
+    if days < 0:
+        print("[FAILED] --days must be 0 (keep everything) or more")
+        return None
+    try:
+        purged = create_storage().purge_expired(days)
+    except Exception as e:
+        print(f"[FAILED] Retention job failed: {e}")
+        return None
+
+    if not days:
+        print(f"[OK] Retention disabled (RETENTION_DAYS=0); {STORAGE_BACKEND} storage maintained")
+        return purged
+    for item in purged:
+        print(f"  purged {item['start'] or '...'} .. {item['end']}: {item['rows']} rows")
+    total = sum(item["rows"] for item in purged)
+    print(f"[OK] Kept the last {days} days, purged {len(purged)} range(s) with {total} rows")
+    return purged
+
+def cmd_bench(args):
+    """Benchmark the pipeline stages on a deterministic synthetic log and write a JSON report."""
+    import json
+    import tempfile
+    from benchmark import Benchmark, generate_log, build_report, STAGES
+    from config import STORAGE_BACKEND
+
+    stages = [s.strip() for s in (getattr(args, 'stages', None) or ",".join(STAGES)).split(",") if s.strip()]
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        print(f"[FAILED] Unknown stages {unknown}, expected some of {list(STAGES)}")
+        return None
+    lines = getattr(args, 'lines', None)
+    size_mb = getattr(args, 'size_mb', None)
+    if not lines and not size_mb:
+        lines = 200000
+    settings = {
+        "lines": lines,
+        "size_mb": size_mb,
+        "error_ratio": getattr(args, 'error_ratio', 0.05),
+        "warning_ratio": getattr(args, 'warning_ratio', 0.05),
+        "templates": getattr(args, 'templates', 100),
+        "variables": getattr(args, 'variables', 2),
+        "seed": getattr(args, 'seed', 42),
+        "chunk_bytes": getattr(args, 'chunk_kb', 1024) * 1024,
+        "batch_rows": getattr(args, 'batch_rows', 5000),
+        "sink": getattr(args, 'sink', 'null'),
+        "backend": getattr(args, 'backend', None) or STORAGE_BACKEND,
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        log_path = getattr(args, 'log', None) or str(Path(tmp) / "bench.log")
+        written, size = generate_log(
+            log_path, lines=lines, size_bytes=int(size_mb * 1024 * 1024) if size_mb else None,
+            error_ratio=settings["error_ratio"], warning_ratio=settings["warning_ratio"],
+            templates=settings["templates"], variables=settings["variables"], seed=settings["seed"])
+        settings.update({"generated_lines": written, "generated_bytes": size})
+        print(f"Generated {written} lines ({size / 1e6:.1f} MB), running stages: {', '.join(stages)}")
+
+        storage_options = {}
+        if settings["backend"] == "sqlite":
+            # a fresh database per run unless one is given, so earlier runs do not skew the inserts
+            storage_options["path"] = getattr(args, 'sqlite_path', None) or str(Path(tmp) / "bench.db")
+        bench = Benchmark(log_path, chunk_bytes=settings["chunk_bytes"], batch_rows=settings["batch_rows"],
+                          sink=settings["sink"], backend=settings["backend"], storage_options=storage_options)
+        report = build_report(settings, bench.run(stages))
+
+    for stage, result in report["stages"].items():
+        if "skipped" in result:
+            print(f"{stage:<8} skipped ({result['skipped']})")
+            continue
+        print(f"{stage:<8} {result['lines_per_sec']:>12} lines/s {result['rows_per_sec']:>12} rows/s "
+              f"p50 {result['p50_ms']} ms  p99 {result['p99_ms']} ms  peak RSS {result['peak_rss_mb']} MB")
+    output = getattr(args, 'output', None) or "bench_report.json"
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"[OK] Report written to {output}")
+    return report
+
 def cmd_auto(args):
     """Automate setup and run."""
     print("Starting automated setup and run...\n")
@@ -307,6 +470,10 @@ def interactive_mode():
         ("run-api", "Run the API server", cmd_run_api),
         ("kill-port", "Kill process on port 5000", cmd_kill_port),
         ("test", "Run all tests", cmd_test),
+        ("template-report", "Report template count reduction", cmd_template_report),
+        ("status", "Show pipeline metrics", cmd_status),
+        ("bench", "Benchmark the pipeline on a synthetic log", cmd_bench),
+        ("retention", "Purge events older than RETENTION_DAYS", cmd_retention),
         ("auto", "Automate setup and run processor", cmd_auto)
     ]
 
@@ -324,7 +491,7 @@ def interactive_mode():
         print(" 0. Exit")
         
         try:
-            choice = input("\nEnter choice [0-8]: ").strip()
+            choice = input(f"\nEnter choice [0-{len(options)}]: ").strip()
             
             if choice == "0":
                 print("Goodbye!")
@@ -375,7 +542,41 @@ def main():
 
     # Test command
     subparsers.add_parser("test", help="Run all tests")
+
+    # Template report command
+    tr_parser = subparsers.add_parser("template-report", help="Report template count reduction from typed masking")
+    tr_parser.add_argument("--input", help="Log file to analyze (default: INPUT_FILE_PATH)")
+    tr_parser.add_argument("--types", help="Comma-separated mask types (default: MASK_TYPES)")
+    tr_parser.add_argument("--top", type=int, default=10, help="Number of most frequent templates to show")
+
+    # Status command
+    st_parser = subparsers.add_parser("status", help="Show pipeline metrics (throughput, latency, cache hit rate)")
+    st_parser.add_argument("--interval", type=float, default=1.0, help="Seconds between the two samples used for rates")
+
+    # Bench command
+    bn_parser = subparsers.add_parser("bench", help="Benchmark reader, parser, writer, sink and end-to-end throughput")
+    bn_parser.add_argument("--lines", type=int, help="Lines to generate (default 200000 unless --size-mb is given)")
+    bn_parser.add_argument("--size-mb", type=float, help="Generate a log of this size instead")
+    bn_parser.add_argument("--error-ratio", type=float, default=0.05, help="Share of ERROR lines")
+    bn_parser.add_argument("--warning-ratio", type=float, default=0.05, help="Share of WARNING lines")
+    bn_parser.add_argument("--templates", type=int, default=100, help="Distinct ERROR/WARNING message templates")
+    bn_parser.add_argument("--variables", type=int, default=2, help="Numeric values per message / key=value pairs per INFO line")
+    bn_parser.add_argument("--seed", type=int, default=42, help="Random seed of the generator")
+    bn_parser.add_argument("--stages", help="Comma-separated stages (default: reader,parser,writer,sink,e2e)")
+    bn_parser.add_argument("--sink", choices=["null", "db"], default="null",
+                           help="null discards rows; db inserts into the storage backend (bench rows are deleted afterwards)")
+    bn_parser.add_argument("--backend", choices=["mssql", "sqlite"],
+                           help="Storage backend of --sink db (default: STORAGE_BACKEND)")
+    bn_parser.add_argument("--sqlite-path", help="SQLite database of --backend sqlite (default: a temporary file)")
+    bn_parser.add_argument("--chunk-kb", type=int, default=1024, help="Byte range size of the reader/parser stages")
+    bn_parser.add_argument("--batch-rows", type=int, default=5000, help="Rows per writer/sink flush")
+    bn_parser.add_argument("--log", help="Write the synthetic log to this path instead of a temporary file")
+    bn_parser.add_argument("--output", default="bench_report.json", help="JSON report path")
     
+    # Retention command
+    rt_parser = subparsers.add_parser("retention", help="Purge expired events (whole partitions on SQL Server)")
+    rt_parser.add_argument("--days", type=int, help="Days of events to keep (default: RETENTION_DAYS, 0 keeps everything)")
+
     # Auto command
     subparsers.add_parser("auto", help="Automate setup and run processor")
     
@@ -395,6 +596,14 @@ def main():
         cmd_kill_port(args)
     elif args.command == "test":
         cmd_test(args)
+    elif args.command == "template-report":
+        cmd_template_report(args)
+    elif args.command == "status":
+        cmd_status(args)
+    elif args.command == "bench":
+        cmd_bench(args)
+    elif args.command == "retention":
+        cmd_retention(args)
     elif args.command == "auto":
         cmd_auto(args)
 
@@ -56,6 +56,112 @@ BEGIN
 END
 GO
 
+-- =============================================
+-- Table Type: TimelineEventTableType
+-- Typed rows for table-valued parameter bulk inserts
+-- (sp_BulkInsertTimelineEventsTvp)
+-- =============================================
+IF TYPE_ID(N'[dbo].[TimelineEventTableType]') IS NULL
+BEGIN
+    CREATE TYPE [dbo].[TimelineEventTableType] AS TABLE (
+        [EventTime] DATETIME2 NOT NULL,
+        [EventType] NVARCHAR(50) NOT NULL,
+        [MessageId] INT NULL,
+        [MessageValues] NVARCHAR(500) NULL,
+        [Value] DECIMAL(18,2) NULL
+    );
+
+    PRINT 'Type TimelineEventTableType created successfully.';
+END
+GO
+
+-- =============================================
+-- Table: EventRollupMinute
+-- Per-minute aggregates per event type, maintained by the
+-- writers in the same transaction as the inserted rows
+-- (sp_MergeEventRollups). Timeseries read from here.
+-- =============================================
+IF NOT EXISTS (SELECT * FROM sys.objects WHERE object_id = OBJECT_ID(N'[dbo].[EventRollupMinute]') AND type in (N'U'))
+BEGIN
+    CREATE TABLE [dbo].[EventRollupMinute] (
+        [BucketStart] DATETIME2(0) NOT NULL,
+        [EventType] NVARCHAR(50) NOT NULL,
+        [EventCount] BIGINT NOT NULL,
+        [ValueCount] BIGINT NOT NULL,
+        [ValueSum] DECIMAL(38,2) NULL,
+        [ValueMin] DECIMAL(18,2) NULL,
+        [ValueMax] DECIMAL(18,2) NULL,
+
+        CONSTRAINT [PK_EventRollupMinute] PRIMARY KEY CLUSTERED ([EventType], [BucketStart])
+    );
+
+    PRINT 'Table EventRollupMinute created successfully.';
+END
+ELSE
+BEGIN
+    PRINT 'Table EventRollupMinute already exists.';
+END
+GO
+
+-- =============================================
+-- Table: EventRollupTotal
+-- All-time aggregates per event type (one row per type),
+-- so the dashboard summary does not depend on the table size
+-- =============================================
+IF NOT EXISTS (SELECT * FROM sys.objects WHERE object_id = OBJECT_ID(N'[dbo].[EventRollupTotal]') AND type in (N'U'))
+BEGIN
+    CREATE TABLE [dbo].[EventRollupTotal] (
+        [EventType] NVARCHAR(50) NOT NULL PRIMARY KEY CLUSTERED,
+        [EventCount] BIGINT NOT NULL,
+        [ValueCount] BIGINT NOT NULL,
+        [ValueSum] DECIMAL(38,2) NULL,
+        [ValueMin] DECIMAL(18,2) NULL,
+        [ValueMax] DECIMAL(18,2) NULL
+    );
+
+    PRINT 'Table EventRollupTotal created successfully.';
+END
+ELSE
+BEGIN
+    PRINT 'Table EventRollupTotal already exists.';
+END
+GO
+
+-- =============================================
+-- Table: IngestCheckpoints
+-- Input byte ranges whose rows are committed, written by the
+-- bulk insert procedures in the same transaction as the rows
+-- (sp_RecordIngestCheckpoints). A restart resumes from the
+-- checkpoint file plus these ranges; the ranges the file
+-- covers are pruned after each save.
+-- FileId is "device:inode"; Generation counts truncations of
+-- a tailed file within one run.
+-- =============================================
+IF NOT EXISTS (SELECT * FROM sys.objects WHERE object_id = OBJECT_ID(N'[dbo].[IngestCheckpoints]') AND type in (N'U'))
+BEGIN
+    CREATE TABLE [dbo].[IngestCheckpoints] (
+        [CheckpointId] BIGINT IDENTITY(1,1) NOT NULL,
+        [FileId] NVARCHAR(100) NOT NULL,
+        [Generation] INT NOT NULL,
+        [StartOffset] BIGINT NOT NULL,
+        [EndOffset] BIGINT NOT NULL,
+        [CommittedAt] DATETIME2 DEFAULT SYSUTCDATETIME(),
+
+        CONSTRAINT [PK_IngestCheckpoints] PRIMARY KEY CLUSTERED ([CheckpointId])
+    );
+
+    CREATE NONCLUSTERED INDEX [IX_IngestCheckpoints_File]
+    ON [dbo].[IngestCheckpoints] ([FileId], [Generation], [StartOffset])
+    INCLUDE ([EndOffset]);
+
+    PRINT 'Table IngestCheckpoints created successfully.';
+END
+ELSE
+BEGIN
+    PRINT 'Table IngestCheckpoints already exists.';
+END
+GO
+
 -- =============================================
 -- Indexes for Performance Optimization
 -- =============================================
@@ -60,9 +60,282 @@ GO
 PRINT 'Stored procedure sp_GetTimelinePage created successfully.';
 GO
 
+-- =============================================
+-- Stored Procedure: sp_GetTimelineSeek
+-- Keyset (cursor) pagination: seeks on EventId instead of
+-- counting and skipping rows, so every page costs the same
+-- Parameters:
+--   @BeforeId: return events older than this EventId (next page)
+--   @AfterId: return events newer than this EventId (previous page,
+--             and the /api/stream reads); committed rows only
+--             neither: the newest events
+--   @EntriesPerPage: Number of entries per page
+--   @EventType: optional filter (seeks IX_TimelineEvents_EventType
+--               on EventType, EventId: the clustered key before
+--               05_partitioning.sql, an explicit key after it)
+--   @IncludeTotal: 1 adds the event count from EventRollupTotal
+-- Rows are returned newest first
+-- =============================================
+IF EXISTS (SELECT * FROM sys.objects WHERE object_id = OBJECT_ID(N'[dbo].[sp_GetTimelineSeek]') AND type in (N'P', N'PC'))
+    DROP PROCEDURE [dbo].[sp_GetTimelineSeek];
+GO
+
+CREATE PROCEDURE [dbo].[sp_GetTimelineSeek]
+    @BeforeId BIGINT = NULL,
+    @AfterId BIGINT = NULL,
+    @EntriesPerPage INT = 30,
+    @EventType NVARCHAR(50) = NULL,
+    @IncludeTotal BIT = 0
+AS
+BEGIN
+    SET NOCOUNT ON;
+    
+    -- Validate parameters
+    IF @EntriesPerPage < 1 SET @EntriesPerPage = 30;
+    IF @EntriesPerPage > 1000 SET @EntriesPerPage = 1000; -- Max limit
+    
+    DECLARE @TotalCount BIGINT = NULL;
+    
+    -- Constant-time count from the rollups instead of COUNT(*) over the table
+    IF @IncludeTotal = 1
+        SELECT @TotalCount = ISNULL(SUM([EventCount]), 0)
+        FROM [dbo].[EventRollupTotal] WITH (NOLOCK)
+        WHERE (@EventType IS NULL OR [EventType] = @EventType);
+    
+    IF @AfterId IS NOT NULL
+    BEGIN
+        -- Walk forward from the cursor, then return the page newest first.
+        -- No NOLOCK here: the stream must not push rows a writer may still roll back
+        SELECT 
+            te.[EventId],
+            te.[EventTime] as [time],
+            te.[EventType] as [event],
+            te.[MessageId] as [msg_id],
+            te.[MessageValues] as [msg_values],
+            te.[Value] as [value],
+            m.[Template] as [template],
+            @TotalCount as [TotalCount]
+        FROM (
+            SELECT TOP (@EntriesPerPage) *
+            FROM [dbo].[TimelineEvents]
+            WHERE [EventId] > @AfterId
+                AND (@EventType IS NULL OR [EventType] = @EventType)
+            ORDER BY [EventId] ASC
+        ) te
+        LEFT JOIN [dbo].[Messages] m ON te.[MessageId] = m.[MessageId]
+        ORDER BY te.[EventId] DESC
+        OPTION (RECOMPILE); -- compiles a plain seek for the given filter
+        RETURN;
+    END
+    
+    SELECT TOP (@EntriesPerPage)
+        te.[EventId],
+        te.[EventTime] as [time],
+        te.[EventType] as [event],
+        te.[MessageId] as [msg_id],
+        te.[MessageValues] as [msg_values],
+        te.[Value] as [value],
+        m.[Template] as [template],
+        @TotalCount as [TotalCount]
+    FROM [dbo].[TimelineEvents] te WITH (NOLOCK)
+    LEFT JOIN [dbo].[Messages] m WITH (NOLOCK) ON te.[MessageId] = m.[MessageId]
+    WHERE (@BeforeId IS NULL OR te.[EventId] < @BeforeId)
+        AND (@EventType IS NULL OR te.[EventType] = @EventType)
+    ORDER BY te.[EventId] DESC
+    OPTION (RECOMPILE); -- compiles a plain seek for the given filter
+END
+GO
+
+PRINT 'Stored procedure sp_GetTimelineSeek created successfully.';
+GO
+
+-- =============================================
+-- Stored Procedure: sp_MergeEventRollups
+-- Adds per-minute aggregates to EventRollupMinute and
+-- EventRollupTotal. Called by the insert procedures (and by
+-- the writers after executemany) inside the insert transaction.
+-- Parameters:
+--   @RollupsJson: JSON array of {bucket, event, count,
+--                 value_count, value_sum, value_min, value_max}
+-- =============================================
+IF EXISTS (SELECT * FROM sys.objects WHERE object_id = OBJECT_ID(N'[dbo].[sp_MergeEventRollups]') AND type in (N'P', N'PC'))
+    DROP PROCEDURE [dbo].[sp_MergeEventRollups];
+GO
+
+CREATE PROCEDURE [dbo].[sp_MergeEventRollups]
+    @RollupsJson NVARCHAR(MAX)
+AS
+BEGIN
+    SET NOCOUNT ON;
+    SET XACT_ABORT ON;
+    
+    DECLARE @Rollups TABLE (
+        [BucketStart] DATETIME2(0) NOT NULL,
+        [EventType] NVARCHAR(50) NOT NULL,
+        [EventCount] BIGINT NOT NULL,
+        [ValueCount] BIGINT NOT NULL,
+        [ValueSum] DECIMAL(38,2) NULL,
+        [ValueMin] DECIMAL(18,2) NULL,
+        [ValueMax] DECIMAL(18,2) NULL,
+        PRIMARY KEY ([EventType], [BucketStart])
+    );
+    
+    INSERT INTO @Rollups
+    SELECT 
+        CAST([bucket] AS DATETIME2(0)),
+        [event],
+        SUM([count]),
+        SUM([value_count]),
+        SUM(CAST([value_sum] AS DECIMAL(38,2))),
+        MIN(CAST([value_min] AS DECIMAL(18,2))),
+        MAX(CAST([value_max] AS DECIMAL(18,2)))
+    FROM OPENJSON(@RollupsJson)
+    WITH (
+        [bucket] NVARCHAR(50),
+        [event] NVARCHAR(50),
+        [count] BIGINT,
+        [value_count] BIGINT,
+        [value_sum] NVARCHAR(50),
+        [value_min] NVARCHAR(50),
+        [value_max] NVARCHAR(50)
+    )
+    GROUP BY CAST([bucket] AS DATETIME2(0)), [event];
+    
+    -- HOLDLOCK keeps two writers from inserting the same new bucket concurrently
+    MERGE [dbo].[EventRollupMinute] WITH (HOLDLOCK) AS t
+    USING @Rollups AS s
+        ON t.[EventType] = s.[EventType] AND t.[BucketStart] = s.[BucketStart]
+    WHEN MATCHED THEN UPDATE SET
+        t.[EventCount] = t.[EventCount] + s.[EventCount],
+        t.[ValueCount] = t.[ValueCount] + s.[ValueCount],
+        t.[ValueSum] = CASE WHEN s.[ValueSum] IS NULL THEN t.[ValueSum] ELSE ISNULL(t.[ValueSum], 0) + s.[ValueSum] END,
+        t.[ValueMin] = CASE WHEN s.[ValueMin] IS NOT NULL AND (t.[ValueMin] IS NULL OR s.[ValueMin] < t.[ValueMin]) THEN s.[ValueMin] ELSE t.[ValueMin] END,
+        t.[ValueMax] = CASE WHEN s.[ValueMax] IS NOT NULL AND (t.[ValueMax] IS NULL OR s.[ValueMax] > t.[ValueMax]) THEN s.[ValueMax] ELSE t.[ValueMax] END
+    WHEN NOT MATCHED THEN
+        INSERT ([BucketStart], [EventType], [EventCount], [ValueCount], [ValueSum], [ValueMin], [ValueMax])
+        VALUES (s.[BucketStart], s.[EventType], s.[EventCount], s.[ValueCount], s.[ValueSum], s.[ValueMin], s.[ValueMax]);
+    
+    MERGE [dbo].[EventRollupTotal] WITH (HOLDLOCK) AS t
+    USING (
+        SELECT 
+            [EventType],
+            SUM([EventCount]) as [EventCount],
+            SUM([ValueCount]) as [ValueCount],
+            SUM([ValueSum]) as [ValueSum],
+            MIN([ValueMin]) as [ValueMin],
+            MAX([ValueMax]) as [ValueMax]
+        FROM @Rollups
+        GROUP BY [EventType]
+    ) AS s
+        ON t.[EventType] = s.[EventType]
+    WHEN MATCHED THEN UPDATE SET
+        t.[EventCount] = t.[EventCount] + s.[EventCount],
+        t.[ValueCount] = t.[ValueCount] + s.[ValueCount],
+        t.[ValueSum] = CASE WHEN s.[ValueSum] IS NULL THEN t.[ValueSum] ELSE ISNULL(t.[ValueSum], 0) + s.[ValueSum] END,
+        t.[ValueMin] = CASE WHEN s.[ValueMin] IS NOT NULL AND (t.[ValueMin] IS NULL OR s.[ValueMin] < t.[ValueMin]) THEN s.[ValueMin] ELSE t.[ValueMin] END,
+        t.[ValueMax] = CASE WHEN s.[ValueMax] IS NOT NULL AND (t.[ValueMax] IS NULL OR s.[ValueMax] > t.[ValueMax]) THEN s.[ValueMax] ELSE t.[ValueMax] END
+    WHEN NOT MATCHED THEN
+        INSERT ([EventType], [EventCount], [ValueCount], [ValueSum], [ValueMin], [ValueMax])
+        VALUES (s.[EventType], s.[EventCount], s.[ValueCount], s.[ValueSum], s.[ValueMin], s.[ValueMax]);
+END
+GO
+
+PRINT 'Stored procedure sp_MergeEventRollups created successfully.';
+GO
+
+-- =============================================
+-- Stored Procedure: sp_RecordIngestCheckpoints
+-- Records the input byte ranges completed by an insert.
+-- Called by the insert procedures (and by the writers after
+-- executemany) inside the insert transaction, so a range is
+-- recorded if and only if its rows are committed.
+-- Parameters:
+--   @CheckpointsJson: JSON array of {file, generation, start, end}
+-- =============================================
+IF EXISTS (SELECT * FROM sys.objects WHERE object_id = OBJECT_ID(N'[dbo].[sp_RecordIngestCheckpoints]') AND type in (N'P', N'PC'))
+    DROP PROCEDURE [dbo].[sp_RecordIngestCheckpoints];
+GO
+
+CREATE PROCEDURE [dbo].[sp_RecordIngestCheckpoints]
+    @CheckpointsJson NVARCHAR(MAX)
+AS
+BEGIN
+    SET NOCOUNT ON;
+    SET XACT_ABORT ON;
+    
+    INSERT INTO [dbo].[IngestCheckpoints] ([FileId], [Generation], [StartOffset], [EndOffset])
+    SELECT [file], [generation], [start], [end]
+    FROM OPENJSON(@CheckpointsJson)
+    WITH (
+        [file] NVARCHAR(100),
+        [generation] INT,
+        [start] BIGINT,
+        [end] BIGINT
+    );
+END
+GO
+
+PRINT 'Stored procedure sp_RecordIngestCheckpoints created successfully.';
+GO
+
+-- =============================================
+-- Stored Procedure: sp_RebuildEventRollups
+-- Recomputes the rollup tables from TimelineEvents
+-- (after upgrading an existing database or deleting events)
+-- =============================================
+IF EXISTS (SELECT * FROM sys.objects WHERE object_id = OBJECT_ID(N'[dbo].[sp_RebuildEventRollups]') AND type in (N'P', N'PC'))
+    DROP PROCEDURE [dbo].[sp_RebuildEventRollups];
+GO
+
+CREATE PROCEDURE [dbo].[sp_RebuildEventRollups]
+AS
+BEGIN
+    SET NOCOUNT ON;
+    SET XACT_ABORT ON;
+    
+    BEGIN TRANSACTION;
+    
+    DELETE FROM [dbo].[EventRollupMinute];
+    DELETE FROM [dbo].[EventRollupTotal];
+    
+    -- TABLOCK + HOLDLOCK: no rows can be inserted between the scan and the commit
+    INSERT INTO [dbo].[EventRollupMinute]
+        ([BucketStart], [EventType], [EventCount], [ValueCount], [ValueSum], [ValueMin], [ValueMax])
+    SELECT 
+        DATEADD(MINUTE, DATEDIFF(MINUTE, '2000-01-01', [EventTime]), CAST('2000-01-01' AS DATETIME2(0))),
+        [EventType],
+        COUNT(*),
+        COUNT([Value]),
+        SUM(CAST([Value] AS DECIMAL(38,2))),
+        MIN([Value]),
+        MAX([Value])
+    FROM [dbo].[TimelineEvents] WITH (TABLOCK, HOLDLOCK)
+    GROUP BY DATEADD(MINUTE, DATEDIFF(MINUTE, '2000-01-01', [EventTime]), CAST('2000-01-01' AS DATETIME2(0))), [EventType];
+    
+    INSERT INTO [dbo].[EventRollupTotal]
+        ([EventType], [EventCount], [ValueCount], [ValueSum], [ValueMin], [ValueMax])
+    SELECT 
+        [EventType],
+        SUM([EventCount]),
+        SUM([ValueCount]),
+        SUM([ValueSum]),
+        MIN([ValueMin]),
+        MAX([ValueMax])
+    FROM [dbo].[EventRollupMinute]
+    GROUP BY [EventType];
+    
+    COMMIT TRANSACTION;
+END
+GO
+
+PRINT 'Stored procedure sp_RebuildEventRollups created successfully.';
+GO
+
 -- =============================================
 -- Stored Procedure: sp_GetSummary
 -- Returns summary statistics for the dashboard
+-- Reads the per-type totals in EventRollupTotal,
+-- so its cost does not grow with TimelineEvents
 -- =============================================
 IF EXISTS (SELECT * FROM sys.objects WHERE object_id = OBJECT_ID(N'[dbo].[sp_GetSummary]') AND type in (N'P', N'PC'))
     DROP PROCEDURE [dbo].[sp_GetSummary];
@@ -73,38 +346,27 @@ AS
 BEGIN
     SET NOCOUNT ON;
     
-    DECLARE @ErrorCount INT;
-    DECLARE @WarningCount INT;
+    DECLARE @ErrorCount BIGINT;
+    DECLARE @WarningCount BIGINT;
     DECLARE @TimelineCount BIGINT;
     DECLARE @UniqueMessages INT;
-    DECLARE @LatencyCount INT;
+    DECLARE @LatencyCount BIGINT;
     DECLARE @LatencyAvg DECIMAL(18,2);
     
-    -- Count errors
-    SELECT @ErrorCount = COUNT(*) 
-    FROM [dbo].[TimelineEvents] WITH (NOLOCK)
-    WHERE [EventType] = 'error';
-    
-    -- Count warnings
-    SELECT @WarningCount = COUNT(*) 
-    FROM [dbo].[TimelineEvents] WITH (NOLOCK)
-    WHERE [EventType] = 'warning';
-    
-    -- Total timeline count
-    SELECT @TimelineCount = COUNT(*) 
-    FROM [dbo].[TimelineEvents] WITH (NOLOCK);
+    -- Event counts and latency metrics from the rollup totals (one row per event type)
+    SELECT 
+        @ErrorCount = ISNULL(SUM(CASE WHEN [EventType] = 'error' THEN [EventCount] END), 0),
+        @WarningCount = ISNULL(SUM(CASE WHEN [EventType] = 'warning' THEN [EventCount] END), 0),
+        @TimelineCount = ISNULL(SUM([EventCount]), 0),
+        @LatencyCount = ISNULL(SUM(CASE WHEN [EventType] = 'latency' THEN [ValueCount] END), 0),
+        @LatencyAvg = SUM(CASE WHEN [EventType] = 'latency' THEN [ValueSum] END)
+            / NULLIF(SUM(CASE WHEN [EventType] = 'latency' THEN [ValueCount] END), 0)
+    FROM [dbo].[EventRollupTotal] WITH (NOLOCK);
     
     -- Unique messages count
     SELECT @UniqueMessages = COUNT(*) 
     FROM [dbo].[Messages] WITH (NOLOCK);
     
-    -- Latency metrics
-    SELECT 
-        @LatencyCount = COUNT(*),
-        @LatencyAvg = AVG([Value])
-    FROM [dbo].[TimelineEvents] WITH (NOLOCK)
-    WHERE [EventType] = 'latency' AND [Value] IS NOT NULL;
-    
     -- Return summary in JSON-like format
     SELECT 
         @ErrorCount as [error_count],
@@ -122,6 +384,9 @@ GO
 -- =============================================
 -- Stored Procedure: sp_GetTimeseries
 -- Returns timeseries data for a specific metric
+-- Event type metrics (latency, tracked variables) return the
+-- per-minute average from EventRollupMinute; msg_X metrics
+-- read the individual events
 -- Parameters:
 --   @Metric: Metric name ('latency', 'msg_0', 'msg_1', etc.)
 --   @Limit: Maximum number of points to return
@@ -155,11 +420,11 @@ BEGIN
     IF LOWER(@Metric) = 'latency'
     BEGIN
         SELECT TOP (@Limit)
-            [EventTime] as [time],
-            [Value] as [value]
-        FROM [dbo].[TimelineEvents] WITH (NOLOCK)
-        WHERE [EventType] = 'latency' AND [Value] IS NOT NULL
-        ORDER BY [EventId] DESC;
+            [BucketStart] as [time],
+            CAST([ValueSum] / [ValueCount] AS DECIMAL(18,2)) as [value]
+        FROM [dbo].[EventRollupMinute] WITH (NOLOCK)
+        WHERE [EventType] = 'latency' AND [ValueCount] > 0
+        ORDER BY [BucketStart] DESC;
         RETURN;
     END
     
@@ -177,19 +442,141 @@ BEGIN
         RETURN;
     END
     
-    -- Otherwise match by event type, return Value field
+    -- Otherwise match by event type, return the per-minute average Value
     SELECT TOP (@Limit)
-        [EventTime] as [time],
-        [Value] as [value]
-    FROM [dbo].[TimelineEvents] WITH (NOLOCK)
-    WHERE [EventType] = @Metric AND [Value] IS NOT NULL
-    ORDER BY [EventId] DESC;
+        [BucketStart] as [time],
+        CAST([ValueSum] / [ValueCount] AS DECIMAL(18,2)) as [value]
+    FROM [dbo].[EventRollupMinute] WITH (NOLOCK)
+    WHERE [EventType] = @Metric AND [ValueCount] > 0
+    ORDER BY [BucketStart] DESC;
 END
 GO
 
 PRINT 'Stored procedure sp_GetTimeseries created successfully.';
 GO
 
+-- =============================================
+-- Stored Procedure: sp_GetTimeseriesBuckets
+-- Aggregates a metric over a time range into at most @Points
+-- equal-width buckets (avg, min, max, count per bucket),
+-- so any range returns a bounded result
+-- Parameters:
+--   @Metric: Metric name ('latency', 'msg_0', 'msg_1', etc.)
+--   @From, @To: time range [@From, @To); NULL = first/last point
+--   @Points: maximum number of buckets
+-- Event type metrics aggregate EventRollupMinute (buckets are
+-- whole minutes); msg_X metrics aggregate the individual events
+-- =============================================
+IF EXISTS (SELECT * FROM sys.objects WHERE object_id = OBJECT_ID(N'[dbo].[sp_GetTimeseriesBuckets]') AND type in (N'P', N'PC'))
+    DROP PROCEDURE [dbo].[sp_GetTimeseriesBuckets];
+GO
+
+CREATE PROCEDURE [dbo].[sp_GetTimeseriesBuckets]
+    @Metric NVARCHAR(50) = 'latency',
+    @From DATETIME2 = NULL,
+    @To DATETIME2 = NULL,
+    @Points INT = 500
+AS
+BEGIN
+    SET NOCOUNT ON;
+    
+    -- Validate points
+    IF @Points < 1 SET @Points = 500;
+    IF @Points > 5000 SET @Points = 5000;
+    
+    DECLARE @MessageId INT = NULL;
+    
+    -- Check if metric is msg_{id} pattern
+    IF @Metric LIKE 'msg[_]%'
+    BEGIN
+        DECLARE @IdString NVARCHAR(50) = SUBSTRING(@Metric, 5, LEN(@Metric) - 4);
+        IF ISNUMERIC(@IdString) = 1
+            SET @MessageId = CAST(@IdString AS INT);
+    END
+    
+    -- Open range ends default to the first/last point of the metric
+    IF @MessageId IS NULL
+    BEGIN
+        IF @From IS NULL
+            SELECT @From = MIN([BucketStart]) FROM [dbo].[EventRollupMinute] WITH (NOLOCK) WHERE [EventType] = @Metric;
+        IF @To IS NULL
+            SELECT @To = DATEADD(MINUTE, 1, MAX([BucketStart])) FROM [dbo].[EventRollupMinute] WITH (NOLOCK) WHERE [EventType] = @Metric;
+    END
+    ELSE
+    BEGIN
+        IF @From IS NULL
+            SELECT @From = MIN([EventTime]) FROM [dbo].[TimelineEvents] WITH (NOLOCK) WHERE [MessageId] = @MessageId;
+        IF @To IS NULL
+            SELECT @To = DATEADD(SECOND, 1, MAX([EventTime])) FROM [dbo].[TimelineEvents] WITH (NOLOCK) WHERE [MessageId] = @MessageId;
+    END
+    IF @From IS NULL OR @To IS NULL OR @To <= @From
+    BEGIN
+        -- empty result with the usual columns
+        SELECT CAST(NULL AS DATETIME2) as [time], CAST(NULL AS DECIMAL(18,2)) as [value],
+            CAST(NULL AS DECIMAL(18,2)) as [min], CAST(NULL AS DECIMAL(18,2)) as [max], CAST(0 AS BIGINT) as [count]
+        WHERE 1 = 0;
+        RETURN;
+    END
+    
+    DECLARE @BucketSeconds BIGINT = (DATEDIFF_BIG(SECOND, @From, @To) + @Points - 1) / @Points;
+    IF @BucketSeconds < 1 SET @BucketSeconds = 1;
+    
+    IF @MessageId IS NULL
+    BEGIN
+        -- rollups have minute resolution: align the range and use whole-minute buckets
+        SET @From = DATEADD(MINUTE, DATEDIFF(MINUTE, '2000-01-01', @From), CAST('2000-01-01' AS DATETIME2(0)));
+        SET @BucketSeconds = ((@BucketSeconds + 59) / 60) * 60;
+        
+        SELECT 
+            DATEADD(SECOND, CAST(b.[Bucket] * @BucketSeconds AS INT), @From) as [time],
+            CAST(b.[ValueSum] / b.[ValueCount] AS DECIMAL(18,2)) as [value],
+            b.[ValueMin] as [min],
+            b.[ValueMax] as [max],
+            b.[ValueCount] as [count]
+        FROM (
+            SELECT 
+                DATEDIFF_BIG(SECOND, @From, [BucketStart]) / @BucketSeconds as [Bucket],
+                SUM([ValueSum]) as [ValueSum],
+                SUM([ValueCount]) as [ValueCount],
+                MIN([ValueMin]) as [ValueMin],
+                MAX([ValueMax]) as [ValueMax]
+            FROM [dbo].[EventRollupMinute] WITH (NOLOCK)
+            WHERE [EventType] = @Metric
+                AND [BucketStart] >= @From AND [BucketStart] < @To
+                AND [ValueCount] > 0
+            GROUP BY DATEDIFF_BIG(SECOND, @From, [BucketStart]) / @BucketSeconds
+        ) b
+        ORDER BY b.[Bucket];
+        RETURN;
+    END
+    
+    SELECT 
+        DATEADD(SECOND, CAST(b.[Bucket] * @BucketSeconds AS INT), @From) as [time],
+        CAST(b.[ValueAvg] AS DECIMAL(18,2)) as [value],
+        b.[ValueMin] as [min],
+        b.[ValueMax] as [max],
+        b.[ValueCount] as [count]
+    FROM (
+        SELECT 
+            DATEDIFF_BIG(SECOND, @From, te.[EventTime]) / @BucketSeconds as [Bucket],
+            AVG(v.[Value]) as [ValueAvg],
+            MIN(v.[Value]) as [ValueMin],
+            MAX(v.[Value]) as [ValueMax],
+            COUNT_BIG(*) as [ValueCount]
+        FROM [dbo].[TimelineEvents] te WITH (NOLOCK)
+        CROSS APPLY (SELECT TRY_CAST(JSON_VALUE(te.[MessageValues], '$[0]') AS DECIMAL(18,2)) as [Value]) v
+        WHERE te.[MessageId] = @MessageId
+            AND te.[EventTime] >= @From AND te.[EventTime] < @To
+            AND v.[Value] IS NOT NULL
+        GROUP BY DATEDIFF_BIG(SECOND, @From, te.[EventTime]) / @BucketSeconds
+    ) b
+    ORDER BY b.[Bucket];
+END
+GO
+
+PRINT 'Stored procedure sp_GetTimeseriesBuckets created successfully.';
+GO
+
 -- =============================================
 -- Stored Procedure: sp_InsertTimelineEvent
 -- Inserts a new timeline event
@@ -207,14 +594,36 @@ CREATE PROCEDURE [dbo].[sp_InsertTimelineEvent]
 AS
 BEGIN
     SET NOCOUNT ON;
+    SET XACT_ABORT ON;
+    
+    DECLARE @NewEventId BIGINT;
+    DECLARE @RollupsJson NVARCHAR(MAX);
+    
+    BEGIN TRANSACTION;
     
     INSERT INTO [dbo].[TimelineEvents] 
         ([EventTime], [EventType], [MessageId], [MessageValues], [Value])
     VALUES 
         (@EventTime, @EventType, @MessageId, @MessageValues, @Value);
+    SET @NewEventId = SCOPE_IDENTITY();
+    
+    SET @RollupsJson = (
+        SELECT 
+            DATEADD(MINUTE, DATEDIFF(MINUTE, '2000-01-01', @EventTime), CAST('2000-01-01' AS DATETIME2(0))) as [bucket],
+            @EventType as [event],
+            1 as [count],
+            CASE WHEN @Value IS NULL THEN 0 ELSE 1 END as [value_count],
+            @Value as [value_sum],
+            @Value as [value_min],
+            @Value as [value_max]
+        FOR JSON PATH
+    );
+    EXEC [dbo].[sp_MergeEventRollups] @RollupsJson;
+    
+    COMMIT TRANSACTION;
     
     -- Return the new EventId
-    SELECT SCOPE_IDENTITY() as [NewEventId];
+    SELECT @NewEventId as [NewEventId];
 END
 GO
 
@@ -261,19 +670,91 @@ GO
 PRINT 'Stored procedure sp_GetOrInsertMessage created successfully.';
 GO
 
+-- =============================================
+-- Stored Procedure: sp_GetOrInsertMessages
+-- Set-based get-or-insert for a batch of message templates
+-- Parameters:
+--   @TemplatesJson: JSON array of template strings
+-- Returns one (Template, MessageId) row per distinct template
+-- =============================================
+IF EXISTS (SELECT * FROM sys.objects WHERE object_id = OBJECT_ID(N'[dbo].[sp_GetOrInsertMessages]') AND type in (N'P', N'PC'))
+    DROP PROCEDURE [dbo].[sp_GetOrInsertMessages];
+GO
+
+CREATE PROCEDURE [dbo].[sp_GetOrInsertMessages]
+    @TemplatesJson NVARCHAR(MAX)
+AS
+BEGIN
+    SET NOCOUNT ON;
+    
+    -- Binary collation keeps every requested spelling, so each one gets a row back
+    DECLARE @Templates TABLE ([Template] NVARCHAR(500) COLLATE Latin1_General_BIN2 NOT NULL PRIMARY KEY);
+    
+    INSERT INTO @Templates ([Template])
+    SELECT DISTINCT LEFT([value], 500) COLLATE Latin1_General_BIN2
+    FROM OPENJSON(@TemplatesJson)
+    WHERE [value] IS NOT NULL;
+    
+    -- Insert the missing ones, retrying if another writer inserts one of them concurrently
+    DECLARE @Attempt INT = 0;
+    WHILE 1 = 1
+    BEGIN
+        BEGIN TRY
+            INSERT INTO [dbo].[Messages] ([Template])
+            SELECT MIN(t.[Template])
+            FROM @Templates t
+            WHERE NOT EXISTS (
+                SELECT 1 FROM [dbo].[Messages] m
+                WHERE m.[Template] = t.[Template] COLLATE DATABASE_DEFAULT
+            )
+            GROUP BY t.[Template] COLLATE DATABASE_DEFAULT;
+            BREAK;
+        END TRY
+        BEGIN CATCH
+            -- 2601/2627: duplicate key from a concurrent insert
+            IF ERROR_NUMBER() NOT IN (2601, 2627) OR @Attempt >= 2
+                THROW;
+            SET @Attempt = @Attempt + 1;
+        END CATCH
+    END
+    
+    SELECT 
+        t.[Template] as [Template],
+        m.[MessageId] as [MessageId]
+    FROM @Templates t
+    INNER JOIN [dbo].[Messages] m ON m.[Template] = t.[Template] COLLATE DATABASE_DEFAULT;
+END
+GO
+
+PRINT 'Stored procedure sp_GetOrInsertMessages created successfully.';
+GO
+
 -- =============================================
 -- Stored Procedure: sp_BulkInsertTimelineEvents
 -- Bulk insert multiple timeline events (for migration)
+-- Parameters:
+--   @EventsJson: JSON array of {time, event, msg_id, msg_values, value}
+--   @RollupsJson: per-minute aggregates of the same events
+--                 (sp_MergeEventRollups format), NULL to skip
+--   @CheckpointsJson: input byte ranges the events complete
+--                 (sp_RecordIngestCheckpoints format), NULL to skip
 -- =============================================
 IF EXISTS (SELECT * FROM sys.objects WHERE object_id = OBJECT_ID(N'[dbo].[sp_BulkInsertTimelineEvents]') AND type in (N'P', N'PC'))
     DROP PROCEDURE [dbo].[sp_BulkInsertTimelineEvents];
 GO
 
 CREATE PROCEDURE [dbo].[sp_BulkInsertTimelineEvents]
-    @EventsJson NVARCHAR(MAX)
+    @EventsJson NVARCHAR(MAX),
+    @RollupsJson NVARCHAR(MAX) = NULL,
+    @CheckpointsJson NVARCHAR(MAX) = NULL
 AS
 BEGIN
     SET NOCOUNT ON;
+    SET XACT_ABORT ON;
+    
+    DECLARE @InsertedCount INT;
+    
+    BEGIN TRANSACTION;
     
     -- Parse JSON and insert
     INSERT INTO [dbo].[TimelineEvents] 
@@ -292,13 +773,106 @@ BEGIN
         [msg_values] NVARCHAR(500),
         [value] NVARCHAR(50)
     );
+    SET @InsertedCount = @@ROWCOUNT;
+    
+    IF @RollupsJson IS NOT NULL
+        EXEC [dbo].[sp_MergeEventRollups] @RollupsJson;
+    
+    IF @CheckpointsJson IS NOT NULL
+        EXEC [dbo].[sp_RecordIngestCheckpoints] @CheckpointsJson;
+    
+    COMMIT TRANSACTION;
     
-    SELECT @@ROWCOUNT as [InsertedCount];
+    SELECT @InsertedCount as [InsertedCount];
 END
 GO
 
 PRINT 'Stored procedure sp_BulkInsertTimelineEvents created successfully.';
 GO
 
+-- =============================================
+-- Stored Procedure: sp_BulkInsertTimelineEventsTvp
+-- Bulk insert typed rows passed as a table-valued parameter
+-- (no JSON serialization or casting)
+-- @RollupsJson and @CheckpointsJson as in sp_BulkInsertTimelineEvents
+-- =============================================
+IF EXISTS (SELECT * FROM sys.objects WHERE object_id = OBJECT_ID(N'[dbo].[sp_BulkInsertTimelineEventsTvp]') AND type in (N'P', N'PC'))
+    DROP PROCEDURE [dbo].[sp_BulkInsertTimelineEventsTvp];
+GO
+
+CREATE PROCEDURE [dbo].[sp_BulkInsertTimelineEventsTvp]
+    @Events [dbo].[TimelineEventTableType] READONLY,
+    @RollupsJson NVARCHAR(MAX) = NULL,
+    @CheckpointsJson NVARCHAR(MAX) = NULL
+AS
+BEGIN
+    SET NOCOUNT ON;
+    SET XACT_ABORT ON;
+    
+    DECLARE @InsertedCount INT;
+    
+    BEGIN TRANSACTION;
+    
+    INSERT INTO [dbo].[TimelineEvents] 
+        ([EventTime], [EventType], [MessageId], [MessageValues], [Value])
+    SELECT 
+        [EventTime],
+        [EventType],
+        [MessageId],
+        [MessageValues],
+        [Value]
+    FROM @Events;
+    SET @InsertedCount = @@ROWCOUNT;
+    
+    IF @RollupsJson IS NOT NULL
+        EXEC [dbo].[sp_MergeEventRollups] @RollupsJson;
+    
+    IF @CheckpointsJson IS NOT NULL
+        EXEC [dbo].[sp_RecordIngestCheckpoints] @CheckpointsJson;
+    
+    COMMIT TRANSACTION;
+    
+    SELECT @InsertedCount as [InsertedCount];
+END
+GO
+
+PRINT 'Stored procedure sp_BulkInsertTimelineEventsTvp created successfully.';
+GO
+
+-- =============================================
+-- Stored Procedure: sp_GetIngestWatermark
+-- Cheap indicator of new data for the API response cache:
+-- last identity values of TimelineEvents and Messages plus
+-- the event total (changes on deletes / rollup rebuilds too).
+-- Read without locks like the API procedures, so it moves as
+-- soon as the data they return does
+-- =============================================
+IF EXISTS (SELECT * FROM sys.objects WHERE object_id = OBJECT_ID(N'[dbo].[sp_GetIngestWatermark]') AND type in (N'P', N'PC'))
+    DROP PROCEDURE [dbo].[sp_GetIngestWatermark];
+GO
+
+CREATE PROCEDURE [dbo].[sp_GetIngestWatermark]
+AS
+BEGIN
+    SET NOCOUNT ON;
+    
+    SELECT 
+        CAST(IDENT_CURRENT(N'dbo.TimelineEvents') AS BIGINT) as [MaxEventId],
+        CAST(IDENT_CURRENT(N'dbo.Messages') AS BIGINT) as [MaxMessageId],
+        (SELECT ISNULL(SUM([EventCount]), 0) FROM [dbo].[EventRollupTotal] WITH (NOLOCK)) as [EventCount];
+END
+GO
+
+PRINT 'Stored procedure sp_GetIngestWatermark created successfully.';
+GO
+
+-- Databases created before the rollup tables existed: compute them once from the events
+IF NOT EXISTS (SELECT 1 FROM [dbo].[EventRollupTotal]) AND EXISTS (SELECT 1 FROM [dbo].[TimelineEvents])
+BEGIN
+    EXEC [dbo].[sp_RebuildEventRollups];
+    PRINT 'Event rollups rebuilt from TimelineEvents.';
+END
+GO
+
 PRINT 'All stored procedures created successfully.';
 GO
@@ -37,6 +37,7 @@ GO
 -- View: vw_EventSummary
 -- Pre-aggregated summary statistics
 -- High-performance read for dashboard summary
+-- (reads the per-type totals in EventRollupTotal)
 -- =============================================
 IF EXISTS (SELECT * FROM sys.views WHERE object_id = OBJECT_ID(N'[dbo].[vw_EventSummary]'))
     DROP VIEW [dbo].[vw_EventSummary];
@@ -45,12 +46,14 @@ GO
 CREATE VIEW [dbo].[vw_EventSummary]
 AS
 SELECT 
-    (SELECT COUNT(*) FROM [dbo].[TimelineEvents] WHERE [EventType] = 'error') as [error_count],
-    (SELECT COUNT(*) FROM [dbo].[TimelineEvents] WHERE [EventType] = 'warning') as [warning_count],
-    (SELECT COUNT(*) FROM [dbo].[TimelineEvents]) as [timeline_count],
+    ISNULL(SUM(CASE WHEN t.[EventType] = 'error' THEN t.[EventCount] END), 0) as [error_count],
+    ISNULL(SUM(CASE WHEN t.[EventType] = 'warning' THEN t.[EventCount] END), 0) as [warning_count],
+    ISNULL(SUM(t.[EventCount]), 0) as [timeline_count],
     (SELECT COUNT(*) FROM [dbo].[Messages]) as [unique_messages],
-    (SELECT COUNT(*) FROM [dbo].[TimelineEvents] WHERE [EventType] = 'latency' AND [Value] IS NOT NULL) as [latency_count],
-    (SELECT AVG([Value]) FROM [dbo].[TimelineEvents] WHERE [EventType] = 'latency' AND [Value] IS NOT NULL) as [latency_average];
+    ISNULL(SUM(CASE WHEN t.[EventType] = 'latency' THEN t.[ValueCount] END), 0) as [latency_count],
+    CAST(SUM(CASE WHEN t.[EventType] = 'latency' THEN t.[ValueSum] END)
+        / NULLIF(SUM(CASE WHEN t.[EventType] = 'latency' THEN t.[ValueCount] END), 0) AS DECIMAL(18,2)) as [latency_average]
+FROM [dbo].[EventRollupTotal] t;
 GO
 
 PRINT 'View vw_EventSummary created successfully.';
@@ -0,0 +1,287 @@
+-- =============================================
+-- ChronoLog Database Schema - Time Partitioning and Retention
+-- MS SQL Server 2016+ (run after 01-03)
+-- Partitions TimelineEvents by EventTime (daily by default)
+-- so expired days are removed by truncating whole partitions
+-- instead of DELETE, and range queries on EventTime only
+-- touch the partitions of the range.
+-- =============================================
+
+
+GO
+
+-- =============================================
+-- Partition function: PF_TimelineEventsTime
+-- RANGE RIGHT: a boundary is the first instant of its partition.
+-- Partition 1 (before the first boundary) is kept empty, so the
+-- oldest partition can be merged away without moving rows.
+-- The first boundary is the day of the oldest stored event;
+-- boundaries are created up to a week ahead.
+-- Change @IntervalDays to 7 for weekly partitions; the
+-- maintenance procedure continues with the same interval.
+-- =============================================
+IF NOT EXISTS (SELECT * FROM sys.partition_functions WHERE name = N'PF_TimelineEventsTime')
+BEGIN
+    DECLARE @IntervalDays INT = 1;
+    DECLARE @Today DATETIME2 = CAST(CAST(SYSDATETIME() AS DATE) AS DATETIME2);
+    DECLARE @Boundary DATETIME2 = ISNULL(
+        (SELECT CAST(CAST(MIN([EventTime]) AS DATE) AS DATETIME2) FROM [dbo].[TimelineEvents]), @Today);
+
+    CREATE PARTITION FUNCTION [PF_TimelineEventsTime] (DATETIME2)
+    AS RANGE RIGHT FOR VALUES (@Boundary);
+
+    -- No table uses the function yet, so these splits only change metadata
+    WHILE @Boundary < DATEADD(DAY, 7, @Today)
+    BEGIN
+        SET @Boundary = DATEADD(DAY, @IntervalDays, @Boundary);
+        ALTER PARTITION FUNCTION [PF_TimelineEventsTime]() SPLIT RANGE (@Boundary);
+    END
+
+    PRINT 'Partition function PF_TimelineEventsTime created successfully.';
+END
+GO
+
+-- =============================================
+-- Partition scheme: PS_TimelineEventsTime
+-- =============================================
+IF NOT EXISTS (SELECT * FROM sys.partition_schemes WHERE name = N'PS_TimelineEventsTime')
+BEGIN
+    CREATE PARTITION SCHEME [PS_TimelineEventsTime]
+    AS PARTITION [PF_TimelineEventsTime] ALL TO ([PRIMARY]);
+
+    PRINT 'Partition scheme PS_TimelineEventsTime created successfully.';
+END
+GO
+
+-- =============================================
+-- Move TimelineEvents onto the partition scheme
+-- Clustered on (EventTime, EventId); the primary key becomes
+-- nonclustered on (EventId, EventTime), because unique indexes
+-- of a partitioned table must contain the partitioning column
+-- (EventId stays unique through the identity).
+-- All indexes are partition-aligned, which TRUNCATE ... WITH
+-- (PARTITIONS) requires. IX_TimelineEvents_EventTime is dropped:
+-- the clustered index serves the same time range seeks.
+-- IX_TimelineEvents_Pagination is dropped: the primary key has
+-- the same leading EventId key, so timeline pages seek it instead
+-- (one seek per partition, as for every aligned index).
+-- Rebuilding a large table takes a while; run in a quiet period.
+-- =============================================
+IF NOT EXISTS (
+    SELECT * FROM sys.indexes i
+    JOIN sys.partition_schemes ps ON i.data_space_id = ps.data_space_id
+    WHERE i.object_id = OBJECT_ID(N'[dbo].[TimelineEvents]') AND i.index_id = 1
+)
+BEGIN
+    DECLARE @PrimaryKey SYSNAME = (
+        SELECT name FROM sys.key_constraints
+        WHERE parent_object_id = OBJECT_ID(N'[dbo].[TimelineEvents]') AND type = 'PK'
+    );
+    DECLARE @Sql NVARCHAR(MAX);
+
+    IF EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_TimelineEvents_EventTime')
+        DROP INDEX [IX_TimelineEvents_EventTime] ON [dbo].[TimelineEvents];
+    IF EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_TimelineEvents_EventType')
+        DROP INDEX [IX_TimelineEvents_EventType] ON [dbo].[TimelineEvents];
+    IF EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_TimelineEvents_MessageId')
+        DROP INDEX [IX_TimelineEvents_MessageId] ON [dbo].[TimelineEvents];
+    IF EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_TimelineEvents_Pagination')
+        DROP INDEX [IX_TimelineEvents_Pagination] ON [dbo].[TimelineEvents];
+
+    IF @PrimaryKey IS NOT NULL
+    BEGIN
+        SET @Sql = N'ALTER TABLE [dbo].[TimelineEvents] DROP CONSTRAINT ' + QUOTENAME(@PrimaryKey);
+        EXEC sp_executesql @Sql;
+    END
+
+    CREATE CLUSTERED INDEX [CIX_TimelineEvents_EventTime]
+    ON [dbo].[TimelineEvents] ([EventTime], [EventId])
+    ON [PS_TimelineEventsTime] ([EventTime]);
+
+    ALTER TABLE [dbo].[TimelineEvents]
+    ADD CONSTRAINT [PK_TimelineEvents] PRIMARY KEY NONCLUSTERED ([EventId], [EventTime])
+    ON [PS_TimelineEventsTime] ([EventTime]);
+
+    PRINT 'Table TimelineEvents partitioned by EventTime successfully.';
+END
+ELSE
+BEGIN
+    PRINT 'Table TimelineEvents is already partitioned.';
+END
+GO
+
+-- =============================================
+-- Partition-aligned indexes
+-- =============================================
+
+-- Filter by event type. EventId is an explicit key: the clustered key no
+-- longer ends with it, and sp_GetTimelineSeek needs type-filtered pages
+-- ordered by EventId. Recreated if an earlier run built it on EventType only.
+IF EXISTS (
+    SELECT * FROM sys.indexes i
+    WHERE i.name = 'IX_TimelineEvents_EventType'
+        AND NOT EXISTS (
+            SELECT * FROM sys.index_columns ic
+            WHERE ic.object_id = i.object_id AND ic.index_id = i.index_id
+                AND ic.key_ordinal = 2 AND COL_NAME(ic.object_id, ic.column_id) = 'EventId'
+        )
+)
+    DROP INDEX [IX_TimelineEvents_EventType] ON [dbo].[TimelineEvents];
+GO
+
+IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_TimelineEvents_EventType')
+BEGIN
+    CREATE NONCLUSTERED INDEX [IX_TimelineEvents_EventType]
+    ON [dbo].[TimelineEvents] ([EventType], [EventId])
+    INCLUDE ([EventTime], [Value], [MessageId])
+    ON [PS_TimelineEventsTime] ([EventTime]);
+
+    PRINT 'Index IX_TimelineEvents_EventType created successfully.';
+END
+GO
+
+-- Joins and msg_X timeseries ranges (seek on MessageId, then EventTime)
+IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_TimelineEvents_MessageId')
+BEGIN
+    CREATE NONCLUSTERED INDEX [IX_TimelineEvents_MessageId]
+    ON [dbo].[TimelineEvents] ([MessageId], [EventTime])
+    WHERE [MessageId] IS NOT NULL
+    ON [PS_TimelineEventsTime] ([EventTime]);
+
+    PRINT 'Index IX_TimelineEvents_MessageId created successfully.';
+END
+GO
+
+-- Timeline pages use PK_TimelineEvents (EventId, EventTime); an aligned
+-- IX_TimelineEvents_Pagination from an earlier run only duplicated it
+IF EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_TimelineEvents_Pagination')
+BEGIN
+    DROP INDEX [IX_TimelineEvents_Pagination] ON [dbo].[TimelineEvents];
+
+    PRINT 'Index IX_TimelineEvents_Pagination dropped (PK_TimelineEvents serves timeline pages).';
+END
+GO
+
+-- =============================================
+-- Stored Procedure: sp_MaintainTimelinePartitions
+-- Retention job (python cli.py retention):
+--   1. adds boundaries up to @PartitionsAhead intervals ahead by
+--      splitting the empty last partition (metadata only)
+--   2. with @RetentionDays > 0, removes every partition that ends
+--      before midnight @RetentionDays days ago: partitions 1 and 2
+--      are truncated and their boundary merged, both empty, so the
+--      cost does not depend on the number of rows
+--   3. deletes the purged minutes from EventRollupMinute and
+--      recomputes EventRollupTotal from the remaining minutes
+-- Steps 2 and 3 run in one transaction, so the summary never
+-- counts truncated days.
+-- Returns the purged ranges with their row counts.
+-- =============================================
+IF EXISTS (SELECT * FROM sys.objects WHERE object_id = OBJECT_ID(N'[dbo].[sp_MaintainTimelinePartitions]') AND type in (N'P', N'PC'))
+    DROP PROCEDURE [dbo].[sp_MaintainTimelinePartitions];
+GO
+
+CREATE PROCEDURE [dbo].[sp_MaintainTimelinePartitions]
+    @RetentionDays INT = 0,
+    @PartitionsAhead INT = 7
+AS
+BEGIN
+    SET NOCOUNT ON;
+    SET XACT_ABORT ON;
+
+    IF @PartitionsAhead < 1 SET @PartitionsAhead = 1;
+
+    DECLARE @Today DATETIME2 = CAST(CAST(SYSDATETIME() AS DATE) AS DATETIME2);
+    DECLARE @FunctionId INT = (SELECT function_id FROM sys.partition_functions WHERE name = N'PF_TimelineEventsTime');
+    IF @FunctionId IS NULL
+        THROW 50001, 'TimelineEvents is not partitioned; run database/05_partitioning.sql first.', 1;
+
+    DECLARE @Boundaries TABLE ([BoundaryId] INT PRIMARY KEY, [Boundary] DATETIME2 NOT NULL);
+    DECLARE @Purged TABLE ([RangeStart] DATETIME2 NULL, [RangeEnd] DATETIME2 NOT NULL, [Rows] BIGINT NOT NULL);
+    DECLARE @First DATETIME2, @Second DATETIME2, @Last DATETIME2, @IntervalDays INT;
+
+    -- 1. Boundaries ahead, continuing the interval of the last two
+    INSERT INTO @Boundaries
+    SELECT boundary_id, CAST(value AS DATETIME2) FROM sys.partition_range_values WHERE function_id = @FunctionId;
+    SELECT @Last = MAX([Boundary]) FROM @Boundaries;
+    SELECT @IntervalDays = ISNULL(DATEDIFF(DAY, MAX([Boundary]), @Last), 1)
+    FROM @Boundaries WHERE [Boundary] < @Last;
+    IF @IntervalDays < 1 SET @IntervalDays = 1;
+
+    WHILE @Last < DATEADD(DAY, @IntervalDays * @PartitionsAhead, @Today)
+    BEGIN
+        SET @Last = DATEADD(DAY, @IntervalDays, @Last);
+        ALTER PARTITION SCHEME [PS_TimelineEventsTime] NEXT USED [PRIMARY];
+        ALTER PARTITION FUNCTION [PF_TimelineEventsTime]() SPLIT RANGE (@Last);
+    END
+
+    -- 2. Expired partitions, oldest first; never the current one
+    IF @RetentionDays > 0
+    BEGIN
+        DECLARE @Cutoff DATETIME2 = DATEADD(DAY, -@RetentionDays, @Today);
+
+        -- TimelineEvents is locked first, then the rollups: the order of the writers
+        BEGIN TRANSACTION;
+
+        WHILE 1 = 1
+        BEGIN
+            SELECT @First = NULL, @Second = NULL;
+            SELECT @First = CAST(value AS DATETIME2) FROM sys.partition_range_values
+            WHERE function_id = @FunctionId AND boundary_id = 1;
+            SELECT @Second = CAST(value AS DATETIME2) FROM sys.partition_range_values
+            WHERE function_id = @FunctionId AND boundary_id = 2;
+            -- partition 2 holds [@First, @Second)
+            IF @Second IS NULL OR @Second > @Cutoff
+                BREAK;
+
+            -- row counts from metadata; partition 1 only has rows older than the first boundary
+            INSERT INTO @Purged ([RangeStart], [RangeEnd], [Rows])
+            SELECT @First, @Second, ISNULL(SUM([rows]), 0)
+            FROM sys.partitions
+            WHERE object_id = OBJECT_ID(N'[dbo].[TimelineEvents]') AND index_id = 1 AND partition_number IN (1, 2);
+
+            TRUNCATE TABLE [dbo].[TimelineEvents] WITH (PARTITIONS (1 TO 2));
+            ALTER PARTITION FUNCTION [PF_TimelineEventsTime]() MERGE RANGE (@First);
+        END
+
+        -- 3. Rollups of the purged minutes
+        IF EXISTS (SELECT 1 FROM @Purged)
+        BEGIN
+            DECLARE @PurgedUntil DATETIME2 = (SELECT MAX([RangeEnd]) FROM @Purged);
+
+            -- Minute rows first, then the totals: the lock order of sp_MergeEventRollups
+            DELETE FROM [dbo].[EventRollupMinute] WITH (TABLOCKX)
+            WHERE [BucketStart] < @PurgedUntil;
+
+            DELETE FROM [dbo].[EventRollupTotal] WITH (TABLOCKX);
+            INSERT INTO [dbo].[EventRollupTotal]
+                ([EventType], [EventCount], [ValueCount], [ValueSum], [ValueMin], [ValueMax])
+            SELECT
+                [EventType],
+                SUM([EventCount]),
+                SUM([ValueCount]),
+                SUM([ValueSum]),
+                MIN([ValueMin]),
+                MAX([ValueMax])
+            FROM [dbo].[EventRollupMinute]
+            GROUP BY [EventType];
+        END
+
+        COMMIT TRANSACTION;
+    END
+
+    SELECT [RangeStart] as [start], [RangeEnd] as [end], [Rows] as [rows]
+    FROM @Purged
+    ORDER BY [RangeEnd];
+END
+GO
+
+PRINT 'Stored procedure sp_MaintainTimelinePartitions created successfully.';
+GO
+
+-- Boundaries for the coming days right away
+EXEC [dbo].[sp_MaintainTimelinePartitions];
+GO
+
+PRINT 'Partitioning setup complete.';
+GO
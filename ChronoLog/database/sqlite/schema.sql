@@ -0,0 +1,101 @@
+-- =============================================
+-- ChronoLog Database Schema
+-- SQLite (embedded backend, STORAGE_BACKEND=sqlite)
+-- Applied by SQLiteBackend when it opens the database;
+-- every statement is idempotent.
+-- Times are stored as ISO 8601 text (YYYY-MM-DD HH:MM:SS),
+-- which sorts chronologically.
+-- =============================================
+
+-- =============================================
+-- Table: Messages
+-- Message templates; AUTOINCREMENT so ids are never reused
+-- (the ingest watermark reads sqlite_sequence)
+-- =============================================
+CREATE TABLE IF NOT EXISTS Messages (
+    MessageId INTEGER PRIMARY KEY AUTOINCREMENT,
+    Template TEXT NOT NULL UNIQUE,
+    CreatedAt TEXT DEFAULT CURRENT_TIMESTAMP,
+    UpdatedAt TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+-- =============================================
+-- Table: TimelineEvents
+-- All log events; EventId is the rowid, so the table is
+-- clustered on it like the SQL Server table
+-- =============================================
+CREATE TABLE IF NOT EXISTS TimelineEvents (
+    EventId INTEGER PRIMARY KEY AUTOINCREMENT,
+    EventTime TEXT NOT NULL,
+    EventType TEXT NOT NULL,
+    MessageId INTEGER NULL REFERENCES Messages (MessageId) ON DELETE SET NULL,
+    MessageValues TEXT NULL, -- JSON array: ["80", "95"]
+    Value REAL NULL, -- rounded to 2 decimals like DECIMAL(18,2)
+    CreatedAt TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+-- =============================================
+-- Table: EventRollupMinute
+-- Per-minute aggregates per event type, merged in the same
+-- transaction as the inserted rows
+-- =============================================
+CREATE TABLE IF NOT EXISTS EventRollupMinute (
+    BucketStart TEXT NOT NULL,
+    EventType TEXT NOT NULL,
+    EventCount INTEGER NOT NULL,
+    ValueCount INTEGER NOT NULL,
+    ValueSum REAL NULL,
+    ValueMin REAL NULL,
+    ValueMax REAL NULL,
+    PRIMARY KEY (EventType, BucketStart)
+) WITHOUT ROWID;
+
+-- =============================================
+-- Table: EventRollupTotal
+-- All-time aggregates per event type
+-- =============================================
+CREATE TABLE IF NOT EXISTS EventRollupTotal (
+    EventType TEXT NOT NULL PRIMARY KEY,
+    EventCount INTEGER NOT NULL,
+    ValueCount INTEGER NOT NULL,
+    ValueSum REAL NULL,
+    ValueMin REAL NULL,
+    ValueMax REAL NULL
+) WITHOUT ROWID;
+
+-- =============================================
+-- Table: IngestCheckpoints
+-- Input byte ranges whose rows are committed, recorded in the
+-- insert transaction; FileId is "device:inode"
+-- =============================================
+CREATE TABLE IF NOT EXISTS IngestCheckpoints (
+    CheckpointId INTEGER PRIMARY KEY,
+    FileId TEXT NOT NULL,
+    Generation INTEGER NOT NULL,
+    StartOffset INTEGER NOT NULL,
+    EndOffset INTEGER NOT NULL,
+    CommittedAt TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS IX_IngestCheckpoints_File
+    ON IngestCheckpoints (FileId, Generation, StartOffset);
+
+-- =============================================
+-- Indexes (equivalents of the SQL Server indexes)
+-- =============================================
+
+-- Time-based queries and ordering (IX_TimelineEvents_EventTime)
+CREATE INDEX IF NOT EXISTS IX_TimelineEvents_EventTime
+    ON TimelineEvents (EventTime DESC);
+
+-- Filter by type and seek on EventId (IX_TimelineEvents_EventType,
+-- whose SQL Server keys end with the clustered EventId)
+CREATE INDEX IF NOT EXISTS IX_TimelineEvents_EventType
+    ON TimelineEvents (EventType, EventId);
+
+-- Joins and msg_X timeseries (IX_TimelineEvents_MessageId, filtered)
+CREATE INDEX IF NOT EXISTS IX_TimelineEvents_MessageId
+    ON TimelineEvents (MessageId, EventTime)
+    WHERE MessageId IS NOT NULL;
+
+-- IX_TimelineEvents_Pagination has no equivalent: the rowid table is already ordered by EventId
@@ -1,8 +1,14 @@
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, Response, jsonify, request, send_from_directory, stream_with_context
+import functools
 import pathlib
 from flasgger import Swagger
-from facade import ChronoLogFacade
-from db import DatabaseConnectionError
+from datetime import datetime
+from storage import create_storage, DatabaseConnectionError
+from downsample import DOWNSAMPLE_MODES
+from response_cache import ResponseCache
+from event_stream import EventBroadcaster
+import metrics
+from config import API_CACHE_ENABLED, STREAM_KEEPALIVE
 
 import logging
 import sys
@@ -22,7 +28,42 @@ def log_request():
     print(f"API REQUEST: {request.method} {request.path}", flush=True)
 
 swagger = Swagger(app)
-facade = ChronoLogFacade()
+facade = create_storage()
+response_cache = ResponseCache(lambda: facade.get_ingest_watermark()) if API_CACHE_ENABLED else None
+broadcaster = EventBroadcaster(facade)
+
+
+def cached(view):
+    """
+    Serves repeated GET requests from response_cache until new data is ingested, and answers
+    If-None-Match with 304 when the client already has the current body.
+    Only 200 responses are cached; if the watermark cannot be read the view runs uncached.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if response_cache is None:
+            return view(*args, **kwargs)
+        key = (request.path, tuple(sorted(request.args.items(multi=True))))
+        try:
+            watermark = response_cache.watermark()
+            hit = response_cache.get(key, watermark)
+        except Exception as e:
+            print(f"API cache bypassed: {e}", flush=True)
+            return view(*args, **kwargs)
+        if hit is None:
+            response = app.make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            body = response.get_data()
+            etag = response_cache.put(key, body, watermark)
+        else:
+            body, etag = hit
+            response = app.response_class(body, mimetype="application/json")
+        response.set_etag(etag)
+        # clients must revalidate, which costs them a 304 while nothing changed
+        response.headers["Cache-Control"] = "no-cache"
+        return response.make_conditional(request)
+    return wrapper
 
 
 @app.errorhandler(404)
@@ -38,6 +79,7 @@ def database_error(error):
     return jsonify({"error": "Database unavailable", "details": str(error)}), 503
 
 @app.route('/api/summary', methods=['GET'])
+@cached
 def get_summary():
     """
     Get summary statistics
@@ -72,6 +114,7 @@ def get_summary():
     return jsonify(data)
 
 @app.route('/api/timeline', methods=['GET'])
+@cached
 def get_timeline():
     """
     Get paginated timeline events
@@ -93,6 +136,24 @@ def get_timeline():
         in: query
         type: string
         description: Filter by event type (error, warning, etc.)
+      - name: before_id
+        in: query
+        type: integer
+        description: Keyset paging, events older than this id (use the id of the last row for the next page)
+      - name: after_id
+        in: query
+        type: integer
+        description: Keyset paging, events newer than this id (use the id of the first row for the previous page)
+      - name: keyset
+        in: query
+        type: boolean
+        default: false
+        description: Keyset paging from the newest event (page is ignored in keyset mode)
+      - name: include_total
+        in: query
+        type: boolean
+        default: false
+        description: In keyset mode, fill total_count (from the rollup tables)
     responses:
       200:
         description: List of timeline events
@@ -123,10 +184,26 @@ def get_timeline():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 30, type=int)
     event_type = request.args.get('type')
-    data = facade.get_timeline_page(page, per_page, event_type)
+    before_id = request.args.get('before_id', type=int)
+    after_id = request.args.get('after_id', type=int)
+    keyset = request.args.get('keyset', '').strip().lower() in ('1', 'true', 'yes')
+    include_total = request.args.get('include_total', '').strip().lower() in ('1', 'true', 'yes')
+    data = facade.get_timeline_page(page, per_page, event_type, before_id=before_id, after_id=after_id,
+                                    keyset=keyset, include_total=include_total)
     return jsonify(data)
 
+def _parse_time_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        # event times are stored as written in the log, without a zone
+        return datetime.fromisoformat(value).replace(tzinfo=None)
+    except ValueError:
+        raise ValueError(f"{name} must be an ISO 8601 timestamp")
+
 @app.route('/api/timeseries', methods=['GET'])
+@cached
 def get_timeseries():
     """
     Get timeseries data for a metric
@@ -144,6 +221,24 @@ def get_timeseries():
         type: integer
         default: 500
         description: Max points to return
+      - name: from
+        in: query
+        type: string
+        description: Range start (ISO 8601); with from, to or points the range is downsampled
+      - name: to
+        in: query
+        type: string
+        description: Range end, exclusive (ISO 8601)
+      - name: points
+        in: query
+        type: integer
+        description: Target number of points for the range (default limit, max 5000)
+      - name: mode
+        in: query
+        type: string
+        enum: [bucket, lttb]
+        default: bucket
+        description: bucket = per-bucket avg/min/max/count, lttb = shape-preserving point selection
     responses:
       200:
         description: Timeseries data
@@ -156,19 +251,35 @@ def get_timeseries():
                 type: string
               value:
                 type: number
+              min:
+                type: number
+              max:
+                type: number
+              count:
+                type: integer
     """
     metric = request.args.get('metric')
     limit = request.args.get('limit', 500, type=int)
+    points = request.args.get('points', type=int)
+    mode = request.args.get('mode', 'bucket')
     
     if not metric:
         return jsonify({"error": "Metric parameter is required"}), 400
+    if mode not in DOWNSAMPLE_MODES:
+        return jsonify({"error": f"mode must be one of {', '.join(DOWNSAMPLE_MODES)}"}), 400
+    try:
+        start = _parse_time_arg('from')
+        end = _parse_time_arg('to')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
         
-    data = facade.get_timeseries(metric, limit)
+    data = facade.get_timeseries(metric, limit, start=start, end=end, points=points, mode=mode)
     if not data:
         return jsonify([])
     return jsonify(data)
 
 @app.route('/api/messages', methods=['GET'])
+@cached
 def get_messages():
     """
     Get all message templates
@@ -186,6 +297,69 @@ def get_messages():
     data = facade.get_messages()
     return jsonify(data)
 
+@app.route('/api/stream', methods=['GET'])
+def stream_events():
+    """
+    Stream newly committed events and updated counters (Server-Sent Events)
+    ---
+    tags:
+      - Timeline
+    parameters:
+      - name: type
+        in: query
+        type: string
+        description: Comma-separated event types to stream (default all); counters are always sent
+    responses:
+      200:
+        description: >
+          text/event-stream with "event" messages (a timeline row, id = EventId) and "summary" messages
+          (the /api/summary counters) after every write. Events committed while disconnected can be
+          fetched from /api/timeline?after_id=<last id>.
+      503:
+        description: Too many stream clients
+    """
+    event_types = [t.strip() for t in request.args.get('type', '').split(',') if t.strip()]
+    sub = broadcaster.subscribe(event_types)
+    if sub is None:
+        return jsonify({"error": "Too many stream clients"}), 503
+
+    def generate():
+        try:
+            yield "retry: 3000\n\n"
+            while not sub.lagged:
+                message = sub.next(STREAM_KEEPALIVE)
+                # a comment line keeps proxies from closing an idle connection
+                yield message if message is not None else ": keepalive\n\n"
+        finally:
+            broadcaster.unsubscribe(sub)
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Pipeline metrics in Prometheus text format
+    ---
+    tags:
+      - Metrics
+    produces:
+      - text/plain
+    responses:
+      200:
+        description: >
+          Counters and histograms of the reader, parse workers and writers (merged across processes),
+          plus the API's own response cache and stream gauges
+    """
+    extra = {"stream_clients": ("Connected /api/stream clients", broadcaster.subscriber_count())}
+    if response_cache is not None:
+        stats = response_cache.stats
+        lookups = stats["hits"] + stats["misses"]
+        extra["api_cache_hit_ratio"] = ("Share of API requests answered from the response cache",
+                                        stats["hits"] / lookups if lookups else 0.0)
+    body = metrics.render_prometheus(metrics.collect(), extra)
+    return Response(body, content_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def serve(path):
@@ -0,0 +1,389 @@
+import gc
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from config import WRITER_BATCH_ROWS, STORAGE_BACKEND
+from file_chunk_reader import iter_byte_ranges, map_byte_range
+from log_parser import LogParser
+from writer_process import WriterProcess
+from storage import create_storage, STORAGE_BACKENDS
+import metrics
+
+STAGES = ("reader", "parser", "writer", "sink", "e2e")
+SINKS = ("null", "db")
+# Event types of the rows the sink stage inserts; deleted again afterwards
+BENCH_EVENT_PREFIX = "bench_"
+
+ACTIONS = ("connect to", "read from", "write to", "refresh", "authenticate against", "replicate", "lock", "query")
+OUTCOMES = ("failed", "timed out", "was refused", "returned an error", "was retried", "is degraded")
+METRIC_NAMES = ("latency", "processed", "queue", "bytes", "retries", "pool", "hits", "misses")
+
+
+def _word(i):
+    # letters only, so masking cannot fold distinct templates into one
+    letters = ""
+    i += 26
+    while i:
+        i, r = divmod(i, 26)
+        letters = chr(ord("a") + r) + letters
+    return letters
+
+
+def make_templates(count, variables):
+    """Distinct message texts with `variables` numeric slots each ({} placeholders)."""
+    templates = []
+    for i in range(max(1, count)):
+        text = f"{ACTIONS[i % len(ACTIONS)]} component {_word(i)} {OUTCOMES[(i // len(ACTIONS)) % len(OUTCOMES)]}"
+        slots = " ".join(f"code {{}}" if n == 0 else f"attempt {{}}" if n == 1 else f"shard {{}}"
+                         for n in range(variables))
+        templates.append(f"{text} {slots}".rstrip())
+    return templates
+
+
+def generate_log(path, lines=None, size_bytes=None, error_ratio=0.05, warning_ratio=0.05, templates=100,
+                 variables=2, seed=42, lines_per_second=20):
+    """
+    Writes a deterministic synthetic log (same arguments, same bytes) and returns (lines, bytes).
+
+    error_ratio and warning_ratio are the shares of ERROR and WARNING lines, whose messages are drawn
+    from `templates` distinct texts with `variables` numeric values each. The other lines are INFO
+    lines carrying `variables` key=value pairs (each one a timeline event) or plain chatter when
+    variables is 0. The log stops after `lines` lines or once it reaches size_bytes.
+    """
+    if lines is None and size_bytes is None:
+        raise ValueError("generate_log needs lines or size_bytes")
+    rnd = random.Random(seed)
+    texts = make_templates(templates, variables)
+    base = datetime(2025, 1, 1)
+    written = size = 0
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        while (lines is None or written < lines) and (size_bytes is None or size < size_bytes):
+            ts = (base + timedelta(seconds=written // lines_per_second)).strftime("%Y-%m-%d %H:%M:%S")
+            kind = rnd.random()
+            if kind < error_ratio + warning_ratio:
+                level = "ERROR" if kind < error_ratio else "WARNING"
+                message = rnd.choice(texts).format(*(rnd.randint(1, 9999) for _ in range(variables)))
+            elif variables:
+                level = "INFO"
+                message = " ".join(f"{name}={rnd.randint(0, 5000)}"
+                                   for name in rnd.sample(METRIC_NAMES, min(variables, len(METRIC_NAMES))))
+            else:
+                level = "INFO"
+                message = f"request served by worker {_word(rnd.randint(0, 15))}"
+            line = f"{ts} {level} {message}\n"
+            f.write(line)
+            written += 1
+            size += len(line)
+    return written, size
+
+
+class NullSink:
+    """
+    Stands in for ChronoLogFacade in the writers: hands out message ids and discards the rows,
+    so the pipeline can be measured without a database.
+    """
+    def __init__(self):
+        self._ids = {}
+
+    def get_message_ids(self, limit):
+        return {}
+
+    def get_or_create_message_ids(self, templates):
+        for tmpl in templates:
+            self._ids.setdefault(tmpl, len(self._ids) + 1)
+        return {tmpl: self._ids[tmpl] for tmpl in templates}
+
+    def bulk_insert_timeline_events(self, events):
+        pass
+
+
+class BenchSink:
+    """
+    Writer facade of the e2e stage with sink="db": inserts through the storage backend, but under
+    BENCH_EVENT_PREFIX event types, so the rows can be told apart and deleted afterwards.
+    The backend is created on first use, i.e. inside the writer process.
+    """
+    def __init__(self, backend, storage_options=None):
+        self.backend = backend
+        self.storage_options = storage_options or {}
+        self._facade = None
+
+    def facade(self):
+        if self._facade is None:
+            self._facade = create_storage(self.backend, **self.storage_options)
+        return self._facade
+
+    def get_message_ids(self, limit):
+        return self.facade().get_message_ids(limit)
+
+    def get_or_create_message_ids(self, templates):
+        return self.facade().get_or_create_message_ids(templates)
+
+    def bulk_insert_timeline_events(self, events):
+        for event in events:
+            if not event["event"].startswith(BENCH_EVENT_PREFIX):
+                event["event"] = BENCH_EVENT_PREFIX + event["event"]
+        self.facade().bulk_insert_timeline_events(events)
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a list of numbers (None if empty)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+def histogram_quantile(hist, q):
+    """Estimates a quantile from a merged metrics histogram by interpolating inside its bucket."""
+    if not hist or not hist["count"]:
+        return None
+    rank = q * hist["count"]
+    seen = 0
+    lower = 0.0
+    for bound, count in zip(metrics.LATENCY_BUCKETS, hist["buckets"]):
+        if count and seen + count >= rank:
+            return lower + (bound - lower) * (rank - seen) / count
+        seen += count
+        lower = bound
+    return metrics.LATENCY_BUCKETS[-1]
+
+
+def peak_rss_mb(children=False):
+    """Peak resident set size of this process (or of its largest child) in MB; None where unsupported."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(usage / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _result(seconds, lines, rows, nbytes, latencies=None, p50=None, p99=None, children=False):
+    if latencies is not None:
+        p50, p99 = percentile(latencies, 0.5), percentile(latencies, 0.99)
+    seconds = max(seconds, 1e-9)
+    rss = peak_rss_mb()
+    if children:
+        rss = max(rss or 0, peak_rss_mb(children=True) or 0) or None
+    return {
+        "seconds": round(seconds, 4),
+        "lines": lines,
+        "rows": rows,
+        "lines_per_sec": round(lines / seconds),
+        "rows_per_sec": round(rows / seconds),
+        "mb_per_sec": round(nbytes / seconds / 1e6, 2),
+        "p50_ms": round(p50 * 1000, 3) if p50 is not None else None,
+        "p99_ms": round(p99 * 1000, 3) if p99 is not None else None,
+        "peak_rss_mb": rss,
+    }
+
+
+class Benchmark:
+    """
+    Measures each pipeline stage on its own and the whole pipeline end to end over one synthetic log.
+
+    reader: newline-aligned byte ranges mapped from the file (as the batch workers read them)
+    parser: LogParser.parse_bytes over the ranges already in memory
+    writer: WriterProcess batching and template resolution with NullSink in place of the database
+    sink:   bulk inserts into the storage backend (needs sink="db"; the rows are deleted afterwards)
+    e2e:    LogProcessor in batch mode with its worker and writer processes, using its own spill and
+            metrics directories, so it cannot touch a running processor (with sink="db" its rows are
+            inserted under BENCH_EVENT_PREFIX event types and deleted afterwards as well)
+
+    Stage latencies are per range (reader, parser) or per flush (writer, sink); e2e reports the
+    parse and flush latencies recorded by the pipeline metrics, estimated from histogram buckets.
+
+    With sink="db", backend selects the storage backend ("mssql" or "sqlite") and storage_options
+    go to its constructor (e.g. path for SQLite), so the same run compares the backends.
+    """
+    def __init__(self, log_path, chunk_bytes=1024 * 1024, batch_rows=WRITER_BATCH_ROWS, sink="null",
+                 num_processes=None, num_writers=None, backend=STORAGE_BACKEND, storage_options=None):
+        if sink not in SINKS:
+            raise ValueError(f"Unknown sink '{sink}', expected one of {SINKS}")
+        if backend not in STORAGE_BACKENDS:
+            raise ValueError(f"Unknown storage backend '{backend}', expected one of {STORAGE_BACKENDS}")
+        self.log_path = str(log_path)
+        self.chunk_bytes = chunk_bytes
+        self.batch_rows = batch_rows
+        self.sink = sink
+        self.backend = backend
+        self.storage_options = storage_options or {}
+        self.num_processes = num_processes
+        self.num_writers = num_writers
+        self.lines = 0
+        self.nbytes = os.path.getsize(self.log_path)
+        self._chunks = None
+        self._parsed = None
+
+    def run(self, stages=STAGES):
+        results = {}
+        for stage in stages:
+            if stage not in STAGES:
+                raise ValueError(f"Unknown stage '{stage}', expected some of {STAGES}")
+            if stage == "sink" and self.sink != "db":
+                results[stage] = {"skipped": "needs --sink db"}
+                continue
+            gc.collect()
+            results[stage] = getattr(self, f"bench_{stage}")()
+        return results
+
+    def _ranges(self):
+        return list(iter_byte_ranges(self.log_path, self.chunk_bytes))
+
+    def bench_reader(self):
+        latencies, chunks, lines = [], [], 0
+        started = time.perf_counter()
+        for start, end in self._ranges():
+            t = time.perf_counter()
+            data = map_byte_range(self.log_path, start, end)
+            lines += data.count(b"\n")
+            latencies.append(time.perf_counter() - t)
+            chunks.append(data)
+        seconds = time.perf_counter() - started
+        self._chunks = chunks
+        self.lines = lines
+        return _result(seconds, lines, 0, self.nbytes, latencies)
+
+    def _ensure_chunks(self):
+        if self._chunks is None:
+            self._chunks = [map_byte_range(self.log_path, s, e) for s, e in self._ranges()]
+            self.lines = sum(c.count(b"\n") for c in self._chunks)
+
+    def bench_parser(self):
+        self._ensure_chunks()
+        parser = LogParser()
+        latencies, parsed, rows = [], [], 0
+        started = time.perf_counter()
+        for data in self._chunks:
+            t = time.perf_counter()
+            result = parser.parse_bytes(data)
+            latencies.append(time.perf_counter() - t)
+            rows += len(result[1])
+            parsed.append(result)
+        seconds = time.perf_counter() - started
+        self._parsed = parsed
+        return _result(seconds, self.lines, rows, self.nbytes, latencies)
+
+    def _ensure_parsed(self):
+        self._ensure_chunks()
+        if self._parsed is None:
+            parser = LogParser()
+            self._parsed = [parser.parse_bytes(data) for data in self._chunks]
+
+    def bench_writer(self):
+        self._ensure_parsed()
+        writer = WriterProcess(batch_rows=self.batch_rows, batch_bytes=float("inf"), facade=NullSink())
+        # the rows go nowhere, so there is nothing to announce to /api/stream
+        writer.notifier.addr = None
+        latencies, rows = [], 0
+
+        def flush(reason):
+            t = time.perf_counter()
+            writer._flush(reason)
+            latencies.append(time.perf_counter() - t)
+
+        started = time.perf_counter()
+        with open(os.devnull, "w") as devnull:
+            stdout, sys.stdout = sys.stdout, devnull
+            try:
+                for item in self._parsed:
+                    writer._add_item(item)
+                    if len(writer.pending) >= self.batch_rows:
+                        flush("rows")
+                flush("shutdown")
+            finally:
+                sys.stdout = stdout
+        seconds = time.perf_counter() - started
+        rows = writer.flush_stats["rows"]
+        return _result(seconds, self.lines, rows, self.nbytes, latencies)
+
+    def bench_sink(self):
+        self._ensure_parsed()
+        facade = create_storage(self.backend, **self.storage_options)
+        rows = [
+            {"time": e["time"], "event": BENCH_EVENT_PREFIX + e["event"], "msg_id": None,
+             "msg_values": json.dumps(e["values"]) if e.get("values") else None, "value": e.get("value")}
+            for _, timeline in self._parsed for e in timeline
+        ]
+        latencies = []
+        event_types = sorted({r["event"] for r in rows})
+        started = time.perf_counter()
+        try:
+            for i in range(0, len(rows), self.batch_rows):
+                t = time.perf_counter()
+                facade.bulk_insert_timeline_events(rows[i:i + self.batch_rows])
+                latencies.append(time.perf_counter() - t)
+            seconds = time.perf_counter() - started
+        finally:
+            for event_type in event_types:
+                facade.delete_event_type(event_type)
+        return _result(seconds, self.lines, len(rows), self.nbytes, latencies)
+
+    def bench_e2e(self):
+        from log_processor import LogProcessor
+        if not self.lines:
+            self._ensure_chunks()
+        writer_facade = NullSink() if self.sink == "null" else BenchSink(self.backend, self.storage_options)
+        with tempfile.TemporaryDirectory(prefix="chronolog-bench-") as tmp:
+            kwargs = {"checkpoint": False, "writer_facade": writer_facade,
+                      "spill_dir": Path(tmp) / "spill", "metrics_dir": Path(tmp) / "metrics"}
+            if self.num_processes:
+                kwargs["num_processes"] = self.num_processes
+            if self.num_writers:
+                kwargs["num_writers"] = self.num_writers
+            lp = LogProcessor(self.log_path, **kwargs)
+            started = time.perf_counter()
+            try:
+                lp.start(live=False)
+                seconds = time.perf_counter() - started
+            finally:
+                if self.sink == "db":
+                    self._delete_bench_rows()
+            merged = metrics.collect(lp.metrics.directory)
+        result = _result(seconds, self.lines, lp.stats["events_enqueued"], self.nbytes, children=True)
+        for label, name in (("parse", "parse_seconds"), ("flush", "insert_seconds")):
+            hist = merged["histograms"].get(name)
+            for q in (0.5, 0.99):
+                value = histogram_quantile(hist, q)
+                result[f"{label}_p{int(q * 100)}_ms"] = round(value * 1000, 3) if value is not None else None
+        result["p50_ms"], result["p99_ms"] = result["flush_p50_ms"], result["flush_p99_ms"]
+        return result
+
+
+    def _delete_bench_rows(self):
+        self._ensure_parsed()
+        facade = create_storage(self.backend, **self.storage_options)
+        for event_type in sorted({e["event"] for _, timeline in self._parsed for e in timeline}):
+            facade.delete_event_type(BENCH_EVENT_PREFIX + event_type)
+
+
+def git_revision():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=Path(__file__).resolve().parent, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def build_report(settings, results):
+    """JSON-serializable report; settings describe the synthetic log and the benchmark options."""
+    return {
+        "commit": git_revision(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": settings,
+        "stages": results,
+    }
@@ -0,0 +1,251 @@
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from config import CHECKPOINT_DIR
+from input_sources import is_compressed
+
+# Leading bytes hashed to tell a re-created file with a recycled inode from the original
+HEAD_BYTES = 1024
+CHECKPOINT_VERSION = 1
+
+
+def checkpoint_path(input_file, directory=CHECKPOINT_DIR):
+    """One checkpoint file per input path: <file name>.<hash of the absolute path>.json"""
+    resolved = str(Path(input_file).resolve())
+    digest = hashlib.sha1(resolved.encode("utf-8")).hexdigest()[:12]
+    return Path(directory) / f"{Path(resolved).name}.{digest}.json"
+
+
+def head_digest(file_path, length):
+    with open(file_path, "rb") as f:
+        return hashlib.sha1(f.read(length)).hexdigest()
+
+
+class CheckpointTracker:
+    """
+    Tracks which byte ranges of the input file are committed to the database and persists them.
+
+    A range is committed once the writer that inserted its rows has flushed them (or right away
+    if it produced no rows). Ranges can complete out of order, so the tracker keeps the contiguous
+    committed offset plus the committed ranges beyond it. A restart resumes at the offset and
+    skips the ranges, so nothing that was flushed is inserted again.
+
+    Ranges are tagged with a file key (device, inode, generation); commits for another key, e.g.
+    a file that has been rotated away in live mode, are ignored.
+    For compressed inputs the offsets refer to the decompressed stream.
+
+    With a store (a StorageBackend), the writers also record each range in the transaction that
+    inserts its rows (IngestCheckpoints). The checkpoint file is saved a moment later, so resume()
+    adds the ranges recorded since, and save() prunes the ones the file now covers. A crash
+    between an insert and the next save therefore inserts nothing twice.
+    """
+    def __init__(self, input_file, directory=CHECKPOINT_DIR, store=None):
+        self.input_file = Path(input_file).resolve()
+        self.path = checkpoint_path(self.input_file, directory)
+        self.store = store
+        self._lock = threading.Lock()
+        self.key = None
+        self.offset = 0
+        self.committed = []
+        # Decompressed length of a compressed input once it has been read to the end
+        self.length = None
+        self.dirty = False
+        self.saves = 0
+        # Keys of files replaced since the last save whose recorded ranges are pruned with the next save
+        self.retired = []
+
+    def current_key(self, generation=0):
+        st = os.stat(self.input_file)
+        return (st.st_dev, st.st_ino, generation)
+
+    def reset(self, key):
+        """Starts tracking a new file (or a truncated one) from byte 0."""
+        with self._lock:
+            if self.key is not None and tuple(key[:2]) != tuple(self.key[:2]):
+                self.retired.append(self.key)
+            self.key = key
+            self.offset = 0
+            self.committed = []
+            self.length = None
+            self.dirty = True
+
+    def resume(self):
+        """
+        Loads the saved checkpoint if it still describes the input file and returns the offset to resume at.
+        Starts from 0 when there is no checkpoint or the file was replaced, truncated or rewritten.
+        Ranges the store recorded after the checkpoint was saved count as committed too.
+        """
+        key = self.current_key()
+        self.reset(key)
+        self.dirty = False
+        state = self._load()
+        if state is None:
+            # without a checkpoint nothing tells whether recorded ranges describe this file
+            self._forget_recorded()
+            return 0
+        reason = self._mismatch(state)
+        if reason:
+            print(f"Checkpoint ignored ({reason}), reading {self.input_file} from the start")
+            self._forget_recorded((state["dev"], state["inode"], 0))
+            self.dirty = True
+            return 0
+        with self._lock:
+            self.offset = state["offset"]
+            self.committed = [tuple(r) for r in state["committed"]]
+            self.length = state.get("length")
+        recorded = self.store.get_ingest_checkpoints(key) if self.store is not None else []
+        for start, end in recorded:
+            self.commit(key, start, end)
+        print(
+            f"Resuming {self.input_file.name} at byte {self.offset}"
+            + (f" ({len(self.committed)} committed ranges ahead)" if self.committed else "")
+            + (f", {len(recorded)} ranges recorded since the last save" if recorded else "")
+        )
+        return self.offset
+
+    def _forget_recorded(self, *keys):
+        """Removes the recorded ranges of the input file (and of the files of keys) from the store."""
+        if self.store is None:
+            return
+        for key in {self.current_key()} | set(keys):
+            self.store.prune_ingest_checkpoints(key)
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"Could not read checkpoint {self.path}: {e}")
+            return None
+        if state.get("version") != CHECKPOINT_VERSION:
+            return None
+        return state
+
+    def _mismatch(self, state):
+        st = os.stat(self.input_file)
+        if (state["dev"], state["inode"]) != (st.st_dev, st.st_ino):
+            return "different file"
+        committed_end = max([state["offset"]] + [end for _, end in state["committed"]])
+        if st.st_size < state["size"] or (st.st_size < committed_end and not is_compressed(self.input_file)):
+            return "file is smaller than when the checkpoint was saved"
+        if head_digest(self.input_file, state["head_len"]) != state["head_sha1"]:
+            return "file content changed"
+        return None
+
+    def commit(self, key, start, end):
+        """Marks [start, end) of the file identified by key as committed."""
+        if end <= start:
+            return
+        with self._lock:
+            if key != self.key:
+                return
+            ranges = self.committed
+            ranges.append((start, end))
+            ranges.sort()
+            merged = []
+            for s, e in ranges:
+                if merged and s <= merged[-1][1]:
+                    merged[-1] = (merged[-1][0], max(merged[-1][1], e))
+                else:
+                    merged.append((s, e))
+            while merged and merged[0][0] <= self.offset:
+                self.offset = max(self.offset, merged.pop(0)[1])
+            self.committed = merged
+            self.dirty = True
+
+    def set_length(self, key, length):
+        with self._lock:
+            if key == self.key and self.length != length:
+                self.length = length
+                self.dirty = True
+
+    def is_complete(self):
+        """True when a compressed input is known to be committed up to its end."""
+        return self.length is not None and self.offset >= self.length
+
+    def uncommitted(self, end):
+        """Byte ranges between the committed offset and end that still have to be processed."""
+        with self._lock:
+            gaps = []
+            pos = self.offset
+            for s, e in self.committed:
+                if s >= end:
+                    break
+                if s > pos:
+                    gaps.append((pos, s))
+                pos = max(pos, e)
+            if pos < end:
+                gaps.append((pos, end))
+            return gaps
+
+    def save(self, force=False):
+        """
+        Writes the checkpoint atomically (temporary file, fsync, rename), so a crash leaves
+        either the previous or the new checkpoint, never a partial one.
+        """
+        with self._lock:
+            if not self.dirty and not force:
+                return False
+            key = self.key
+            state = {
+                "version": CHECKPOINT_VERSION,
+                "file": str(self.input_file),
+                "offset": self.offset,
+                "committed": [list(r) for r in self.committed],
+                "length": self.length,
+            }
+            self.dirty = False
+        try:
+            st = os.stat(self.input_file)
+            if (st.st_dev, st.st_ino) != key[:2]:
+                # the path points to a file we have not read yet; keep the previous checkpoint
+                return False
+            head_len = min(st.st_size, HEAD_BYTES)
+            state.update({
+                "dev": st.st_dev,
+                "inode": st.st_ino,
+                "size": st.st_size,
+                "head_len": head_len,
+                "head_sha1": head_digest(self.input_file, head_len),
+                "saved_at": datetime.now().isoformat(timespec="seconds"),
+            })
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_name(self.path.name + ".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Could not save checkpoint {self.path}: {e}")
+            with self._lock:
+                self.dirty = True
+            return False
+        self.saves += 1
+        if self.store is not None:
+            with self._lock:
+                retired, self.retired = self.retired, []
+            try:
+                self.store.prune_ingest_checkpoints(key, state["offset"])
+                while retired:
+                    self.store.prune_ingest_checkpoints(retired[0])
+                    retired.pop(0)
+            except Exception as e:
+                # the ranges stay recorded and are pruned with the next save
+                print(f"Could not prune recorded checkpoints of {self.input_file.name}: {e}")
+                with self._lock:
+                    self.retired[:0] = retired
+        return True
+
+    def clear(self):
+        """Forgets the saved checkpoint and the recorded ranges, e.g. to re-ingest the file from the start."""
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        self._forget_recorded()
@@ -0,0 +1,63 @@
+from config import (
+    QUEUE_MAX_SIZE, CHUNK_MIN_BYTES, CHUNK_MAX_BYTES, LIVE_CHUNK_SECONDS, BATCH_CHUNK_SECONDS,
+    BATCH_RANGE_BYTES
+)
+
+# Weight of the newest parse rate sample in the moving average
+RATE_SMOOTHING = 0.3
+# Writer queue fill ratios below which the writers are starving and above which they lag behind
+QUEUE_LOW = 0.25
+QUEUE_HIGH = 0.75
+
+
+class AdaptiveChunkSizer:
+    """
+    Picks the size in bytes of the next chunk handed to a parse worker.
+
+    The base size is what a worker parses within target_seconds at the observed parse rate
+    (bytes/sec, moving average). Queue depth adjusts it: while the writer queue is nearly empty
+    chunks are halved so parsed rows reach the idle writers sooner; while it is nearly full
+    (writers lagging) they are doubled, so fewer, larger messages cross the process boundary.
+    The result is clamped to [min_bytes, max_bytes].
+    """
+    def __init__(self, target_seconds, initial_bytes, min_bytes=CHUNK_MIN_BYTES, max_bytes=CHUNK_MAX_BYTES,
+                 queue_capacity=QUEUE_MAX_SIZE):
+        self.target_seconds = target_seconds
+        self.min_bytes = min_bytes
+        self.max_bytes = max(min_bytes, max_bytes)
+        self.initial_bytes = initial_bytes
+        self.queue_capacity = queue_capacity
+        self.rate = None
+        self.queue_fill = None
+
+    @classmethod
+    def for_live(cls):
+        """Small chunks: a new line should reach the database within milliseconds."""
+        return cls(LIVE_CHUNK_SECONDS, initial_bytes=CHUNK_MIN_BYTES)
+
+    @classmethod
+    def for_batch(cls):
+        """Large chunks: throughput matters more than latency."""
+        return cls(BATCH_CHUNK_SECONDS, initial_bytes=BATCH_RANGE_BYTES)
+
+    def record_parse(self, nbytes, seconds):
+        """Feeds back how long a worker needed to parse nbytes."""
+        if nbytes <= 0 or seconds <= 0:
+            return
+        rate = nbytes / seconds
+        self.rate = rate if self.rate is None else (1 - RATE_SMOOTHING) * self.rate + RATE_SMOOTHING * rate
+
+    def record_queue(self, depth):
+        """Feeds back the current writer queue depth (None where the platform cannot report it)."""
+        if depth is None or not self.queue_capacity:
+            return
+        self.queue_fill = depth / self.queue_capacity
+
+    def chunk_bytes(self):
+        size = self.rate * self.target_seconds if self.rate is not None else self.initial_bytes
+        if self.queue_fill is not None:
+            if self.queue_fill <= QUEUE_LOW:
+                size /= 2
+            elif self.queue_fill >= QUEUE_HIGH:
+                size *= 2
+        return int(min(self.max_bytes, max(self.min_bytes, size)))
@@ -1,6 +1,10 @@
 ﻿import os
 from pathlib import Path
 import re
+from dotenv import load_dotenv
+
+# .env settings apply to every entry point, not only to those that open a SQL Server connection
+load_dotenv()
 
 # Root dir = ChronoLog/ (directory containing config.py)
 ROOT = Path(__file__).resolve().parent.parent
@@ -14,11 +18,89 @@ INPUT_FILE_PATH = Path(os.getenv("INPUT_FILE_PATH", DEFAULT_INPUT_FILE))
 CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "5000"))
 QUEUE_MAX_SIZE = int(os.getenv("QUEUE_MAX_SIZE", "100"))
 POLL_INTERVAL = float(os.getenv("POLL_INTERVAL", "0.5"))
+# How live mode waits for new data: "auto" (inotify when available), "inotify" or "poll" (sleep POLL_INTERVAL)
+TAIL_WATCHER = os.getenv("TAIL_WATCHER", "auto").strip().lower()
 NUM_PROCESSES = int(os.getenv("NUM_PROCESSES", "3"))
 NUM_WRITERS = int(os.getenv("NUM_WRITERS", "2"))
-WRITER_FLUSH_INTERVAL = 2.0
+BATCH_RANGE_BYTES = int(os.getenv("BATCH_RANGE_BYTES", str(8 * 1024 * 1024)))
+# Adaptive chunking sizes chunks in bytes from the observed parse rate and writer queue depth:
+# live chunks aim at LIVE_CHUNK_SECONDS of parsing, batch chunks at BATCH_CHUNK_SECONDS
+# (false = fixed CHUNK_SIZE lines in live mode and BATCH_RANGE_BYTES ranges in batch mode)
+ADAPTIVE_CHUNKS = os.getenv("ADAPTIVE_CHUNKS", "true").strip().lower() in ("1", "true", "yes")
+CHUNK_MIN_BYTES = int(os.getenv("CHUNK_MIN_BYTES", str(64 * 1024)))
+CHUNK_MAX_BYTES = int(os.getenv("CHUNK_MAX_BYTES", str(32 * 1024 * 1024)))
+LIVE_CHUNK_SECONDS = float(os.getenv("LIVE_CHUNK_SECONDS", "0.05"))
+BATCH_CHUNK_SECONDS = float(os.getenv("BATCH_CHUNK_SECONDS", "0.5"))
+# Writers flush when any of these is reached: pending rows, estimated payload bytes, seconds since the first pending row
+WRITER_BATCH_ROWS = int(os.getenv("WRITER_BATCH_ROWS", "5000"))
+WRITER_BATCH_BYTES = int(os.getenv("WRITER_BATCH_BYTES", str(4 * 1024 * 1024)))
+WRITER_FLUSH_INTERVAL = float(os.getenv("WRITER_FLUSH_INTERVAL", "2.0"))
+# A batch whose insert failed (other than on bad values) is kept and retried after WRITER_RETRY_SECONDS,
+# doubling per failure up to WRITER_RETRY_MAX_SECONDS; the writer takes no new rows meanwhile
+WRITER_RETRY_SECONDS = float(os.getenv("WRITER_RETRY_SECONDS", "1"))
+WRITER_RETRY_MAX_SECONDS = float(os.getenv("WRITER_RETRY_MAX_SECONDS", "30"))
 QUEUE_PUT_TIMEOUT = 1.0
+# Parse tasks handed to the pool but not finished yet (0 = twice the number of workers)
+MAX_INFLIGHT_CHUNKS = int(os.getenv("MAX_INFLIGHT_CHUNKS", "0"))
+STATS_INTERVAL = float(os.getenv("STATS_INTERVAL", "5.0"))
+# Parse results that do not fit into the full writer queue within SPILL_AFTER seconds are written
+# to segment files in SPILL_DIR (up to SPILL_MAX_BYTES) and inserted once the writers catch up
+SPILL_ENABLED = os.getenv("SPILL_ENABLED", "true").strip().lower() in ("1", "true", "yes")
+SPILL_DIR = Path(os.getenv("SPILL_DIR") or ROOT / "spill")
+SPILL_MAX_BYTES = int(os.getenv("SPILL_MAX_BYTES", str(1024 * 1024 * 1024)))
+SPILL_AFTER = float(os.getenv("SPILL_AFTER", "0.2"))
+# Committed byte offsets per input file, so a restarted processor resumes instead of re-ingesting
+CHECKPOINT_ENABLED = os.getenv("CHECKPOINT_ENABLED", "true").strip().lower() in ("1", "true", "yes")
+CHECKPOINT_DIR = Path(os.getenv("CHECKPOINT_DIR") or ROOT / "checkpoints")
+
+# Where events are stored: "mssql" (SQL Server via DB_CONNECTION_STRING) or "sqlite" (embedded file at SQLITE_PATH)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mssql").strip().lower()
+SQLITE_PATH = Path(os.getenv("SQLITE_PATH") or ROOT / "data" / "chronolog.db")
+# Seconds a SQLite writer waits for the write lock held by another writer
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", "30"))
+
+# Days of events kept by the retention job (python cli.py retention); 0 keeps everything
+RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", "0"))
+
+# How writers load rows: "executemany" (pyodbc fast_executemany), "tvp" (table-valued parameter) or "json" (OPENJSON procedure)
+BULK_INSERT_STRATEGY = os.getenv("BULK_INSERT_STRATEGY", "executemany").strip().lower()
+# Writers add per-minute rollups (EventRollupMinute/EventRollupTotal) in the insert transaction;
+# disable only for a database without the rollup tables and procedures
+ROLLUPS_ENABLED = os.getenv("ROLLUPS_ENABLED", "true").strip().lower() in ("1", "true", "yes")
+
+# Max message templates each writer keeps in memory (least recently used are evicted)
+MSG_CACHE_SIZE = int(os.getenv("MSG_CACHE_SIZE", "100000"))
+
+# Placeholder types used when turning messages into templates (see masking.MASK_PATTERNS)
+MASK_TYPES = [t.strip() for t in os.getenv("MASK_TYPES", "uuid,ip,hex,duration,path,num").split(",") if t.strip()]
 
 TRACK_VARIABLES = [v.strip() for v in os.getenv("TRACK_VARIABLES", "").split(",") if v.strip()]
 VAR_REGEX = {var: re.compile(rf"\b{re.escape(var)}=(\d+)\b") for var in TRACK_VARIABLES} if TRACK_VARIABLES else None
-KEY_VAL_RE = re.compile(r"\b([a-zA-Z_][a-zA-Z0-9_]*)=(\d+)\b")
\ No newline at end of file
+KEY_VAL_RE = re.compile(r"\b([a-zA-Z_][a-zA-Z0-9_]*)=(\d+)\b")
+# Scan raw bytes for the level keywords and tracked variables and decode only the lines that can match
+BYTES_PREFILTER = os.getenv("BYTES_PREFILTER", "true").strip().lower() in ("1", "true", "yes")
+
+# API response cache: entries are dropped when the ingest watermark moves (checked at most every
+# API_CACHE_WATERMARK_INTERVAL seconds) or after API_CACHE_TTL seconds
+API_CACHE_ENABLED = os.getenv("API_CACHE_ENABLED", "true").strip().lower() in ("1", "true", "yes")
+API_CACHE_SIZE = int(os.getenv("API_CACHE_SIZE", "256"))
+API_CACHE_TTL = float(os.getenv("API_CACHE_TTL", "30"))
+API_CACHE_WATERMARK_INTERVAL = float(os.getenv("API_CACHE_WATERMARK_INTERVAL", "1"))
+
+# Writers send a UDP datagram to STREAM_NOTIFY_ADDR after every flush (empty disables it); the API reads
+# the new events once per notification (or every STREAM_POLL_INTERVAL seconds) for all /api/stream clients
+STREAM_NOTIFY_ADDR = os.getenv("STREAM_NOTIFY_ADDR", "127.0.0.1:8765").strip()
+STREAM_POLL_INTERVAL = float(os.getenv("STREAM_POLL_INTERVAL", "5"))
+STREAM_MIN_INTERVAL = float(os.getenv("STREAM_MIN_INTERVAL", "0.25"))
+STREAM_BATCH_ROWS = int(os.getenv("STREAM_BATCH_ROWS", "500"))
+STREAM_CLIENT_QUEUE = int(os.getenv("STREAM_CLIENT_QUEUE", "1000"))
+STREAM_MAX_CLIENTS = int(os.getenv("STREAM_MAX_CLIENTS", "100"))
+STREAM_KEEPALIVE = float(os.getenv("STREAM_KEEPALIVE", "15"))
+# Seconds the stream keeps re-reading ids skipped below its cursor (rows committed out of id order)
+STREAM_GAP_TIMEOUT = float(os.getenv("STREAM_GAP_TIMEOUT", "30"))
+
+# Every pipeline process writes its counters and histograms to METRICS_DIR every METRICS_INTERVAL seconds;
+# the API (/metrics) and cli.py status merge them
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").strip().lower() in ("1", "true", "yes")
+METRICS_DIR = Path(os.getenv("METRICS_DIR") or ROOT / "metrics")
+METRICS_INTERVAL = float(os.getenv("METRICS_INTERVAL", "1"))
\ No newline at end of file
@@ -1,19 +1,197 @@
 import pyodbc
 import os
+import threading
+import time
 from dotenv import load_dotenv
+from storage import DatabaseConnectionError
 
 load_dotenv()
 
-class DatabaseConnectionError(Exception):
-    pass
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_IDLE_TIMEOUT = float(os.getenv("DB_POOL_IDLE_TIMEOUT", "300"))
+DB_POOL_HEALTH_CHECK_INTERVAL = float(os.getenv("DB_POOL_HEALTH_CHECK_INTERVAL", "30"))
+
+
+# SQLSTATEs outside class 08 (connection exceptions, e.g. 08S01 link failure) that also mean the
+# connection is gone: HYT01 connection timeout
+CONNECTION_SQLSTATES = ("HYT01",)
+
+
+def is_connection_error(error):
+    """
+    True if a pyodbc error means the connection itself is unusable, judged by its SQLSTATE.
+    Query timeouts (HYT00), deadlocks (40001) and other OperationalErrors leave the connection
+    usable and must not reset it or be retried blindly.
+    """
+    sqlstate = str(error.args[0]) if error.args else ""
+    return sqlstate.startswith("08") or sqlstate in CONNECTION_SQLSTATES
+
+class ConnectionPool:
+    """
+    Bounded pool of pyodbc connections shared by the threads of one process.
+    Connections are never shared between processes: a pool inherited through fork
+    notices the new PID and starts empty in the child.
+    """
+    def __init__(self, connection_string, size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT,
+                 idle_timeout=DB_POOL_IDLE_TIMEOUT, health_check_interval=DB_POOL_HEALTH_CHECK_INTERVAL):
+        self.connection_string = connection_string
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._cond = threading.Condition()
+        self._idle = [] # (connection, last_used), most recently used last
+        self._in_use = 0
+        self.stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_time": 0.0,
+            "created": 0,
+            "reconnects": 0,
+            "evicted": 0,
+            "discarded": 0,
+        }
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            # Forked child: the inherited connections and lock belong to the parent
+            self._reset()
+
+    def _connect(self):
+        try:
+            conn = pyodbc.connect(self.connection_string)
+        except pyodbc.Error as e:
+            raise DatabaseConnectionError(f"Failed to connect to database: {e}")
+        with self._cond:
+            self.stats["created"] += 1
+        return conn
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @staticmethod
+    def _is_healthy(conn):
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT 1")
+                cursor.fetchall()
+            finally:
+                cursor.close()
+            return True
+        except pyodbc.Error:
+            return False
+
+    def _evict_idle(self, now):
+        # Oldest connections sit at the front of the list
+        while self._idle and now - self._idle[0][1] > self.idle_timeout:
+            conn, _ = self._idle.pop(0)
+            self._close(conn)
+            self.stats["evicted"] += 1
+
+    def acquire(self):
+        """
+        Checks out a connection, waiting up to `timeout` seconds when all of them are in use.
+        """
+        self._check_pid()
+        deadline = time.monotonic() + self.timeout
+        conn = None
+        last_used = None
+        with self._cond:
+            self.stats["checkouts"] += 1
+            wait_start = None
+            while True:
+                now = time.monotonic()
+                self._evict_idle(now)
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._in_use < self.size:
+                    break
+                if wait_start is None:
+                    wait_start = now
+                    self.stats["waits"] += 1
+                if now >= deadline:
+                    self.stats["wait_time"] += now - wait_start
+                    raise DatabaseConnectionError(f"Timed out after {self.timeout}s waiting for a pooled database connection")
+                self._cond.wait(deadline - now)
+            if wait_start is not None:
+                self.stats["wait_time"] += time.monotonic() - wait_start
+            self._in_use += 1
+
+        try:
+            if conn is None:
+                conn = self._connect()
+            elif time.monotonic() - last_used > self.health_check_interval and not self._is_healthy(conn):
+                self._close(conn)
+                conn = self._connect()
+                with self._cond:
+                    self.stats["reconnects"] += 1
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return conn
+
+    def release(self, conn, discard=False):
+        """
+        Returns a connection to the pool. Broken connections should be released with discard=True.
+        """
+        if self._pid != os.getpid():
+            self._close(conn)
+            return
+        if not discard:
+            try:
+                # Leave no open transaction behind for the next borrower
+                conn.rollback()
+            except pyodbc.Error:
+                discard = True
+        if discard:
+            self._close(conn)
+        with self._cond:
+            self._in_use -= 1
+            if discard:
+                self.stats["discarded"] += 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def record_reconnect(self):
+        with self._cond:
+            self.stats["reconnects"] += 1
+
+    def get_stats(self):
+        with self._cond:
+            stats = dict(self.stats)
+            stats["size"] = self.size
+            stats["in_use"] = self._in_use
+            stats["idle"] = len(self._idle)
+        return stats
+
+    def close(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._close(conn)
 
 class SQLConnection:
-    def __init__(self):
+    def __init__(self, pool_size=DB_POOL_SIZE):
         self.connection_string = os.getenv("DB_CONNECTION_STRING")
         if not self.connection_string:
             raise ValueError("DB_CONNECTION_STRING environment variable not set")
         
         self._ensure_database_exists()
+        self.pool = ConnectionPool(self.connection_string, size=pool_size)
 
     def _ensure_database_exists(self):
         """
@@ -47,61 +225,118 @@ class SQLConnection:
 
     def get_connection(self):
         """
-        Returns a new connection.
+        Returns a new, unpooled connection. The caller is responsible for closing it.
         """
         try:
             return pyodbc.connect(self.connection_string)
         except pyodbc.Error as e:
             raise DatabaseConnectionError(f"Failed to connect to database: {e}")
 
-    def execute_query(self, query, params=None):
-        conn = self.get_connection()
-        cursor = conn.cursor()
+    def _run(self, work, commit=False):
+        """
+        Runs work(cursor) on a pooled connection and returns its result.
+        If the connection turns out to be broken before anything was committed,
+        it is discarded and the work is retried once on a fresh connection.
+        """
+        for attempt in (1, 2):
+            conn = self.pool.acquire()
+            cursor = None
+            try:
+                cursor = conn.cursor()
+                result = work(cursor)
+            except pyodbc.Error as e:
+                broken = is_connection_error(e)
+                if cursor is not None:
+                    self._close_cursor(cursor)
+                self.pool.release(conn, discard=broken)
+                if broken and attempt == 1:
+                    self.pool.record_reconnect()
+                    continue
+                if broken:
+                    raise DatabaseConnectionError(f"Database connection lost: {e}")
+                raise
+            except BaseException:
+                if cursor is not None:
+                    self._close_cursor(cursor)
+                self.pool.release(conn, discard=True)
+                raise
+
+            try:
+                if commit:
+                    conn.commit()
+            except pyodbc.Error as e:
+                # The commit may or may not have reached the server, so it is never retried
+                self._close_cursor(cursor)
+                self.pool.release(conn, discard=is_connection_error(e))
+                raise
+            self._close_cursor(cursor)
+            self.pool.release(conn)
+            return result
+
+    @staticmethod
+    def _close_cursor(cursor):
         try:
+            cursor.close()
+        except pyodbc.Error:
+            pass
+
+    def get_pool_stats(self):
+        return self.pool.get_stats()
+
+    def execute_query(self, query, params=None):
+        def work(cursor):
             if params:
                 cursor.execute(query, params)
             else:
                 cursor.execute(query)
             return cursor.fetchall()
-        finally:
-            cursor.close()
-            conn.close()
+        return self._run(work)
 
     def execute_non_query(self, query, params=None):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        try:
+        def work(cursor):
             if params:
                 cursor.execute(query, params)
             else:
                 cursor.execute(query)
-            conn.commit()
-        finally:
-            cursor.close()
-            conn.close()
+        self._run(work, commit=True)
+
+    def execute_many(self, query, rows, input_sizes=None, fast_executemany=True, then_sp=None):
+        """
+        Executes a parameterized statement for every row in one transaction.
+        With fast_executemany the driver sends the rows as a parameter array instead of one round trip per row.
+        then_sp = (sp_name, params), or a list of them, are stored procedures run in order in the
+        same transaction after the rows.
+        """
+        calls = then_sp if isinstance(then_sp, list) else [then_sp] if then_sp else []
+
+        def work(cursor):
+            cursor.fast_executemany = fast_executemany
+            if input_sizes:
+                cursor.setinputsizes(input_sizes)
+            cursor.executemany(query, rows)
+            if calls:
+                # parameter types set for the rows must not apply to the procedure calls
+                cursor.setinputsizes(None)
+            for call in calls:
+                self._call_sp(cursor, *call)
+        self._run(work, commit=True)
 
     def execute_sp(self, sp_name, params=None):
         """
         Executes a stored procedure.
         """
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        try:
-            if params:
-                placeholders = ",".join(["?"] * len(params))
-                sql = f"{{CALL {sp_name} ({placeholders})}}"
-                cursor.execute(sql, params)
-            else:
-                sql = f"{{CALL {sp_name}}}"
-                cursor.execute(sql)
-            
-            if cursor.description:
-                result = cursor.fetchall()
-                conn.commit()
-                return result
-            
-            conn.commit()
-            return None
-        finally:
-            cursor.close()
-            conn.close()
+        return self._run(lambda cursor: self._call_sp(cursor, sp_name, params), commit=True)
+
+    @staticmethod
+    def _call_sp(cursor, sp_name, params=None):
+        if params:
+            placeholders = ",".join(["?"] * len(params))
+            sql = f"{{CALL {sp_name} ({placeholders})}}"
+            cursor.execute(sql, params)
+        else:
+            sql = f"{{CALL {sp_name}}}"
+            cursor.execute(sql)
+        
+        if cursor.description:
+            return cursor.fetchall()
+        return None
@@ -0,0 +1,50 @@
+# Multiplier for the bucket count fetched before LTTB picks the final points:
+# enough resolution for peaks to survive, still a bounded query
+LTTB_OVERSAMPLE = 8
+
+DOWNSAMPLE_MODES = ("bucket", "lttb")
+
+
+def lttb(points, threshold, key=None):
+    """
+    Largest-Triangle-Three-Buckets downsampling: reduces points (sorted by x) to threshold points
+    that keep the visual shape of the series, including spikes that averaging would flatten.
+    The first and last points are always kept; from every bucket in between the point forming
+    the largest triangle with the previously selected point and the average of the next bucket wins.
+
+    key(point) returns (x, y) as numbers; by default the points are (x, y) pairs themselves.
+    The selected points are returned unchanged.
+    """
+    n = len(points)
+    if threshold >= n or threshold <= 0:
+        return list(points)
+    if threshold < 3:
+        return [points[0], points[-1]][:threshold]
+    xy = [key(p) for p in points] if key else points
+
+    sampled = [points[0]]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # average of the next bucket (the last point for the final bucket)
+        avg_start = int((i + 1) * every) + 1
+        avg_end = min(int((i + 2) * every) + 1, n)
+        if avg_end <= avg_start:
+            avg_start, avg_end = n - 1, n
+        count = avg_end - avg_start
+        avg_x = sum(xy[j][0] for j in range(avg_start, avg_end)) / count
+        avg_y = sum(xy[j][1] for j in range(avg_start, avg_end)) / count
+
+        ax, ay = xy[a]
+        range_start = int(i * every) + 1
+        range_end = int((i + 1) * every) + 1
+        best, best_area = range_start, -1.0
+        for j in range(range_start, range_end):
+            x, y = xy[j]
+            area = abs((ax - avg_x) * (y - ay) - (ax - x) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        sampled.append(points[best])
+        a = best
+    sampled.append(points[-1])
+    return sampled
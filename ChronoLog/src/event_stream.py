@@ -0,0 +1,310 @@
+import json
+import queue
+import socket
+import threading
+import time
+from config import (
+    STREAM_NOTIFY_ADDR, STREAM_POLL_INTERVAL, STREAM_MIN_INTERVAL, STREAM_BATCH_ROWS, STREAM_CLIENT_QUEUE,
+    STREAM_MAX_CLIENTS, STREAM_GAP_TIMEOUT, WRITER_BATCH_ROWS
+)
+
+# A notification is a few hundred bytes; anything larger is not ours
+MAX_DATAGRAM = 8192
+
+# Open gap ranges the stream keeps re-reading; the oldest are given up beyond this
+MAX_GAP_RANGES = 64
+
+
+def parse_addr(addr):
+    """Splits "host:port" into a (host, port) tuple; empty means disabled (None)."""
+    if not addr:
+        return None
+    host, _, port = addr.rpartition(":")
+    return (host or "127.0.0.1", int(port))
+
+
+def format_sse(event, data, event_id=None):
+    """Encodes one Server-Sent Events message."""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+class FlushNotifier:
+    """
+    Tells the API that a writer has committed new rows: one fire-and-forget UDP datagram per flush
+    with the number of rows per event type. Sending never blocks and never fails the flush;
+    a lost datagram only delays the stream until the broadcaster's next poll.
+    Only the address is stored until the first send, so the notifier can be handed to other processes.
+    """
+    def __init__(self, addr=STREAM_NOTIFY_ADDR):
+        self.addr = parse_addr(addr)
+        self._sock = None
+
+    def notify(self, rows):
+        if self.addr is None or not rows:
+            return
+        counts = {}
+        for row in rows:
+            counts[row["event"]] = counts.get(row["event"], 0) + 1
+        payload = json.dumps({"rows": len(rows), "counts": counts}).encode("utf-8")
+        try:
+            if self._sock is None:
+                self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                self._sock.setblocking(False)
+            self._sock.sendto(payload, self.addr)
+        except OSError:
+            # nobody listening or the buffer is full; the API polls as a fallback
+            pass
+
+
+class Subscription:
+    """One connected stream client: a bounded queue of encoded messages and an optional event type filter."""
+    def __init__(self, event_types=None, max_queue=STREAM_CLIENT_QUEUE):
+        self.event_types = set(event_types) if event_types else None
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.lagged = False
+
+    def wants(self, event_type):
+        return self.event_types is None or event_type in self.event_types
+
+    def offer(self, message):
+        """Queues a message; a client that cannot keep up is marked lagged and disconnected."""
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            self.lagged = True
+
+    def next(self, timeout):
+        """Next message, or None when the timeout passes (time for a keepalive)."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventBroadcaster:
+    """
+    Feeds every stream subscriber from one reader, so the database load does not grow with the
+    number of open dashboards.
+
+    A single background thread waits for flush notifications (or polls the ingest watermark every
+    poll_interval when none arrive, e.g. for writers on another host), then reads the events after
+    its cursor with one keyset query and the counters with one summary query, and fans both out to
+    the subscribers. Notifications arriving in a burst are coalesced to at most one read per
+    min_interval. The thread runs only while there are subscribers.
+
+    Writers draw EventIds before they commit, so a lower id can become visible after a higher one.
+    Ids skipped below the cursor are kept as gap ranges for gap_timeout seconds (a rolled back insert
+    never fills its ids); while any are open, reads start at the oldest gap and deliver the late rows.
+    A run of missing ids longer than max_gap (a writer batch) cannot be a pending insert, e.g. an
+    IDENTITY jump after a server restart, and is not tracked.
+    """
+    def __init__(self, facade, addr=STREAM_NOTIFY_ADDR, poll_interval=STREAM_POLL_INTERVAL,
+                 min_interval=STREAM_MIN_INTERVAL, batch_rows=STREAM_BATCH_ROWS, max_clients=STREAM_MAX_CLIENTS,
+                 gap_timeout=STREAM_GAP_TIMEOUT, max_gap=WRITER_BATCH_ROWS):
+        self.facade = facade
+        self.addr = parse_addr(addr)
+        self.poll_interval = poll_interval
+        self.min_interval = min_interval
+        self.batch_rows = batch_rows
+        self.max_clients = max_clients
+        self.gap_timeout = gap_timeout
+        self.max_gap = max_gap
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self._thread = None
+        self._sock = None
+        self.cursor = None
+        self.watermark = None
+        # [first id, last id, monotonic deadline] of id runs below the cursor not visible yet, oldest first
+        self.gaps = []
+        self.stats = {"notifications": 0, "reads": 0, "events": 0, "dropped": 0, "late": 0}
+
+    def subscribe(self, event_types=None):
+        """Registers a client; returns None when max_clients are already connected."""
+        sub = Subscription(event_types)
+        with self._lock:
+            if len(self._subscribers) >= self.max_clients:
+                return None
+            self._subscribers.append(sub)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="EventBroadcaster", daemon=True)
+                self._thread.start()
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            if sub in self._subscribers:
+                self._subscribers.remove(sub)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def _run(self):
+        self._open_socket()
+        self.cursor = None
+        self.watermark = None
+        self.gaps = []
+        try:
+            # start at the newest event; a read error here is retried by publish()
+            self.watermark = self.facade.get_ingest_watermark()
+            self.cursor = self.watermark[0] or 0
+        except Exception as e:
+            print(f"Event stream could not read the ingest watermark: {e}", flush=True)
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    # decided under the lock, so a new subscriber either sees this thread alive or starts one
+                    self._close_socket()
+                    self._thread = None
+                    return
+            try:
+                if self._wait() or self._watermark_moved() or self.gaps:
+                    self.publish()
+            except Exception as e:
+                print(f"Event stream read failed: {e}", flush=True)
+                time.sleep(self.poll_interval)
+
+    def _open_socket(self):
+        if self.addr is None:
+            return
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind(self.addr)
+            self._sock = sock
+        except OSError as e:
+            # e.g. another API process owns the port; polling still delivers, only later
+            print(f"Event stream not listening on {self.addr[0]}:{self.addr[1]} ({e}), polling instead", flush=True)
+
+    def _close_socket(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def _wait(self):
+        """
+        Blocks until a flush notification arrives or poll_interval passes, then swallows the
+        notifications that follow within min_interval. Returns True if anything was flushed.
+        """
+        if self._sock is None:
+            time.sleep(self.poll_interval)
+            return False
+        self._sock.settimeout(self.poll_interval)
+        try:
+            self._sock.recv(MAX_DATAGRAM)
+        except OSError:
+            # socket.timeout is an OSError as well
+            return False
+        self.stats["notifications"] += 1
+        deadline = time.monotonic() + self.min_interval
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self._sock.settimeout(remaining)
+            try:
+                self._sock.recv(MAX_DATAGRAM)
+                self.stats["notifications"] += 1
+            except OSError:
+                break
+        return True
+
+    def _watermark_moved(self):
+        watermark = self.facade.get_ingest_watermark()
+        moved = self.watermark is not None and watermark != self.watermark
+        self.watermark = watermark
+        return moved
+
+    def publish(self):
+        """Reads the events committed since the last read and hands them to the subscribers."""
+        if self.cursor is None:
+            self.cursor = self.facade.get_ingest_watermark()[0] or 0
+        now = time.monotonic()
+        self.gaps = [gap for gap in self.gaps if gap[2] > now]
+        last = self.cursor
+        after_id = self.gaps[0][0] - 1 if self.gaps else last
+        events = []
+        late = []
+        while True:
+            page = self.facade.get_timeline_page(per_page=self.batch_rows, after_id=after_id)
+            self.stats["reads"] += 1
+            if not page:
+                break
+            # pages come newest first
+            page.reverse()
+            for event in page:
+                if event["id"] > last:
+                    events.append(event)
+                elif self._in_gap(event["id"]):
+                    events.append(event)
+                    late.append(event["id"])
+            after_id = page[-1]["id"]
+            if len(page) < self.batch_rows:
+                break
+        if late:
+            self.stats["late"] += len(late)
+            self._fill_gaps(late)
+        if events:
+            events.sort(key=lambda e: e["id"])
+            previous = last
+            for event in events:
+                if event["id"] <= last:
+                    continue
+                if event["id"] > previous + 1:
+                    self._open_gap(previous + 1, event["id"] - 1, now + self.gap_timeout)
+                previous = event["id"]
+            self.cursor = previous
+        summary = self.facade.get_summary() if events else None
+        self.stats["events"] += len(events)
+        self._fan_out(events, summary)
+        return len(events)
+
+    def _in_gap(self, event_id):
+        return any(first <= event_id <= last for first, last, _ in self.gaps)
+
+    def _open_gap(self, first, last, deadline):
+        if last - first + 1 > self.max_gap:
+            return
+        self.gaps.append([first, last, deadline])
+        if len(self.gaps) > MAX_GAP_RANGES:
+            self.gaps.pop(0)
+
+    def _fill_gaps(self, ids):
+        """Splits the gap ranges around the ids that have been delivered."""
+        ids = sorted(ids)
+        remaining = []
+        for first, last, deadline in self.gaps:
+            start = first
+            for event_id in ids:
+                if event_id < start or event_id > last:
+                    continue
+                if event_id > start:
+                    remaining.append([start, event_id - 1, deadline])
+                start = event_id + 1
+            if start <= last:
+                remaining.append([start, last, deadline])
+        self.gaps = remaining[-MAX_GAP_RANGES:]
+
+    def _fan_out(self, events, summary):
+        # every message is encoded once, whatever the number of subscribers
+        messages = []
+        for event in events:
+            event = {k: v for k, v in event.items() if k != "total_count"}
+            messages.append((event["event"], format_sse("event", event, event["id"])))
+        summary_message = format_sse("summary", summary) if summary else None
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            for event_type, message in messages:
+                if sub.wants(event_type):
+                    sub.offer(message)
+            if summary_message:
+                sub.offer(summary_message)
+            if sub.lagged:
+                self.stats["dropped"] += 1
+                self.unsubscribe(sub)
@@ -1,10 +1,85 @@
 import json
+import re
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+import pyodbc
 from db import SQLConnection
+from config import BULK_INSERT_STRATEGY, ROLLUPS_ENABLED
+from storage import StorageBackend, RowsRejectedError, minute_rollups, checkpoint_rows, file_id
 
-class ChronoLogFacade:
-    def __init__(self):
+BULK_INSERT_STRATEGIES = ("executemany", "tvp", "json")
+
+# SQL Server errors meaning a bulk insert strategy is not installed: 2715 type not found (table type),
+# 2812 stored procedure not found. pyodbc reports the native code in parentheses in the message.
+MISSING_OBJECT_ERRORS = (2715, 2812)
+# Driver SQLSTATEs for an optional feature (e.g. parameter arrays) it does not implement
+UNSUPPORTED_SQLSTATES = ("HYC00", "IM001")
+NATIVE_ERROR_RE = re.compile(r"\((\d+)\)")
+
+
+def strategy_unavailable(error):
+    """
+    True if a bulk insert error means the strategy itself is unavailable, as opposed to a
+    permission, schema or data error of this batch.
+    """
+    if isinstance(error, pyodbc.NotSupportedError):
+        return True
+    sqlstate = str(error.args[0]) if error.args else ""
+    if sqlstate in UNSUPPORTED_SQLSTATES:
+        return True
+    message = " ".join(str(arg) for arg in error.args[1:])
+    return any(int(code) in MISSING_OBJECT_ERRORS for code in NATIVE_ERROR_RE.findall(message))
+
+
+def _sp_params(*params):
+    """Procedure parameters without the trailing NULLs, so optional parameters keep their defaults."""
+    params = list(params)
+    while params and params[-1] is None:
+        params.pop()
+    return tuple(params)
+
+
+INSERT_TIMELINE_EVENT_SQL = (
+    "INSERT INTO [dbo].[TimelineEvents] ([EventTime], [EventType], [MessageId], [MessageValues], [Value]) "
+    "VALUES (?, ?, ?, ?, ?)"
+)
+
+# Fixed parameter types for fast_executemany, so NULLs in the first row cannot change the binding
+TIMELINE_EVENT_INPUT_SIZES = [
+    (pyodbc.SQL_TYPE_TIMESTAMP, 0, 0),
+    (pyodbc.SQL_WVARCHAR, 50, 0),
+    (pyodbc.SQL_INTEGER, 0, 0),
+    (pyodbc.SQL_WVARCHAR, 500, 0),
+    (pyodbc.SQL_DECIMAL, 18, 2),
+]
+
+
+class ChronoLogFacade(StorageBackend):
+    """SQL Server storage backend: stored procedures called through pyodbc."""
+    def __init__(self, bulk_insert_strategy=BULK_INSERT_STRATEGY, rollups=ROLLUPS_ENABLED):
+        if bulk_insert_strategy not in BULK_INSERT_STRATEGIES:
+            raise ValueError(f"Unknown bulk insert strategy '{bulk_insert_strategy}', expected one of {BULK_INSERT_STRATEGIES}")
+        self.bulk_insert_strategy = bulk_insert_strategy
+        self.rollups = rollups
         self.db = SQLConnection()
 
+    def get_pool_stats(self):
+        """
+        Connection pool statistics: checkouts, waits, wait time, created, reconnects, evicted, in use.
+        """
+        return self.db.get_pool_stats()
+
+    def get_ingest_watermark(self):
+        """
+        Returns a tuple that changes whenever events or templates are added (or events deleted),
+        used to invalidate cached API responses.
+        """
+        rows = self.db.execute_sp("sp_GetIngestWatermark")
+        if not rows:
+            return None
+        row = rows[0]
+        return (row.MaxEventId, row.MaxMessageId, row.EventCount)
+
     def get_messages(self):
         """
         Retrieves all message templates.
@@ -13,6 +88,29 @@ class ChronoLogFacade:
         rows = self.db.execute_query("SELECT MessageId, Template FROM Messages")
         return {str(row.MessageId): row.Template for row in rows}
 
+    def get_message_ids(self, limit):
+        """
+        Retrieves up to `limit` of the most recently created templates.
+        Returns a dict {template: id}
+        """
+        rows = self.db.execute_query(
+            "SELECT TOP (?) MessageId, Template FROM Messages ORDER BY MessageId DESC", (limit,)
+        )
+        return {row.Template: int(row.MessageId) for row in rows}
+
+    def get_or_create_message_ids(self, templates):
+        """
+        Gets or creates IDs for many templates in a single round trip.
+        Returns a dict {template: id}
+        """
+        templates = list(templates)
+        if not templates:
+            return {}
+        rows = self.db.execute_sp("sp_GetOrInsertMessages", (json.dumps(templates),))
+        if not rows:
+            return {}
+        return {row.Template: int(row.MessageId) for row in rows}
+
     def get_or_create_message_id(self, template):
         """
         Gets existing message ID or creates a new one.
@@ -40,24 +138,114 @@ class ChronoLogFacade:
             val
         ))
 
-    def bulk_insert_timeline_events(self, events):
+    def bulk_insert_timeline_events(self, events, strategy=None, checkpoints=None):
         """
         Bulk inserts timeline events.
         events: list of dicts with keys: time, event, msg_id, msg_values, value
+        strategy: overrides the configured strategy for this call.
+        checkpoints: input byte ranges (file key, start, end) recorded in IngestCheckpoints.
+        The typed strategies fall back to the JSON procedure if the database does not support them.
+        With rollups the per-minute aggregates of the events are merged in the same transaction,
+        and so are the checkpoints.
+        Raises RowsRejectedError if values of the batch are refused (nothing is inserted then).
         """
         if not events:
             return
-            
+        try:
+            self._bulk_insert(events, strategy, checkpoints)
+        except (pyodbc.DataError, pyodbc.IntegrityError, ValueError, InvalidOperation) as e:
+            # SQLSTATE class 22/23 or a row that cannot be converted; the statement was rolled back
+            raise RowsRejectedError(str(e)) from e
+
+    def _bulk_insert(self, events, strategy, checkpoints=None):
+
+        strategy = strategy or self.bulk_insert_strategy
+        rollups_json = json.dumps(minute_rollups(events)) if self.rollups else None
+        checkpoints_json = json.dumps(checkpoint_rows(checkpoints)) if checkpoints else None
+        if strategy == "json":
+            self._bulk_insert_json(events, rollups_json, checkpoints_json)
+            return
+
+        rows = [self._to_typed_row(e) for e in events]
+        try:
+            if strategy == "tvp":
+                self.db.execute_sp("sp_BulkInsertTimelineEventsTvp", _sp_params(rows, rollups_json, checkpoints_json))
+            else:
+                then_sp = []
+                if rollups_json:
+                    then_sp.append(("sp_MergeEventRollups", (rollups_json,)))
+                if checkpoints_json:
+                    then_sp.append(("sp_RecordIngestCheckpoints", (checkpoints_json,)))
+                self.db.execute_many(INSERT_TIMELINE_EVENT_SQL, rows, input_sizes=TIMELINE_EVENT_INPUT_SIZES,
+                                     then_sp=then_sp or None)
+        except pyodbc.Error as e:
+            if not strategy_unavailable(e):
+                raise
+            # Missing table type / procedure or a driver without parameter arrays: the whole
+            # statement was rolled back, so the JSON path can safely insert the same rows.
+            print(f"Bulk insert strategy '{strategy}' unavailable ({e}), falling back to JSON")
+            if strategy == self.bulk_insert_strategy:
+                self.bulk_insert_strategy = "json"
+            self._bulk_insert_json(events, rollups_json, checkpoints_json)
+
+    def _bulk_insert_json(self, events, rollups_json=None, checkpoints_json=None):
         # Convert list of dicts to JSON string
         events_json = json.dumps(events)
-        self.db.execute_sp("sp_BulkInsertTimelineEvents", (events_json,))
+        self.db.execute_sp("sp_BulkInsertTimelineEvents", _sp_params(events_json, rollups_json, checkpoints_json))
+
+    def get_ingest_checkpoints(self, key):
+        rows = self.db.execute_query(
+            "SELECT StartOffset, EndOffset FROM IngestCheckpoints WHERE FileId = ? AND Generation = ? "
+            "ORDER BY StartOffset",
+            (file_id(key), key[2]),
+        )
+        return [(int(row.StartOffset), int(row.EndOffset)) for row in rows]
+
+    def prune_ingest_checkpoints(self, key, offset=None):
+        if offset is None:
+            self.db.execute_non_query("DELETE FROM IngestCheckpoints WHERE FileId = ?", (file_id(key),))
+            return
+        self.db.execute_non_query(
+            "DELETE FROM IngestCheckpoints WHERE FileId = ? AND (Generation <> ? OR EndOffset <= ?)",
+            (file_id(key), key[2], offset),
+        )
+
+    @staticmethod
+    def _to_typed_row(event):
+        """
+        Converts an event dict into a parameter tuple matching the TimelineEvents columns.
+        """
+        event_time = event.get("time")
+        if isinstance(event_time, str):
+            event_time = datetime.fromisoformat(event_time)
+        msg_id = event.get("msg_id")
+        value = event.get("value")
+        return (
+            event_time,
+            event["event"],
+            int(msg_id) if msg_id is not None else None,
+            event.get("msg_values"),
+            Decimal(str(value)).quantize(Decimal("0.01")) if value is not None else None,
+        )
 
-    def get_timeline_page(self, page=1, per_page=30, event_type=None):
+    def get_timeline_page(self, page=1, per_page=30, event_type=None, before_id=None, after_id=None,
+                          keyset=False, include_total=False):
         """
-        Retrieves a page of timeline events.
+        Retrieves a page of timeline events, newest first.
         Returns a list of dictionaries.
+
+        With before_id or after_id (or keyset=True for the newest page) the page is found by seeking
+        on EventId instead of OFFSET: before_id returns older events, after_id newer ones, and the
+        ids of the last/first returned row are the cursors for the next/previous page. Every page
+        costs the same. total_count is then only filled with include_total (taken from the rollups)
+        and page is ignored.
         """
-        rows = self.db.execute_sp("sp_GetTimelinePage", (page, per_page, event_type))
+        if keyset or before_id is not None or after_id is not None:
+            rows = self.db.execute_sp(
+                "sp_GetTimelineSeek", (before_id, after_id, per_page, event_type, 1 if include_total else 0)
+            )
+        else:
+            rows = self.db.execute_sp("sp_GetTimelinePage", (page, per_page, event_type))
         if not rows:
             return []
         
@@ -97,12 +285,37 @@ class ChronoLogFacade:
             }
         }
 
-    def get_timeseries(self, metric, limit=500):
+    def delete_event_type(self, event_type):
+        for table in ("TimelineEvents", "EventRollupMinute", "EventRollupTotal"):
+            self.db.execute_non_query(f"DELETE FROM {table} WHERE EventType = ?", (event_type,))
+
+    def purge_expired(self, retention_days):
         """
-        Retrieves timeseries data for a metric.
+        Truncates the expired daily partitions of TimelineEvents (database/05_partitioning.sql)
+        and pre-creates the coming ones, so the cost does not depend on the number of rows.
         """
+        rows = self.db.execute_sp("sp_MaintainTimelinePartitions", (retention_days,))
+        if not rows:
+            return []
+        return [{"start": row.start, "end": row.end, "rows": row.rows} for row in rows]
+
+    def _latest_points(self, metric, limit):
         rows = self.db.execute_sp("sp_GetTimeseries", (metric, limit))
         if not rows:
             return []
-        
         return [{"time": row.time, "value": float(row.value)} for row in rows]
+
+    def _bucket_points(self, metric, start, end, buckets):
+        rows = self.db.execute_sp("sp_GetTimeseriesBuckets", (metric, start, end, buckets))
+        if not rows:
+            return []
+        return [
+            {
+                "time": row.time,
+                "value": float(row.value),
+                "min": float(row.min),
+                "max": float(row.max),
+                "count": row.count,
+            }
+            for row in rows
+        ]
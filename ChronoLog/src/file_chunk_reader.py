@@ -1,38 +1,196 @@
-﻿import time
+﻿import mmap
+import os
 from pathlib import Path
-from config import CHUNK_SIZE, POLL_INTERVAL
+from config import CHUNK_SIZE, POLL_INTERVAL, BATCH_RANGE_BYTES, TAIL_WATCHER
+from file_watcher import FileWatcher
+from input_sources import open_input, is_compressed
 
 class FileChunkReader:
-    def __init__(self, file_path, chunk_size=CHUNK_SIZE, poll_interval=POLL_INTERVAL, live=True):
+    """
+    Reads a file in chunks of lines; in live mode keeps tailing it.
+    Compressed files (.gz, .bz2, .zst) are decompressed on the fly in batch mode.
+    With a sizer (AdaptiveChunkSizer) chunks are cut by its byte target instead of chunk_size lines.
+    With raw=True a chunk is one bytes buffer of complete lines instead of a list of decoded lines,
+    which leaves decoding to LogParser.parse_bytes.
+    While iterating, span holds the [start, end) byte range of the last chunk and file_key
+    identifies the file it came from as (device, inode, truncation count).
+    """
+    def __init__(self, file_path, chunk_size=CHUNK_SIZE, poll_interval=POLL_INTERVAL, live=True,
+                 watcher_mode=TAIL_WATCHER, start_offset=0, skip_ranges=(), sizer=None,
+                 raw=False):
         self.file_path = Path(file_path).resolve()
         self.chunk_size = chunk_size
         self.poll_interval = poll_interval
         self.eof_reached = False
         self.live = live
+        self.watcher_mode = watcher_mode
+        self.sizer = sizer
+        self.raw = raw
+        # Resume support: start at start_offset and jump over ranges that were already processed
+        self.start_offset = start_offset
+        self._skip = sorted(skip_ranges)
+        self.span = None
+        self.file_key = None
+        self._generation = 0
+        # live mode holds back a trailing line until its newline has been written
+        self._partial = b""
+
+    def _key(self, file_obj):
+        try:
+            st = os.fstat(file_obj.fileno())
+        except (AttributeError, OSError, ValueError):
+            # decompressing readers do not always expose the underlying descriptor
+            st = os.stat(self.file_path)
+        return (st.st_dev, st.st_ino, self._generation)
 
     def __iter__(self):
-        with open(self.file_path, "r", encoding="utf-8", errors="replace") as f:
+        if self.live and is_compressed(self.file_path):
+            raise ValueError(f"Cannot tail compressed file {self.file_path}")
+        f = open_input(self.file_path)
+        if self.start_offset:
+            f.seek(self.start_offset)
+        self.file_key = self._key(f)
+        watcher = FileWatcher(self.file_path, self.poll_interval, self.watcher_mode) if self.live else None
+        announced = False
+        try:
             while True:
+                self._skip_processed(f)
+                start = f.tell() - len(self._partial)
                 chunk = self._read_chunk(f)
                 if chunk:
                     # new data available
+                    self.span = (start, f.tell() - len(self._partial))
                     yield chunk
                     self.eof_reached = False
-                else:
-                    # no new data
-                    if not self.eof_reached:
-                        self.eof_reached = True
-                        if self.live:
-                            print("Reading completed.")
-                        else:
-                            # batch mode: stop iteration and let caller finish processing
-                            return
-                    if self.live:
-                        time.sleep(self.poll_interval)
-                    else:
-                        # batch mode: no need to loop/wait
-                        return
+                    continue
+                # no new data
+                self.eof_reached = True
+                if not self.live:
+                    # batch mode: stop iteration and let caller finish processing
+                    return
+                if not announced:
+                    announced = True
+                    print(f"Reading completed, waiting for new data ({watcher.mode}).")
+                next_file = self._follow(f)
+                if next_file is None:
+                    watcher.wait()
+                elif next_file is not f:
+                    tail = None
+                    if self._partial:
+                        # the rotated file is complete, so its unterminated last line is too
+                        self.span = (f.tell() - len(self._partial), f.tell())
+                        tail = self._partial if self.raw else [self._partial.decode("utf-8", errors="replace")]
+                        self._partial = b""
+                    f.close()
+                    f = next_file
+                    if tail:
+                        yield tail
+                    self._generation = 0
+                    self._skip = []
+                    self.file_key = self._key(f)
+        finally:
+            f.close()
+            if watcher is not None:
+                watcher.close()
+
+    def _follow(self, file_obj):
+        """
+        Called at EOF in live mode. Detects logrotate-style renames (the path now points to
+        another inode) and truncation (the file is shorter than our position).
+        Returns the handle to keep reading from, or None when there is nothing to read yet.
+        """
+        try:
+            st = os.stat(self.file_path)
+        except FileNotFoundError:
+            # rotated away and not re-created yet: keep waiting on the old handle
+            return None
+        current = os.fstat(file_obj.fileno())
+        if (st.st_ino, st.st_dev) != (current.st_ino, current.st_dev):
+            # lines appended to the old file after our last read are read first
+            if current.st_size > file_obj.tell():
+                return file_obj
+            print(f"Log file rotated, reopening {self.file_path}")
+            return open(self.file_path, "rb")
+        if st.st_size < file_obj.tell():
+            print(f"Log file truncated, reading {self.file_path} from the start")
+            self._partial = b""
+            self._skip = []
+            self._generation += 1
+            self.file_key = self._key(file_obj)
+            file_obj.seek(0)
+            return file_obj
+        return None
+
+    def _skip_processed(self, file_obj):
+        while self._skip and file_obj.tell() >= self._skip[0][0]:
+            _, end = self._skip.pop(0)
+            if file_obj.tell() < end:
+                file_obj.seek(end)
 
     def _read_chunk(self, file_obj):
-        lines = [file_obj.readline() for _ in range(self.chunk_size)]
-        return [l for l in lines if l]
\ No newline at end of file
+        lines = []
+        # a chunk never runs into a range that is skipped
+        limit = self._skip[0][0] if self._skip else None
+        max_lines = self.chunk_size
+        max_bytes = None
+        if self.sizer is not None:
+            max_lines = None
+            max_bytes = self.sizer.chunk_bytes()
+        nbytes = 0
+        while max_lines is None or len(lines) < max_lines:
+            if limit is not None and file_obj.tell() >= limit:
+                break
+            line = file_obj.readline()
+            if not line:
+                break
+            lines.append(line)
+            nbytes += len(line)
+            if max_bytes is not None and nbytes >= max_bytes:
+                break
+        if not lines or isinstance(lines[0], str):
+            return lines
+        if self._partial:
+            lines[0] = self._partial + lines[0]
+            self._partial = b""
+        if self.live and not lines[-1].endswith(b"\n"):
+            self._partial = lines.pop()
+        if self.raw:
+            return b"".join(lines)
+        return [l.decode("utf-8", errors="replace") for l in lines]
+
+
+def iter_byte_ranges(file_path, range_size=BATCH_RANGE_BYTES, start=0, end=None):
+    """
+    Lazily splits a file (or its [start, end) part) into (start, end) byte ranges of roughly range_size bytes.
+    Every range ends right after a newline (or at end), so no line is split between ranges;
+    start must itself be the beginning of a line.
+    range_size may also be a callable that is asked for the size of every next range, so the
+    split can follow feedback gathered while earlier ranges are parsed.
+    """
+    size = os.path.getsize(file_path) if end is None else end
+    with open(file_path, "rb") as f:
+        while start < size:
+            target = start + max(1, range_size() if callable(range_size) else range_size)
+            if target >= size:
+                range_end = size
+            else:
+                # finish the line containing the last byte of the range
+                f.seek(target - 1)
+                f.readline()
+                range_end = min(f.tell(), size)
+            yield start, range_end
+            start = range_end
+
+
+def map_byte_range(file_path, start, end):
+    """
+    Returns the raw bytes of the [start, end) range of a file, read through mmap.
+    Meant to run inside a worker process, so only the range boundaries cross process boundaries.
+    """
+    if end <= start:
+        return b""
+    # mmap offsets must be aligned to the allocation granularity
+    offset = start - (start % mmap.ALLOCATIONGRANULARITY)
+    with open(file_path, "rb") as f:
+        with mmap.mmap(f.fileno(), end - offset, access=mmap.ACCESS_READ, offset=offset) as mm:
+            return mm[start - offset:]
@@ -0,0 +1,121 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from pathlib import Path
+from config import POLL_INTERVAL, TAIL_WATCHER
+
+TAIL_WATCHERS = ("auto", "inotify", "poll")
+
+# inotify flags (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+EVENT_HEADER = struct.Struct("iIII")
+
+def _load_inotify():
+    """Returns libc if it exposes inotify, otherwise None."""
+    if os.name != "posix":
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    except OSError:
+        return None
+    if not hasattr(libc, "inotify_init1") or not hasattr(libc, "inotify_add_watch"):
+        return None
+    return libc
+
+
+class FileWatcher:
+    """
+    Blocks until the watched file may have changed.
+    Uses inotify on the file's directory (so renames, re-creation and truncation wake it up too)
+    and falls back to sleeping poll_interval when inotify is unavailable.
+    """
+    def __init__(self, file_path, poll_interval=POLL_INTERVAL, mode=TAIL_WATCHER):
+        if mode not in TAIL_WATCHERS:
+            raise ValueError(f"Unknown tail watcher '{mode}', expected one of {', '.join(TAIL_WATCHERS)}")
+        self.file_path = Path(file_path).resolve()
+        self.poll_interval = poll_interval
+        self._name = os.fsencode(self.file_path.name)
+        self._fd = None
+        if mode != "poll":
+            self._fd = self._open_inotify()
+            if self._fd is None and mode == "inotify":
+                print("Warning: inotify unavailable, falling back to polling")
+        self.mode = "inotify" if self._fd is not None else "poll"
+
+    def _open_inotify(self):
+        libc = _load_inotify()
+        if libc is None:
+            return None
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return None
+        wd = libc.inotify_add_watch(fd, os.fsencode(self.file_path.parent), WATCH_MASK)
+        if wd < 0:
+            # e.g. fs.inotify.max_user_watches reached
+            os.close(fd)
+            return None
+        return fd
+
+    def wait(self, timeout=None):
+        """
+        Waits up to timeout seconds (default poll_interval) for a change to the file.
+        Returns True if inotify reported a relevant event, False on timeout or in polling mode.
+        The timeout also bounds the wait with inotify, so changes it cannot see (e.g. network
+        filesystems) are still picked up within poll_interval.
+        """
+        timeout = self.poll_interval if timeout is None else timeout
+        if self._fd is None:
+            time.sleep(timeout)
+            return False
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            readable, _, _ = select.select([self._fd], [], [], remaining)
+            if readable and self._drain_events():
+                return True
+
+    def _drain_events(self):
+        """Reads all pending events; True if any concerns the watched file name."""
+        relevant = False
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return relevant
+            if not data:
+                return relevant
+            offset = 0
+            while offset + EVENT_HEADER.size <= len(data):
+                _, mask, _, name_len = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = data[offset:offset + name_len].rstrip(b"\0")
+                offset += name_len
+                if mask & IN_Q_OVERFLOW or name == self._name:
+                    relevant = True
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
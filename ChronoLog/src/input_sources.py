@@ -0,0 +1,65 @@
+import bz2
+import glob
+import gzip
+import io
+import os
+from pathlib import Path
+
+GLOB_CHARS = "*?["
+
+
+def _open_zstd(path):
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError(f"Reading {path} needs the zstandard package (pip install zstandard)")
+    raw = open(path, "rb")
+    # BufferedReader adds readline/tell on top of the decompressing stream
+    return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(raw, closefd=True))
+
+
+# Compressed inputs are stream-decompressed; offsets into them refer to the decompressed data
+DECOMPRESSORS = {
+    ".gz": gzip.open,
+    ".bz2": bz2.open,
+    ".zst": _open_zstd,
+}
+
+
+def is_compressed(path):
+    return Path(path).suffix.lower() in DECOMPRESSORS
+
+
+def open_input(path):
+    """Opens an input file for binary reading, decompressing .gz, .bz2 and .zst on the fly."""
+    opener = DECOMPRESSORS.get(Path(path).suffix.lower())
+    if opener is None:
+        return open(path, "rb")
+    return opener(path) if opener is _open_zstd else opener(path, "rb")
+
+
+def resolve_inputs(spec):
+    """
+    Expands an input specification into the list of files to process, oldest first
+    (by modification time, then name), so rotated sets are ingested in order.
+
+    spec is a file, a directory (all files below it), a glob pattern such as
+    logs/**/*.log.gz, or several of these separated by os.pathsep or given as a list.
+    """
+    if isinstance(spec, (str, Path)):
+        parts = [p for p in str(spec).split(os.pathsep) if p.strip()]
+    else:
+        parts = [str(p) for p in spec]
+
+    files = {}
+    for part in parts:
+        if any(c in part for c in GLOB_CHARS):
+            matches = [Path(m) for m in glob.glob(part, recursive=True)]
+        elif Path(part).is_dir():
+            matches = list(Path(part).rglob("*"))
+        else:
+            matches = [Path(part)]
+        for m in matches:
+            if m.is_file():
+                files[m.resolve()] = m.stat().st_mtime
+    return sorted(files, key=lambda p: (files[p], str(p)))
@@ -1,11 +1,40 @@
 ﻿import re
 from datetime import datetime
-from config import KEY_VAL_RE, VAR_REGEX
+from config import KEY_VAL_RE, VAR_REGEX, BYTES_PREFILTER
+from masking import MessageMasker
+
+LEVELS = (("ERROR", "error"), ("WARNING", "warning"))
+IDENTIFIER_RE = re.compile(r"[a-zA-Z_][a-zA-Z0-9_]*")
+# A key=value value starts with an ASCII digit or, for other Unicode digits, a non-ASCII byte
+VALUE_START = rb"=[0-9\x80-\xff]"
+
+def is_plain_var_regex(var, rx):
+    # True for the patterns config builds from TRACK_VARIABLES; those can be
+    # answered by the generic key=value scan instead of their own search
+    return (IDENTIFIER_RE.fullmatch(var) is not None
+            and rx.pattern == rf"\b{re.escape(var)}=(\d+)\b"
+            and rx.flags == re.UNICODE)
 
 class LogParser:
-    def __init__(self, var_regex=None):
+    def __init__(self, var_regex=None, masker=None, prefilter=BYTES_PREFILTER):
         self.var_regex = var_regex or VAR_REGEX
         self.key_val_re = KEY_VAL_RE
+        self.masker = masker or MessageMasker()
+        # One pass finds key=value pairs and the level keywords; the key=value
+        # alternative is tried first so a key is never split by a level match
+        self.scanner = re.compile(rf"{self.key_val_re.pattern}|ERROR|WARNING")
+        # var_regex position of every tracked variable (None: report all key=value pairs)
+        self._var_order = None
+        self._extra_var_regex = []
+        if self.var_regex:
+            self._var_order = {var: i for i, var in enumerate(self.var_regex)}
+            self._tracked = {var for var, rx in self.var_regex.items() if is_plain_var_regex(var, rx)}
+            self._extra_var_regex = [(var, rx) for var, rx in self.var_regex.items() if var not in self._tracked]
+        # Bytes pattern every line that yields an event contains (None: decode every line)
+        self.prefilter = self._build_prefilter() if prefilter else None
+        # Consecutive lines usually share a timestamp: remember the last second seen
+        self._last_ts_prefix = None
+        self._last_ts = None
 
     def parse_lines(self, lines):
         events = {"ERROR": [], "WARNING": []}
@@ -16,26 +45,146 @@ class LogParser:
             if not line:
                 continue
             timestamp = self.extract_timestamp(line)
-            self.parse_errors_warnings(line, timestamp, events, timeline)
-            self.parse_variables(line, timestamp, events, timeline)
+            levels, variables = self.scan_line(line)
+            for key, event_name in levels:
+                self._add_event(key, line, event_name, timestamp, events, timeline)
+            for var, val in variables:
+                self._add_event(var, line, var, timestamp, events, timeline, val)
 
         return events, timeline
 
+    def parse_bytes(self, data):
+        """parse_lines for a raw buffer of newline-separated UTF-8 lines."""
+        return self.parse_lines(self.candidate_lines(data))
+
+    def candidate_lines(self, data):
+        """
+        Decodes the lines of data that can produce an event. The prefilter runs over the
+        whole buffer in C, so lines without a level keyword or key=value pair are never
+        decoded or touched in Python.
+        """
+        if self.prefilter is None:
+            return data.decode("utf-8", errors="replace").split("\n")
+        lines = []
+        search = self.prefilter.search
+        pos = 0
+        while True:
+            m = search(data, pos)
+            if m is None:
+                return lines
+            start = data.rfind(b"\n", 0, m.start()) + 1
+            end = data.find(b"\n", m.end())
+            if end < 0:
+                end = len(data)
+            lines.append(data[start:end].decode("utf-8", errors="replace"))
+            pos = end + 1
+
+    def _build_prefilter(self):
+        # Necessary conditions of scan_line, as bytes: a level keyword anywhere, or
+        # "name=" before a digit for a tracked variable (any "=" + digit when all pairs count)
+        if self._var_order is None:
+            return re.compile(rb"ERROR|WARNING|" + VALUE_START)
+        if self._extra_var_regex:
+            # custom patterns could match anything
+            return None
+        names = b"|".join(re.escape(var.encode("ascii")) for var in sorted(self._tracked, key=len, reverse=True))
+        return re.compile(rb"ERROR|WARNING|(?:" + names + rb")" + VALUE_START)
+
+    def scan_line(self, line):
+        """Return ([(level, event_name)], [(variable, value)]) for one line in a single regex pass.
+
+        Levels match anywhere in the line (also inside keys). With var_regex the
+        first value of each tracked variable is reported in var_regex order,
+        otherwise every key=value pair except ERROR/WARNING keys in line order.
+        """
+        has_error = has_warning = False
+        var_order = self._var_order
+        if var_order is None:
+            variables = []
+            for m in self.scanner.finditer(line):
+                key, val = m.groups()
+                if key is None:
+                    if m.group(0) == "ERROR":
+                        has_error = True
+                    else:
+                        has_warning = True
+                    continue
+                if "ERROR" in key:
+                    has_error = True
+                if "WARNING" in key:
+                    has_warning = True
+                if key.upper() not in ("ERROR", "WARNING"):
+                    variables.append((key, int(val)))
+        else:
+            tracked = self._tracked
+            found = {}
+            for m in self.scanner.finditer(line):
+                key, val = m.groups()
+                if key is None:
+                    if m.group(0) == "ERROR":
+                        has_error = True
+                    else:
+                        has_warning = True
+                    continue
+                if "ERROR" in key:
+                    has_error = True
+                if "WARNING" in key:
+                    has_warning = True
+                if key in tracked and key not in found:
+                    found[key] = int(val)
+            for var, rx in self._extra_var_regex:
+                m = rx.search(line)
+                if m:
+                    found[var] = int(m.group(1))
+            variables = sorted(found.items(), key=lambda kv: var_order[kv[0]]) if len(found) > 1 else list(found.items())
+
+        if has_error:
+            return ([LEVELS[0], LEVELS[1]] if has_warning else [LEVELS[0]]), variables
+        return ([LEVELS[1]] if has_warning else []), variables
+
     def extract_timestamp(self, line):
+        # Fast path for the fixed "YYYY-MM-DD HH:MM:SS" / "YYYY-MM-DDTHH:MM:SS" layout
+        # followed by a space or the end of the line: slice the fields instead of strptime
+        if (len(line) >= 19 and line[4] == "-" and line[7] == "-" and line[10] in " T"
+                and line[13] == ":" and line[16] == ":" and (len(line) == 19 or line[19] == " ")):
+            prefix = line[:19]
+            if prefix == self._last_ts_prefix:
+                return self._last_ts
+            ts = self._slice_timestamp(prefix)
+            if ts is not None:
+                self._last_ts_prefix = prefix
+                self._last_ts = ts
+                return ts
+        return self._parse_timestamp_fallback(line)
+
+    @staticmethod
+    def _slice_timestamp(prefix):
+        digits = prefix[0:4] + prefix[5:7] + prefix[8:10] + prefix[11:13] + prefix[14:16] + prefix[17:19]
+        if not (digits.isascii() and digits.isdigit()):
+            return None
+        try:
+            # Only validates the ranges (month 13, Feb 30, ...); the ISO string is built by slicing
+            datetime(int(prefix[0:4]), int(prefix[5:7]), int(prefix[8:10]),
+                     int(prefix[11:13]), int(prefix[14:16]), int(prefix[17:19]))
+        except ValueError:
+            return None
+        return f"{prefix[0:10]}T{prefix[11:19]}"
+
+    def _parse_timestamp_fallback(self, line):
         # Try to extract timestamp from the beginning of the line
         # Supports:
         # YYYY-MM-DD HH:MM:SS
         # YYYY-MM-DDTHH:MM:SS
+        # Like the fast path, the timestamp ends at a space or at the end of the line
         parts = line.split(" ", 2)
-        if len(parts) < 2:
-            return None
         
         # Try space separated first
-        ts_str = f"{parts[0]} {parts[1]}"
-        try:
-            return datetime.strptime(ts_str, "%Y-%m-%d %H:%M:%S").isoformat()
-        except ValueError:
-            pass
+        if len(parts) >= 2:
+            ts_str = f"{parts[0]} {parts[1]}"
+            try:
+                return datetime.strptime(ts_str, "%Y-%m-%d %H:%M:%S").isoformat()
+            except ValueError:
+                pass
             
         # Try ISO format (first part only)
         ts_str = parts[0]
@@ -47,25 +196,14 @@ class LogParser:
         return None
 
     def parse_errors_warnings(self, line, timestamp, events, timeline):
-        if "ERROR" in line:
-            self._add_event("ERROR", line, "error", timestamp, events, timeline)
-        if "WARNING" in line:
-            self._add_event("WARNING", line, "warning", timestamp, events, timeline)
+        levels, _ = self.scan_line(line)
+        for key, event_name in levels:
+            self._add_event(key, line, event_name, timestamp, events, timeline)
 
     def parse_variables(self, line, timestamp, events, timeline):
-        if self.var_regex:
-            for var, rx in self.var_regex.items():
-                m = rx.search(line)
-                if m:
-                    val = int(m.group(1))
-                    self._add_event(var, line, var, timestamp, events, timeline, val)
-        else:
-            for m in self.key_val_re.finditer(line):
-                key = m.group(1)
-                val = int(m.group(2))
-                if key.upper() in ("ERROR", "WARNING"):
-                    continue
-                self._add_event(key, line, key, timestamp, events, timeline, val)
+        _, variables = self.scan_line(line)
+        for var, val in variables:
+            self._add_event(var, line, var, timestamp, events, timeline, val)
 
     def _add_event(self, key, line, event_name, timestamp, events, timeline, value=None):
         events.setdefault(key, []).append(line)
@@ -73,5 +211,6 @@ class LogParser:
         if value is not None:
             entry["value"] = value
         else:
-            entry["msg"] = line
+            # Templating happens here in the worker, so writers receive ready (template, values) pairs
+            entry["template"], entry["values"] = self.masker.mask(line)
         timeline.append(entry)
\ No newline at end of file
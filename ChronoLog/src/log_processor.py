@@ -1,49 +1,287 @@
 ﻿import multiprocessing
+import os
+import queue
+import threading
 import time
-from config import INPUT_FILE_PATH, NUM_PROCESSES, QUEUE_MAX_SIZE, QUEUE_PUT_TIMEOUT, NUM_WRITERS
+from pathlib import Path
+from config import (
+    INPUT_FILE_PATH, CHUNK_SIZE, NUM_PROCESSES, QUEUE_MAX_SIZE, QUEUE_PUT_TIMEOUT, NUM_WRITERS,
+    MAX_INFLIGHT_CHUNKS, STATS_INTERVAL, CHECKPOINT_ENABLED, SPILL_ENABLED, SPILL_AFTER, ADAPTIVE_CHUNKS,
+    BATCH_RANGE_BYTES, SPILL_DIR, METRICS_DIR
+)
 from log_parser import LogParser
-from file_chunk_reader import FileChunkReader
+from file_chunk_reader import FileChunkReader, iter_byte_ranges, map_byte_range
+from chunk_sizer import AdaptiveChunkSizer
 from writer_process import WriterProcess
+from checkpoint import CheckpointTracker
+from storage import create_storage
+from spill import SpillBuffer
+from input_sources import resolve_inputs, is_compressed
+import metrics
+
+# Per-worker state, set by _init_worker when the pool starts a worker process
+_worker_queue = None
+_worker_stop_flag = None
+_worker_parser = None
+_worker_spill = None
+
+
+def _init_worker(queue_obj, stop_flag, spill=None):
+    """
+    Pool initializer: gives every parse worker a handle to the writer queue,
+    so parsed results go straight to the writers instead of back through the parent.
+    """
+    global _worker_queue, _worker_stop_flag, _worker_parser, _worker_spill
+    _worker_queue = queue_obj
+    _worker_stop_flag = stop_flag
+    _worker_parser = LogParser()
+    _worker_spill = spill
+
+
+def _queue_put(queue_obj, stop_flag, item, timeout=QUEUE_PUT_TIMEOUT, spill=None):
+    """
+    Puts an item on a bounded queue, blocking while it is full (backpressure).
+    With a spill buffer, an item that does not fit within SPILL_AFTER seconds is written
+    to disk instead, so parsing continues while the database is slow.
+    Returns False if the item had to be dropped because a stop was requested.
+    """
+    while not stop_flag.is_set():
+        try:
+            queue_obj.put(item, timeout=SPILL_AFTER if spill is not None else timeout)
+            return True
+        except queue.Full:
+            if spill is not None and spill.spill(item):
+                return True
+            continue
+
+    # stop_flag is set, try one last time, spill or drop
+    try:
+        queue_obj.put(item, timeout=0.1)
+        return True
+    except queue.Full:
+        if spill is not None and spill.spill(item):
+            return True
+        print("Warning: dropped log chunk during shutdown")
+        return False
+
+
+def _queue_depth(queue_obj):
+    """Number of items waiting on a multiprocessing queue, or None where the platform cannot report it."""
+    try:
+        return queue_obj.qsize()
+    except NotImplementedError:
+        # multiprocessing.Queue.qsize is not available on macOS
+        return None
+
+
+def _line_count(data):
+    if isinstance(data, bytes):
+        return data.count(b"\n") + (1 if data and not data.endswith(b"\n") else 0)
+    return len(data)
+
+
+def _timed_parse(data):
+    """
+    Parses a raw bytes chunk (or a list of decoded lines) and returns (result, seconds spent parsing)
+    for the chunk sizer.
+    """
+    started = time.perf_counter()
+    if isinstance(data, bytes):
+        result = _worker_parser.parse_bytes(data)
+    else:
+        result = _worker_parser.parse_lines(data)
+    return result, time.perf_counter() - started
+
+
+def _enqueue_result(result, span=None):
+    """
+    Hands a parse result to the writers and returns (number of timeline events, delivered flag).
+    With checkpoints, span = (file key, start, end) travels with the rows so the writer can
+    acknowledge the byte range once it is flushed.
+    """
+    events, timeline = result
+    if not timeline:
+        return 0, True
+    item = result if span is None else (events, timeline, span)
+    return len(timeline), _queue_put(_worker_queue, _worker_stop_flag, item, spill=_worker_spill)
+
+
+def _parse_chunk(data, span=None):
+    """
+    Pool worker for live mode: parses a raw chunk read by the parent.
+    Returns the receipt {"events", "delivered", "parse_seconds", "lines"}.
+    """
+    result, seconds = _timed_parse(data)
+    count, delivered = _enqueue_result(result, span)
+    return {"events": count, "delivered": delivered, "parse_seconds": seconds, "lines": _line_count(data)}
+
+
+def _parse_range(file_path, start, end, file_key=None):
+    """
+    Pool worker for batch mode: maps and parses one byte range of the input file.
+    Returns the same receipt as _parse_chunk.
+    """
+    span = (file_key, start, end) if file_key is not None else None
+    data = map_byte_range(file_path, start, end)
+    result, seconds = _timed_parse(data)
+    count, delivered = _enqueue_result(result, span)
+    return {"events": count, "delivered": delivered, "parse_seconds": seconds, "lines": _line_count(data)}
+
+
+def _parse_stream(file_path, file_key=None, start_offset=0, skip_ranges=(), chunk_size=None):
+    """
+    Pool worker for compressed inputs, which cannot be split into byte ranges:
+    decompresses one whole file and enqueues it chunk by chunk.
+    Without an explicit chunk_size the chunks are sized by a worker-local AdaptiveChunkSizer.
+    The receipt also lists the spans of chunks without events ("empty_spans"), which the parent
+    commits directly, and the decompressed length ("length" as (file key, bytes)), so a completed
+    file is not decompressed again on the next run. "chunk_seconds" lists the parse time of every chunk
+    and "bytes" the decompressed bytes parsed.
+    """
+    sizer = AdaptiveChunkSizer.for_batch() if chunk_size is None and ADAPTIVE_CHUNKS else None
+    reader = FileChunkReader(file_path, chunk_size=chunk_size or CHUNK_SIZE, live=False,
+                             start_offset=start_offset, skip_ranges=skip_ranges, sizer=sizer, raw=True)
+    total, all_delivered, empty_spans, chunk_seconds, lines, nbytes = 0, True, [], [], 0, 0
+    for data in reader:
+        span = (file_key,) + reader.span if file_key is not None else None
+        result, seconds = _timed_parse(data)
+        count, delivered = _enqueue_result(result, span)
+        chunk_seconds.append(seconds)
+        lines += _line_count(data)
+        nbytes += reader.span[1] - reader.span[0]
+        if sizer is not None:
+            sizer.record_parse(reader.span[1] - reader.span[0], seconds)
+            sizer.record_queue(_queue_depth(_worker_queue))
+        total += count
+        all_delivered = all_delivered and delivered
+        if count == 0 and span is not None:
+            empty_spans.append(span)
+    length = max([reader.span[1] if reader.span else start_offset] + [end for _, end in skip_ranges])
+    return {"events": total, "delivered": all_delivered, "parse_seconds": sum(chunk_seconds),
+            "chunk_seconds": chunk_seconds, "lines": lines, "bytes": nbytes, "empty_spans": empty_spans,
+            "length": (file_key, length)}
+
 
 class LogProcessor:
-    def __init__(self, input_file=INPUT_FILE_PATH, num_processes=NUM_PROCESSES, num_writers=NUM_WRITERS):
+    def __init__(self, input_file=INPUT_FILE_PATH, num_processes=NUM_PROCESSES, num_writers=NUM_WRITERS,
+                 max_inflight=MAX_INFLIGHT_CHUNKS, checkpoint=CHECKPOINT_ENABLED, writer_facade=None,
+                 spill_dir=SPILL_DIR, metrics_dir=METRICS_DIR):
         self.input_file = input_file
         self.num_processes = num_processes
         self.num_writers = num_writers
-        self.parser = LogParser()
+        # Passed to every WriterProcess instead of a database facade (benchmarks)
+        self.writer_facade = writer_facade
         self.queue = multiprocessing.Queue(maxsize=QUEUE_MAX_SIZE)
         self.stop_flag = multiprocessing.Event()
+        self.inputs = []
+        # Writers report flushed byte ranges on ack_queue; the parent persists them as checkpoints,
+        # one CheckpointTracker per input file keyed by its file key
+        self.checkpoint_enabled = checkpoint
+        self.checkpoints = {}
+        self.ack_queue = multiprocessing.Queue() if checkpoint else None
+        self._acks_stop = threading.Event()
+        self._metrics_stop = threading.Event()
+        # Overflow tier shared by parse workers (spill) and writers (drain)
+        self.spill = SpillBuffer(spill_dir) if SPILL_ENABLED else None
+        # Bounds the number of tasks handed to the pool but not yet finished,
+        # so the parent cannot run ahead of the workers when the writer queue is full.
+        self.max_inflight = max_inflight or num_processes * 2
+        # Sizes live chunks and batch ranges from the parse times workers report (set up in start)
+        self.sizer = None
+        self._inflight = threading.BoundedSemaphore(self.max_inflight)
+        self._stats_lock = threading.Lock()
+        self._last_report = time.monotonic()
+        # Per-stage counters and histograms, published for the /metrics endpoint and cli.py status
+        self.metrics = metrics.Metrics("ingest", directory=metrics_dir)
+        self.stats = {
+            "chunks_dispatched": 0,
+            "chunks_done": 0,
+            "events_enqueued": 0,
+            "dropped_chunks": 0,
+            "worker_errors": 0,
+            "queue_depth": 0,
+            "max_queue_depth": 0,
+            "spilled_segments": 0,
+            "chunk_bytes": 0,
+        }
 
-    def start(self, live=True):
+    def start(self, live=True, resume=True):
         """
         live=True  -> keep tailing the file until interrupted
         live=False -> read available data, process, then exit once processing is complete
+        resume=False ignores saved checkpoints and processes the input from the start
+
+        input_file may be a file, a directory, a glob or several of them (see input_sources).
+        Batch mode processes all matching files, oldest first; live mode tails the newest one.
         """
+        self.inputs = resolve_inputs(self.input_file)
+        if not self.inputs:
+            print(f"No input files found for {self.input_file}")
+            return
+        if live:
+            newest = self.inputs[-1]
+            if len(self.inputs) > 1:
+                print(f"Live mode tails the newest of {len(self.inputs)} inputs: {newest}")
+            self.inputs = [newest]
+            if is_compressed(newest):
+                print(f"{newest.name} is compressed and cannot be tailed, processing it in batch mode")
+                live = False
+        elif len(self.inputs) > 1:
+            print(f"Processing {len(self.inputs)} input files, oldest first")
+        if ADAPTIVE_CHUNKS:
+            self.sizer = AdaptiveChunkSizer.for_live() if live else AdaptiveChunkSizer.for_batch()
+
+        ack_thread = None
+        if self.checkpoint_enabled:
+            self._open_checkpoints(resume)
+            ack_thread = threading.Thread(target=self._ack_loop, daemon=True)
+            ack_thread.start()
+        if self.spill and self.checkpoint_enabled:
+            # their byte ranges were never acknowledged, so the checkpoint reads them again
+            removed = self.spill.clear()
+            if removed:
+                print(f"Removed {removed} spill segments of a previous run")
+        elif self.spill:
+            # nothing re-reads their ranges: the writers insert them before any new input
+            recovered = self.spill.recover()
+            if recovered:
+                print(f"Recovered {recovered} spill segments of a previous run")
+        metrics.clear(self.metrics.directory)
+        metrics_thread = threading.Thread(target=self._metrics_loop, daemon=True)
+        metrics_thread.start()
+
         writers = []
         for _ in range(self.num_writers):
             wp = multiprocessing.Process(
-                target=WriterProcess().run,
-                args=(self.queue, self.stop_flag)
+                target=WriterProcess(spill=self.spill, facade=self.writer_facade,
+                                     metrics_dir=self.metrics.directory).run,
+                args=(self.queue, self.stop_flag, self.ack_queue)
             )
             wp.start()
             writers.append(wp)
 
-        pool = multiprocessing.Pool(self.num_processes)
-        reader = FileChunkReader(self.input_file, live=live)
+        pool = multiprocessing.Pool(
+            self.num_processes,
+            initializer=_init_worker,
+            initargs=(self.queue, self.stop_flag, self.spill)
+        )
         try:
-            for chunk in reader:
-                pool.apply_async(
-                    self.parser.parse_lines,
-                    args=(chunk,),
-                    callback=self._on_result,
-                    error_callback=self._on_error
-                )
+            if live:
+                self._dispatch_chunks(pool, self.inputs[0])
+            else:
+                for path in self.inputs:
+                    if is_compressed(path):
+                        self._dispatch_stream(pool, path)
+                    else:
+                        self._dispatch_ranges(pool, path)
 
             # If reader finished normally (batch mode), close the pool and wait for workers to finish.
             if not live:
+                self._wait_for_workers()
                 pool.close()
                 pool.join()
-                # All worker callbacks have been invoked or will be. Signal writers to finish after they drain the queue.
+                self._report_stats(force=True)
+                # Every worker has enqueued its results. Signal writers to finish after they drain the queue.
                 self.stop_flag.set()
 
         except KeyboardInterrupt:
@@ -51,30 +289,239 @@ class LogProcessor:
             self._handle_interrupt(pool)
         finally:
             self._shutdown(pool, writers)
+            if ack_thread is not None:
+                self._finish_checkpoint(ack_thread)
+            self._metrics_stop.set()
+            metrics_thread.join()
+            self._publish_metrics(force=True)
 
-    def _on_result(self, result):
-        events, timeline = result
-        self._safe_queue_put((events, timeline))
+    def _open_checkpoints(self, resume):
+        self.checkpoints = {}
+        # the writers record committed ranges in the database; a writer facade (benchmarks) records none
+        store = create_storage() if self.writer_facade is None else None
+        for path in self.inputs:
+            tracker = CheckpointTracker(path, store=store)
+            if resume:
+                tracker.resume()
+            else:
+                tracker.clear()
+                tracker.reset(tracker.current_key())
+            self.checkpoints[tracker.key] = tracker
 
-    def _safe_queue_put(self, item):
-        # Implement backpressure: wait until queue has space
-        while not self.stop_flag.is_set():
-            try:
-                self.queue.put(item, timeout=1.0)
+    def _tracker_for(self, path):
+        for tracker in self.checkpoints.values():
+            if tracker.input_file == Path(path).resolve():
+                return tracker
+        return None
+
+    def _commit(self, span):
+        tracker = self.checkpoints.get(span[0])
+        if tracker is not None:
+            tracker.commit(*span)
+
+    def _dispatch_chunks(self, pool, path):
+        """
+        Live mode: tail the file in the parent and hand line chunks to the pool.
+        """
+        tracker = self._tracker_for(path)
+        if tracker:
+            reader = FileChunkReader(path, live=True, start_offset=tracker.offset, skip_ranges=tracker.committed,
+                                     sizer=self.sizer, raw=True)
+        else:
+            reader = FileChunkReader(path, live=True, sizer=self.sizer, raw=True)
+        for chunk in reader:
+            span = None
+            if tracker:
+                if reader.file_key != tracker.key:
+                    # rotated or truncated: offsets now refer to a new file
+                    tracker.reset(reader.file_key)
+                    self.checkpoints = {tracker.key: tracker}
+                span = (reader.file_key,) + reader.span
+            self._submit(pool, _parse_chunk, (chunk, span), span, nbytes=reader.span[1] - reader.span[0])
+            if self.sizer:
+                self.sizer.record_queue(self.queue_depth())
+
+    def _dispatch_ranges(self, pool, path):
+        """
+        Batch mode: split the file into newline-aligned byte ranges and let each worker read its own range.
+        With a checkpoint only the ranges not committed yet are read.
+        """
+        file_path = str(path)
+        # ranges are cut lazily, so each one is sized with the feedback of the ranges before it
+        range_size = self._next_range_size if self.sizer else BATCH_RANGE_BYTES
+        tracker = self._tracker_for(path)
+        if not tracker:
+            for start, end in iter_byte_ranges(file_path, range_size):
+                self._submit(pool, _parse_range, (file_path, start, end), nbytes=end - start)
+            return
+        key = tracker.key
+        for gap_start, gap_end in tracker.uncommitted(os.path.getsize(file_path)):
+            for start, end in iter_byte_ranges(file_path, range_size, start=gap_start, end=gap_end):
+                self._submit(pool, _parse_range, (file_path, start, end, key), (key, start, end), nbytes=end - start)
+
+    def _next_range_size(self):
+        self.sizer.record_queue(self.queue_depth())
+        return self.sizer.chunk_bytes()
+
+    def _dispatch_stream(self, pool, path):
+        """
+        Batch mode for a compressed file: one worker decompresses and parses it,
+        other files are handled by the other workers in parallel.
+        """
+        tracker = self._tracker_for(path)
+        if tracker and tracker.is_complete():
+            print(f"{path.name} is already fully committed, skipping")
+            return
+        if tracker:
+            args = (str(path), tracker.key, tracker.offset, list(tracker.committed))
+        else:
+            args = (str(path),)
+        self._submit(pool, _parse_stream, args)
+
+    def _submit(self, pool, func, args, span=None, nbytes=0):
+        """
+        Hands a task to the pool once an in-flight slot is free.
+        The parent only passes work descriptors; event payloads never come back to it.
+        nbytes is the input size of the task, fed back to the chunk sizer with its parse time.
+        """
+        while not self._inflight.acquire(timeout=QUEUE_PUT_TIMEOUT):
+            self._report_stats()
+            if self.stop_flag.is_set():
                 return
-            except Exception: # queue.Full
-                # Queue is full, wait and retry
-                # In a real app, we might want to log this occasionally if it persists
-                continue
-        
-        # If we get here, stop_flag is set, try one last time or just drop
+        with self._stats_lock:
+            self.stats["chunks_dispatched"] += 1
+        pool.apply_async(func, args=args, callback=lambda receipt: self._on_result(receipt, span, nbytes),
+                         error_callback=self._on_error)
+        self._report_stats()
+
+    def _wait_for_workers(self):
+        while True:
+            with self._stats_lock:
+                if self.stats["chunks_done"] >= self.stats["chunks_dispatched"]:
+                    return
+            time.sleep(0.1)
+            self._report_stats()
+
+    def _on_result(self, receipt, span=None, nbytes=0):
+        count, delivered = receipt["events"], receipt["delivered"]
+        if self.sizer and nbytes:
+            self.sizer.record_parse(nbytes, receipt["parse_seconds"])
+        with self._stats_lock:
+            self.stats["chunks_done"] += 1
+            if delivered:
+                self.stats["events_enqueued"] += count
+            else:
+                self.stats["dropped_chunks"] += 1
+            m = self.metrics
+            chunk_seconds = receipt.get("chunk_seconds", [receipt["parse_seconds"]])
+            for seconds in chunk_seconds:
+                m.observe("parse_seconds", seconds)
+            m.inc("chunks_parsed_total", len(chunk_seconds))
+            m.inc("lines_read_total", receipt.get("lines", 0))
+            m.inc("bytes_read_total", nbytes or receipt.get("bytes", 0))
+            m.inc("events_parsed_total", count)
+            if not delivered:
+                m.inc("dropped_chunks_total")
+        # nothing to insert, so these ranges are committed as soon as they are parsed
+        if span is not None and count == 0:
+            self._commit(span)
+        if "length" in receipt:
+            for empty_span in receipt["empty_spans"]:
+                self._commit(empty_span)
+            key, length = receipt["length"]
+            if key in self.checkpoints:
+                self.checkpoints[key].set_length(key, length)
+        self._inflight.release()
+
+    def _ack_loop(self):
+        """
+        Runs in the parent: collects the byte ranges writers have flushed and saves the checkpoint
+        once per batch of acknowledgements.
+        """
+        while not self._acks_stop.is_set():
+            self._drain_acks(timeout=0.5)
+            for tracker in list(self.checkpoints.values()):
+                tracker.save()
+
+    def _drain_acks(self, timeout):
         try:
-            self.queue.put(item, timeout=0.1)
-        except Exception:
-            print("Warning: dropped log chunk during shutdown")
+            spans = self.ack_queue.get(timeout=timeout)
+        except queue.Empty:
+            return
+        while True:
+            for span in spans:
+                self._commit(span)
+            try:
+                spans = self.ack_queue.get_nowait()
+            except queue.Empty:
+                return
+
+    def _finish_checkpoint(self, ack_thread):
+        # writers have exited, so every acknowledgement is on the queue
+        self._acks_stop.set()
+        ack_thread.join()
+        self._drain_acks(timeout=0.1)
+        for tracker in list(self.checkpoints.values()):
+            tracker.save()
+            print(f"Checkpoint: committed up to byte {tracker.offset} of {tracker.input_file.name}")
 
     def _on_error(self, exc):
         print("worker error:", exc)
+        with self._stats_lock:
+            self.stats["chunks_done"] += 1
+            self.stats["worker_errors"] += 1
+            self.metrics.inc("worker_errors_total")
+        self._inflight.release()
+
+    def _metrics_loop(self):
+        """Runs in the parent: refreshes the gauges and publishes the metrics snapshot, also while live mode is idle."""
+        while not self._metrics_stop.wait(self.metrics.interval):
+            # this loop sets the pace, so every round publishes
+            self._publish_metrics(force=True)
+
+    def _publish_metrics(self, force=False):
+        """Updates the gauges and writes the snapshot (at most once per METRICS_INTERVAL unless forced)."""
+        depth = self.queue_depth()
+        spilled = len(self.spill.segments()) if self.spill else 0
+        with self._stats_lock:
+            m = self.metrics
+            if depth is not None:
+                m.set("queue_depth", depth)
+            m.set("chunks_in_flight", self.stats["chunks_dispatched"] - self.stats["chunks_done"])
+            m.set("spilled_segments", spilled)
+            if self.sizer:
+                m.set("chunk_bytes", self.sizer.chunk_bytes())
+            m.publish(force=force)
+
+    def queue_depth(self):
+        """
+        Number of parsed chunks waiting for the writers, or None where the platform cannot report it.
+        """
+        return _queue_depth(self.queue)
+
+    def _report_stats(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_report < STATS_INTERVAL:
+            return
+        self._last_report = now
+        depth = self.queue_depth()
+        spilled = len(self.spill.segments()) if self.spill else 0
+        with self._stats_lock:
+            if depth is not None:
+                self.stats["queue_depth"] = depth
+                self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], depth)
+            self.stats["spilled_segments"] = spilled
+            if self.sizer:
+                self.stats["chunk_bytes"] = self.sizer.chunk_bytes()
+            s = dict(self.stats)
+        inflight = s["chunks_dispatched"] - s["chunks_done"]
+        print(
+            f"Pipeline: queue depth {s['queue_depth']}/{QUEUE_MAX_SIZE} (max {s['max_queue_depth']}), "
+            f"{inflight} chunks in flight, {s['chunks_done']} done, "
+            f"{s['events_enqueued']} events enqueued, {s['dropped_chunks']} dropped, "
+            f"{s['spilled_segments']} spilled segments waiting"
+            + (f", chunk size {s['chunk_bytes'] // 1024} KB" if self.sizer else "")
+        )
 
     def _handle_interrupt(self, pool):
         self.stop_flag.set()
@@ -101,6 +548,14 @@ class LogProcessor:
         # Wait for writers to finish writing remaining queued items.
         for wp in writers:
             wp.join(timeout=10)
+            # keep waiting while writers still make progress on spilled segments
+            backlog = len(self.spill.segments()) if self.spill else 0
+            while wp.is_alive() and backlog:
+                wp.join(timeout=10)
+                remaining = len(self.spill.segments())
+                if remaining >= backlog:
+                    break
+                backlog = remaining
             if wp.is_alive():
                 try:
                     wp.terminate()
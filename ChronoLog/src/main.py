@@ -13,9 +13,14 @@ def parse_args():
     )
     p.add_argument(
         "--input",
-        help="override input file path",
+        help="override input: a file, a directory, a glob (e.g. 'logs/**/*.gz') or several separated by os.pathsep",
         default=None
     )
+    p.add_argument(
+        "--from-start",
+        action="store_true",
+        help="ignore the saved checkpoint and process the input from byte 0"
+    )
     return p.parse_args()
 
 if __name__ == "__main__":
@@ -25,7 +30,7 @@ if __name__ == "__main__":
     input_path = args.input or INPUT_FILE_PATH
     live_mode = args.mode == "live"
 
-    LogProcessor(input_path).start(live=live_mode)
+    LogProcessor(input_path).start(live=live_mode, resume=not args.from_start)
 
     end_time = time.time()
     elapsed = end_time - start_time
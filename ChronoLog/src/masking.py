@@ -0,0 +1,87 @@
+import re
+from collections import Counter
+from config import MASK_TYPES
+
+# Leading "YYYY-MM-DD HH:MM:SS " timestamp, dropped from templates
+TIMESTAMP_PREFIX_RE = re.compile(r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2} ")
+
+# Variable token types, in priority order: where several could match at the same
+# position, the earlier type wins (a UUID is not split into hex and numbers).
+MASK_PATTERNS = {
+    "uuid": r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b",
+    "ip": r"\b(?:\d{1,3}\.){3}\d{1,3}(?::\d{1,5})?\b",
+    "hex": r"\b0[xX][0-9a-fA-F]+\b|\b(?=[0-9a-fA-F]*[a-fA-F])(?=[0-9a-fA-F]*\d)[0-9a-fA-F]{8,}\b",
+    "duration": r"\b\d+(?:\.\d+)?(?:ns|us|µs|ms|s|m|h)\b",
+    "path": r"(?<![\w/.])(?:[A-Za-z]:\\|/)[\w.\-]+(?:[\\/][\w.\-]+)*[\\/]?",
+    "num": r"\b\d+\b",
+}
+
+def compile_mask_pattern(types):
+    """
+    Builds one alternation with a named group per type, so a single scan finds every token.
+    """
+    unknown = [t for t in types if t not in MASK_PATTERNS]
+    if unknown:
+        raise ValueError(f"Unknown mask types {unknown}, expected some of {list(MASK_PATTERNS)}")
+    ordered = [t for t in MASK_PATTERNS if t in types]
+    return re.compile("|".join(f"(?P<{t}>{MASK_PATTERNS[t]})" for t in ordered))
+
+class MessageMasker:
+    """
+    Turns a log line into a (template, values) pair.
+    Variable tokens are replaced by typed placeholders ({ip}, {uuid}, {num}, ...)
+    in a single pass of one precompiled pattern.
+    """
+    def __init__(self, types=MASK_TYPES):
+        self.types = tuple(types)
+        self.token_re = compile_mask_pattern(self.types)
+
+    def mask(self, line):
+        m = TIMESTAMP_PREFIX_RE.match(line)
+        pos = m.end() if m else 0
+        parts = []
+        values = []
+        for m in self.token_re.finditer(line, pos):
+            parts.append(line[pos:m.start()])
+            parts.append("{" + m.lastgroup + "}")
+            values.append(m.group())
+            pos = m.end()
+        parts.append(line[pos:])
+        return "".join(parts), values
+
+def template_report(lines, types=MASK_TYPES, top=10):
+    """
+    Compares template cardinality of number-only masking with typed masking.
+    Only ERROR and WARNING lines become message templates, so only those are counted.
+    """
+    baseline = MessageMasker(("num",))
+    typed = MessageMasker(types)
+    baseline_templates = set()
+    typed_templates = Counter()
+    placeholders = Counter()
+    total = 0
+    messages = 0
+
+    for line in lines:
+        total += 1
+        line = line.strip()
+        if "ERROR" not in line and "WARNING" not in line:
+            continue
+        messages += 1
+        baseline_templates.add(baseline.mask(line)[0])
+        template, _ = typed.mask(line)
+        typed_templates[template] += 1
+        for t in typed.types:
+            placeholders[t] += template.count("{" + t + "}")
+
+    before = len(baseline_templates)
+    after = len(typed_templates)
+    return {
+        "lines": total,
+        "message_lines": messages,
+        "templates_num_only": before,
+        "templates_typed": after,
+        "reduction": (before - after) / before if before else 0.0,
+        "placeholders": {t: n for t, n in placeholders.items() if n},
+        "top_templates": typed_templates.most_common(top),
+    }
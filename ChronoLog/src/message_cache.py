@@ -0,0 +1,54 @@
+from collections import OrderedDict
+from config import MSG_CACHE_SIZE
+
+class MessageCache:
+    """
+    Bounded template -> MessageId map with least-recently-used eviction.
+    Tracks hits, misses and evictions so the cache size can be tuned.
+    """
+    def __init__(self, max_size=MSG_CACHE_SIZE):
+        self.max_size = max(1, max_size)
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, template):
+        return template in self._entries
+
+    def get(self, template):
+        msg_id = self._entries.get(template)
+        if msg_id is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(template)
+        self.hits += 1
+        return msg_id
+
+    def put(self, template, msg_id):
+        self._entries[template] = msg_id
+        self._entries.move_to_end(template)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def load(self, mapping):
+        """
+        Bulk-loads {template: msg_id} pairs without counting them as hits or misses.
+        """
+        for template, msg_id in mapping.items():
+            self.put(template, msg_id)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
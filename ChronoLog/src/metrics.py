@@ -0,0 +1,194 @@
+import json
+import os
+import time
+from pathlib import Path
+from config import METRICS_ENABLED, METRICS_DIR, METRICS_INTERVAL
+
+PREFIX = "chronolog_"
+# Upper bounds (seconds) of the latency histogram buckets; +Inf is implied
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Gauges of processes that have not published for this long are left out (the process is gone)
+STALE_AFTER = 60
+
+# name -> (type, help); everything a process records must be listed here
+METRICS = {
+    "lines_read_total": ("counter", "Log lines handed to the parse workers"),
+    "bytes_read_total": ("counter", "Input bytes handed to the parse workers"),
+    "chunks_parsed_total": ("counter", "Chunks parsed by the parse workers"),
+    "events_parsed_total": ("counter", "Timeline events produced by the parse workers"),
+    "dropped_chunks_total": ("counter", "Parsed chunks dropped because the pipeline was stopping"),
+    "worker_errors_total": ("counter", "Parse tasks that raised an exception"),
+    "parse_seconds": ("histogram", "Parse time per chunk"),
+    "queue_depth": ("gauge", "Parsed chunks waiting for the writers"),
+    "chunks_in_flight": ("gauge", "Chunks handed to the parse pool and not finished yet"),
+    "spilled_segments": ("gauge", "Spill segments waiting for a writer"),
+    "chunk_bytes": ("gauge", "Current adaptive chunk size in bytes"),
+    "writer_chunks_total": ("counter", "Parsed chunks received by the writers"),
+    "writer_errors_total": ("counter", "Queued items or spill segments a writer failed to process"),
+    "rows_inserted_total": ("counter", "Timeline rows inserted by the writers"),
+    "flushes_total": ("counter", "Successful writer flushes"),
+    "flush_failures_total": ("counter", "Writer flushes that failed (the batch is retried)"),
+    "rows_rejected_total": ("counter", "Rows the database refused because of their values (skipped)"),
+    "insert_seconds": ("histogram", "Latency of one writer flush (template lookup and bulk insert)"),
+    "pending_rows": ("gauge", "Rows buffered in the writers until the next flush"),
+    "template_cache_hits_total": ("counter", "Template lookups answered by the writer cache"),
+    "template_cache_misses_total": ("counter", "Template lookups that needed the database"),
+    "template_cache_size": ("gauge", "Templates held in the writer caches"),
+}
+
+
+class Metrics:
+    """
+    Counters, gauges and histograms of one process.
+
+    Processes do not share memory, so each one periodically writes a snapshot to its own file in
+    METRICS_DIR (<role>-<pid>.json, replaced atomically); collect() merges the files of all processes
+    for the /metrics endpoint and the CLI status view.
+    """
+    def __init__(self, role, directory=METRICS_DIR, interval=METRICS_INTERVAL, enabled=METRICS_ENABLED):
+        self.role = role
+        self.directory = Path(directory)
+        self.interval = interval
+        self.enabled = enabled
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self._last_publish = None
+
+    def inc(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def set(self, name, value):
+        self.gauges[name] = value
+
+    def observe(self, name, value):
+        hist = self.histograms.get(name)
+        if hist is None:
+            hist = self.histograms[name] = {"buckets": [0] * (len(LATENCY_BUCKETS) + 1), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                break
+        else:
+            i = len(LATENCY_BUCKETS)
+        hist["buckets"][i] += 1
+        hist["sum"] += value
+        hist["count"] += 1
+
+    def snapshot(self):
+        return {
+            "role": self.role,
+            "pid": os.getpid(),
+            "updated": time.time(),
+            "counters": dict(self.counters),
+            "gauges": dict(self.gauges),
+            "histograms": {k: {"buckets": list(v["buckets"]), "sum": v["sum"], "count": v["count"]}
+                           for k, v in self.histograms.items()},
+        }
+
+    def publish(self, force=False):
+        """Writes the snapshot file, at most once per interval unless forced."""
+        if not self.enabled:
+            return False
+        now = time.monotonic()
+        if not force and self._last_publish is not None and now - self._last_publish < self.interval:
+            return False
+        self._last_publish = now
+        path = self.directory / f"{self.role}-{os.getpid()}.json"
+        tmp_path = path.with_name(path.name + ".tmp")
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Could not write metrics {path}: {e}")
+            return False
+        return True
+
+
+def collect(directory=METRICS_DIR, now=None):
+    """
+    Merges the snapshots of all processes: counters and histograms are summed, gauges are summed
+    over the processes that published within STALE_AFTER seconds.
+    """
+    now = time.time() if now is None else now
+    merged = {"counters": {}, "gauges": {}, "histograms": {}, "processes": {}}
+    try:
+        paths = sorted(Path(directory).glob("*.json"))
+    except OSError:
+        paths = []
+    for path in paths:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                snap = json.load(f)
+        except (OSError, ValueError):
+            # replaced or removed while we were reading it
+            continue
+        for name, value in snap["counters"].items():
+            merged["counters"][name] = merged["counters"].get(name, 0) + value
+        for name, hist in snap["histograms"].items():
+            target = merged["histograms"].setdefault(
+                name, {"buckets": [0] * len(hist["buckets"]), "sum": 0.0, "count": 0})
+            target["buckets"] = [a + b for a, b in zip(target["buckets"], hist["buckets"])]
+            target["sum"] += hist["sum"]
+            target["count"] += hist["count"]
+        if now - snap["updated"] <= STALE_AFTER:
+            merged["processes"][snap["role"]] = merged["processes"].get(snap["role"], 0) + 1
+            for name, value in snap["gauges"].items():
+                merged["gauges"][name] = merged["gauges"].get(name, 0) + value
+    return merged
+
+
+def clear(directory=METRICS_DIR):
+    """Removes the snapshots of a previous run, so its counters do not add to the new one."""
+    try:
+        paths = list(Path(directory).glob("*.json"))
+    except OSError:
+        return
+    for path in paths:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(merged, extra_gauges=None):
+    """Formats merged metrics in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        if kind == "counter":
+            value = merged["counters"].get(name, 0)
+        elif kind == "gauge":
+            value = merged["gauges"].get(name, 0)
+        else:
+            value = None
+        full = PREFIX + name
+        lines.append(f"# HELP {full} {help_text}")
+        lines.append(f"# TYPE {full} {kind}")
+        if value is not None:
+            lines.append(f"{full} {_format_value(value)}")
+            continue
+        hist = merged["histograms"].get(name) or {"buckets": [0] * (len(LATENCY_BUCKETS) + 1), "sum": 0.0, "count": 0}
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), hist["buckets"]):
+            cumulative += count
+            lines.append(f'{full}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f"{full}_sum {_format_value(float(hist['sum']))}")
+        lines.append(f"{full}_count {hist['count']}")
+    lines.append(f"# HELP {PREFIX}processes Pipeline processes that published metrics recently")
+    lines.append(f"# TYPE {PREFIX}processes gauge")
+    for role, count in sorted(merged["processes"].items()):
+        lines.append(f'{PREFIX}processes{{role="{role}"}} {count}')
+    for name, (help_text, value) in (extra_gauges or {}).items():
+        lines.append(f"# HELP {PREFIX}{name} {help_text}")
+        lines.append(f"# TYPE {PREFIX}{name} gauge")
+        lines.append(f"{PREFIX}{name} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def histogram_mean(hist):
+    return hist["sum"] / hist["count"] if hist and hist["count"] else 0.0
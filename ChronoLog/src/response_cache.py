@@ -0,0 +1,82 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from config import API_CACHE_SIZE, API_CACHE_TTL, API_CACHE_WATERMARK_INTERVAL
+
+
+def make_etag(body):
+    """Strong validator for a response body (bytes)."""
+    return hashlib.sha1(body).hexdigest()[:20]
+
+
+class ResponseCache:
+    """
+    In-process LRU cache of rendered API responses, keyed by endpoint and query parameters.
+
+    Every entry remembers the ingest watermark it was rendered at. watermark_fn returns the current
+    watermark (e.g. highest EventId and message id); while it is unchanged nothing new can be in the
+    database, so the entry is served without a query. The watermark itself is fetched at most every
+    watermark_interval seconds, and ttl bounds the age of an entry in any case.
+    """
+    def __init__(self, watermark_fn, max_entries=API_CACHE_SIZE, ttl=API_CACHE_TTL,
+                 watermark_interval=API_CACHE_WATERMARK_INTERVAL):
+        self.watermark_fn = watermark_fn
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.watermark_interval = watermark_interval
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (watermark, stored_at, body, etag), most recently used last
+        self._watermark = None
+        self._watermark_at = None
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0}
+
+    def watermark(self):
+        """The current ingest watermark, refreshed from watermark_fn at most every watermark_interval seconds."""
+        now = time.monotonic()
+        with self._lock:
+            if self._watermark_at is not None and now - self._watermark_at < self.watermark_interval:
+                return self._watermark
+        watermark = self.watermark_fn()
+        with self._lock:
+            if watermark != self._watermark and self._entries:
+                self.stats["invalidations"] += 1
+                self._entries.clear()
+            self._watermark = watermark
+            self._watermark_at = now
+        return watermark
+
+    def get(self, key, watermark=None):
+        """Returns (body, etag) if an entry current at watermark (default: the current one) exists, otherwise None."""
+        if watermark is None:
+            watermark = self.watermark()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != watermark or time.monotonic() - entry[1] > self.ttl:
+                if entry is not None:
+                    del self._entries[key]
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[2], entry[3]
+
+    def put(self, key, body, watermark):
+        """Stores a body rendered at watermark and returns its ETag."""
+        etag = make_etag(body)
+        with self._lock:
+            if watermark != self._watermark:
+                # ingest moved on while the response was rendered
+                return etag
+            self._entries[key] = (watermark, time.monotonic(), body, etag)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+        return etag
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._watermark = None
+            self._watermark_at = None
@@ -0,0 +1,181 @@
+import os
+import pickle
+import re
+import struct
+import time
+from pathlib import Path
+from config import SPILL_DIR, SPILL_MAX_BYTES
+
+SEGMENT_SUFFIX = ".seg"
+RECORD_HEADER = struct.Struct(">Q")
+# <creation time ns>-<writing pid>.seg, plus .tmp while written or .claimed-<pid> while inserted
+SEGMENT_NAME_RE = re.compile(r"^\d{20}-(\d+)\.seg(?:\.tmp|\.claimed-(\d+))?$")
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # exists, but belongs to another user
+        return True
+    return True
+
+
+class SpillBuffer:
+    """
+    Overflow tier for the writer queue. When the queue stays full (the database is slow),
+    parse workers write their result to a segment file instead of blocking, and idle writers
+    claim and insert the segments oldest first.
+
+    Segments are append-only files of length-prefixed pickled queue items. A segment becomes
+    visible under its final name only once it is completely written, and a writer claims it
+    by renaming it, so every segment is processed by exactly one writer.
+    Only plain paths and numbers are stored, so the buffer can be handed to other processes.
+    """
+    def __init__(self, directory=SPILL_DIR, max_bytes=SPILL_MAX_BYTES):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+
+    def spill(self, item):
+        """
+        Writes one queue item as a new segment. Returns False (the caller keeps blocking)
+        when the spill directory already holds max_bytes or the segment cannot be written.
+        """
+        data = pickle.dumps(item, protocol=pickle.HIGHEST_PROTOCOL)
+        if self.size() + len(data) > self.max_bytes:
+            return False
+        # the name sorts by creation time, which is the order segments are drained in
+        name = f"{time.time_ns():020d}-{os.getpid()}"
+        tmp_path = self.directory / f"{name}{SEGMENT_SUFFIX}.tmp"
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(RECORD_HEADER.pack(len(data)))
+                f.write(data)
+            os.replace(tmp_path, self.directory / f"{name}{SEGMENT_SUFFIX}")
+        except OSError as e:
+            print(f"Could not spill to {self.directory}: {e}")
+            return False
+        return True
+
+    def segments(self):
+        """Sealed segments waiting for a writer, oldest first."""
+        try:
+            names = [e.name for e in os.scandir(self.directory) if e.name.endswith(SEGMENT_SUFFIX)]
+        except FileNotFoundError:
+            return []
+        return [self.directory / n for n in sorted(names)]
+
+    def has_segments(self):
+        return bool(self.segments())
+
+    def size(self):
+        """Bytes currently held in the spill directory (including claimed segments)."""
+        try:
+            return sum(e.stat().st_size for e in os.scandir(self.directory)
+                       if SEGMENT_NAME_RE.match(e.name) and e.is_file())
+        except FileNotFoundError:
+            return 0
+
+    def _leftovers(self):
+        """
+        Claimed and incomplete segments whose process is gone, as (entry, claimed) pairs.
+        Files that are not segments and segments held by a running process are left alone.
+        """
+        try:
+            entries = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return []
+        leftovers = []
+        for e in entries:
+            match = SEGMENT_NAME_RE.match(e.name)
+            if not match or not e.is_file():
+                continue
+            if match.group(2) is not None:
+                if not pid_alive(int(match.group(2))):
+                    leftovers.append((e, True))
+            elif e.name.endswith(".tmp"):
+                if not pid_alive(int(match.group(1))):
+                    leftovers.append((e, False))
+        return leftovers
+
+    def claim(self):
+        """Takes the oldest unclaimed segment for this process; returns its new path or None."""
+        for path in self.segments():
+            claimed = path.with_name(f"{path.name}.claimed-{os.getpid()}")
+            try:
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                # another writer was faster
+                continue
+            return claimed
+        return None
+
+    def read(self, path):
+        """Returns the queue items stored in a (claimed) segment."""
+        items = []
+        with open(path, "rb") as f:
+            while True:
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    break
+                (length,) = RECORD_HEADER.unpack(header)
+                data = f.read(length)
+                if len(data) < length:
+                    print(f"Warning: truncated record in spill segment {path}")
+                    break
+                items.append(pickle.loads(data))
+        return items
+
+    def release(self, path):
+        """Deletes a segment after its rows were committed to the database."""
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    def unclaim(self, path):
+        """Returns a claimed segment whose rows could not be inserted, so it is drained again later."""
+        try:
+            os.rename(path, self.directory / Path(path).name.split(".claimed-")[0])
+        except FileNotFoundError:
+            pass
+
+    def quarantine(self, path):
+        """
+        Sets aside a segment that cannot be read, under a name no writer claims or clears
+        (<segment>.bad), so it can be inspected. Returns the new path.
+        """
+        bad = self.directory / (Path(path).name.split(".claimed-")[0] + ".bad")
+        try:
+            os.rename(path, bad)
+        except FileNotFoundError:
+            pass
+        return bad
+
+    def recover(self):
+        """
+        Makes the segments of a previous run drainable again: claimed ones are unclaimed and
+        incomplete ones (never sealed, so never visible to writers) are removed.
+        Used when no checkpoint replays their byte ranges. Returns the number of segments waiting.
+        """
+        for e, claimed in self._leftovers():
+            if claimed:
+                self.unclaim(e.path)
+            else:
+                self.release(e.path)
+        return len(self.segments())
+
+    def clear(self):
+        """
+        Removes segments left behind by a previous run. Their byte ranges were never
+        acknowledged, so the input is read again from the checkpoint instead.
+        Sealed segments are removed too; claimed and incomplete ones only if their process is gone.
+        """
+        removed = [e for e, _ in self._leftovers()]
+        removed += [path for path in self.segments()]
+        for path in removed:
+            self.release(path)
+        return len(removed)
@@ -0,0 +1,443 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from config import ROOT, SQLITE_PATH, SQLITE_BUSY_TIMEOUT, ROLLUPS_ENABLED
+from storage import StorageBackend, DatabaseConnectionError, RowsRejectedError, minute_rollups, checkpoint_rows, file_id
+
+SCHEMA_PATH = ROOT / "database" / "sqlite" / "schema.sql"
+# Host parameters per statement stay below SQLite's historical limit of 999
+IN_CHUNK = 500
+
+INSERT_EVENT_SQL = (
+    "INSERT INTO TimelineEvents (EventTime, EventType, MessageId, MessageValues, Value) VALUES (?, ?, ?, ?, ?)"
+)
+# Adds a batch's aggregates to the stored ones; scalar MIN/MAX return NULL if either side is NULL
+MERGE_MINUTE_SQL = """
+INSERT INTO EventRollupMinute (BucketStart, EventType, EventCount, ValueCount, ValueSum, ValueMin, ValueMax)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (EventType, BucketStart) DO UPDATE SET
+    EventCount = EventCount + excluded.EventCount,
+    ValueCount = ValueCount + excluded.ValueCount,
+    ValueSum = COALESCE(ValueSum + excluded.ValueSum, ValueSum, excluded.ValueSum),
+    ValueMin = COALESCE(MIN(ValueMin, excluded.ValueMin), ValueMin, excluded.ValueMin),
+    ValueMax = COALESCE(MAX(ValueMax, excluded.ValueMax), ValueMax, excluded.ValueMax)
+"""
+MERGE_TOTAL_SQL = """
+INSERT INTO EventRollupTotal (EventType, EventCount, ValueCount, ValueSum, ValueMin, ValueMax)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (EventType) DO UPDATE SET
+    EventCount = EventCount + excluded.EventCount,
+    ValueCount = ValueCount + excluded.ValueCount,
+    ValueSum = COALESCE(ValueSum + excluded.ValueSum, ValueSum, excluded.ValueSum),
+    ValueMin = COALESCE(MIN(ValueMin, excluded.ValueMin), ValueMin, excluded.ValueMin),
+    ValueMax = COALESCE(MAX(ValueMax, excluded.ValueMax), ValueMax, excluded.ValueMax)
+"""
+INSERT_CHECKPOINT_SQL = (
+    "INSERT INTO IngestCheckpoints (FileId, Generation, StartOffset, EndOffset) VALUES (?, ?, ?, ?)"
+)
+TIMELINE_COLUMNS = """
+    te.EventId, te.EventTime AS time, te.EventType AS event, te.MessageId AS msg_id,
+    te.MessageValues AS msg_values, te.Value AS value, m.Template AS template
+"""
+# First message value when it is a plain number (TRY_CAST in the SQL Server procedures)
+FIRST_VALUE_SQL = "json_extract(te.MessageValues, '$[0]')"
+FIRST_VALUE_IS_NUMBER = (
+    f"({FIRST_VALUE_SQL} GLOB '*[0-9]*' AND NOT {FIRST_VALUE_SQL} GLOB '*[^0-9.-]*')"
+)
+MAX_PAGE = 1000
+MAX_POINTS = 5000
+
+
+def _to_text(value):
+    """Normalizes a datetime or ISO string to the stored 'YYYY-MM-DD HH:MM:SS[.ffffff]' form."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.isoformat(sep=" ")
+
+
+def _to_datetime(text):
+    return datetime.fromisoformat(text) if text is not None else None
+
+
+def _message_id(metric):
+    """Message id of an msg_X metric, None for event type metrics."""
+    if metric.startswith("msg_") and metric[4:].isdigit():
+        return int(metric[4:])
+    return None
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    Embedded storage backend for small deployments, tests and benchmarks without SQL Server.
+
+    The database runs in WAL mode, so the API keeps reading while a writer commits, and concurrent
+    writer processes queue on the busy timeout instead of failing. Each process and thread opens its
+    own connection; only the path is pickled, so the backend can be handed to writer processes.
+    The queries mirror the SQL Server procedures, including the rollup tables the summary and
+    timeseries read.
+    """
+    def __init__(self, path=SQLITE_PATH, rollups=ROLLUPS_ENABLED, busy_timeout=SQLITE_BUSY_TIMEOUT):
+        self.path = str(path)
+        self.rollups = rollups
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._schema_ready = False
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state["_local"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    def connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        try:
+            if self.path != ":memory:":
+                Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            # autocommit mode; transactions are opened explicitly with BEGIN IMMEDIATE
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None,
+                                   check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            # with WAL, NORMAL only syncs at checkpoints and still never corrupts the database
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            if not self._schema_ready:
+                conn.executescript(SCHEMA_PATH.read_text(encoding="utf-8"))
+                self._schema_ready = True
+        except (sqlite3.Error, OSError) as e:
+            raise DatabaseConnectionError(f"Could not open SQLite database {self.path}: {e}") from e
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _query(self, sql, params=()):
+        return self.connect().execute(sql, params).fetchall()
+
+    def _transaction(self, work):
+        """Runs work(conn) in one write transaction; BEGIN IMMEDIATE takes the write lock up front."""
+        conn = self.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = work(conn)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return result
+
+    def get_ingest_watermark(self):
+        rows = self._query("""
+            SELECT
+                (SELECT seq FROM sqlite_sequence WHERE name = 'TimelineEvents') AS MaxEventId,
+                (SELECT seq FROM sqlite_sequence WHERE name = 'Messages') AS MaxMessageId,
+                (SELECT COALESCE(SUM(EventCount), 0) FROM EventRollupTotal) AS EventCount
+        """)
+        row = rows[0]
+        return (row["MaxEventId"], row["MaxMessageId"], row["EventCount"])
+
+    def get_messages(self):
+        return {str(row["MessageId"]): row["Template"] for row in self._query("SELECT MessageId, Template FROM Messages")}
+
+    def get_message_ids(self, limit):
+        rows = self._query("SELECT MessageId, Template FROM Messages ORDER BY MessageId DESC LIMIT ?", (limit,))
+        return {row["Template"]: row["MessageId"] for row in rows}
+
+    def get_or_create_message_ids(self, templates):
+        templates = list(dict.fromkeys(templates))
+        if not templates:
+            return {}
+
+        def upsert(conn):
+            conn.executemany("INSERT INTO Messages (Template) VALUES (?) ON CONFLICT (Template) DO NOTHING",
+                             [(t,) for t in templates])
+            ids = {}
+            for i in range(0, len(templates), IN_CHUNK):
+                chunk = templates[i:i + IN_CHUNK]
+                marks = ",".join("?" * len(chunk))
+                for row in conn.execute(f"SELECT MessageId, Template FROM Messages WHERE Template IN ({marks})", chunk):
+                    ids[row["Template"]] = row["MessageId"]
+            return ids
+
+        return self._transaction(upsert)
+
+    def insert_timeline_event(self, event_time, event_type, message_id=None, message_values=None, value=None):
+        self.bulk_insert_timeline_events([{
+            "time": event_time,
+            "event": event_type,
+            "msg_id": message_id,
+            "msg_values": json.dumps(message_values) if message_values else None,
+            "value": value,
+        }])
+
+    def bulk_insert_timeline_events(self, events, strategy=None, checkpoints=None):
+        """
+        Inserts the rows with one prepared statement and merges their rollups and records the
+        checkpoints in the same transaction. strategy is accepted for compatibility; SQLite has
+        a single path.
+        """
+        if not events:
+            return
+        try:
+            self._bulk_insert(events, checkpoints)
+        except (sqlite3.IntegrityError, sqlite3.DataError, ValueError) as e:
+            raise RowsRejectedError(str(e)) from e
+
+    def _bulk_insert(self, events, checkpoints=None):
+        rows = [
+            (
+                _to_text(e.get("time")),
+                e["event"],
+                int(e["msg_id"]) if e.get("msg_id") is not None else None,
+                e.get("msg_values"),
+                round(float(e["value"]), 2) if e.get("value") is not None else None,
+            )
+            for e in events
+        ]
+        rollups = minute_rollups(events) if self.rollups else []
+        spans = [(c["file"], c["generation"], c["start"], c["end"]) for c in checkpoint_rows(checkpoints or [])]
+
+        def insert(conn):
+            conn.executemany(INSERT_EVENT_SQL, rows)
+            if spans:
+                conn.executemany(INSERT_CHECKPOINT_SQL, spans)
+            if not rollups:
+                return
+            conn.executemany(MERGE_MINUTE_SQL, [
+                (_to_text(r["bucket"]), r["event"], r["count"], r["value_count"], _float(r["value_sum"]),
+                 _float(r["value_min"]), _float(r["value_max"]))
+                for r in rollups
+            ])
+            totals = {}
+            for r in rollups:
+                t = totals.setdefault(r["event"], [0, 0, None, None, None])
+                t[0] += r["count"]
+                t[1] += r["value_count"]
+                for i, key, pick in ((2, "value_sum", None), (3, "value_min", min), (4, "value_max", max)):
+                    v = _float(r[key])
+                    if v is None:
+                        continue
+                    t[i] = v if t[i] is None else (t[i] + v if pick is None else pick(t[i], v))
+            conn.executemany(MERGE_TOTAL_SQL, [(event,) + tuple(t) for event, t in sorted(totals.items())])
+
+        self._transaction(insert)
+
+    def get_timeline_page(self, page=1, per_page=30, event_type=None, before_id=None, after_id=None,
+                          keyset=False, include_total=False):
+        """Same contract as ChronoLogFacade.get_timeline_page (OFFSET pages or keyset seeks)."""
+        per_page = per_page if 1 <= per_page <= MAX_PAGE else (30 if per_page < 1 else MAX_PAGE)
+        type_filter = "(? IS NULL OR te.EventType = ?)"
+        if keyset or before_id is not None or after_id is not None:
+            total = None
+            if include_total:
+                total = self._query(
+                    "SELECT COALESCE(SUM(EventCount), 0) AS n FROM EventRollupTotal WHERE (? IS NULL OR EventType = ?)",
+                    (event_type, event_type))[0]["n"]
+            if after_id is not None:
+                # walk forward from the cursor, then return the page newest first
+                rows = self._query(f"""
+                    SELECT * FROM (
+                        SELECT {TIMELINE_COLUMNS}
+                        FROM TimelineEvents te LEFT JOIN Messages m ON te.MessageId = m.MessageId
+                        WHERE te.EventId > ? AND {type_filter}
+                        ORDER BY te.EventId ASC LIMIT ?
+                    ) ORDER BY EventId DESC
+                """, (after_id, event_type, event_type, per_page))
+            else:
+                rows = self._query(f"""
+                    SELECT {TIMELINE_COLUMNS}
+                    FROM TimelineEvents te LEFT JOIN Messages m ON te.MessageId = m.MessageId
+                    WHERE (? IS NULL OR te.EventId < ?) AND {type_filter}
+                    ORDER BY te.EventId DESC LIMIT ?
+                """, (before_id, before_id, event_type, event_type, per_page))
+        else:
+            page = max(1, page)
+            total = self._query(f"SELECT COUNT(*) AS n FROM TimelineEvents te WHERE {type_filter}",
+                                (event_type, event_type))[0]["n"]
+            rows = self._query(f"""
+                SELECT {TIMELINE_COLUMNS}
+                FROM TimelineEvents te LEFT JOIN Messages m ON te.MessageId = m.MessageId
+                WHERE {type_filter}
+                ORDER BY te.EventId DESC LIMIT ? OFFSET ?
+            """, (event_type, event_type, per_page, (page - 1) * per_page))
+        return [
+            {
+                "id": row["EventId"],
+                "time": _to_datetime(row["time"]),
+                "event": row["event"],
+                "msg_id": row["msg_id"],
+                "msg_values": json.loads(row["msg_values"]) if row["msg_values"] else None,
+                "value": float(row["value"]) if row["value"] is not None else None,
+                "template": row["template"],
+                "total_count": total,
+            }
+            for row in rows
+        ]
+
+    def get_summary(self):
+        row = self._query("""
+            SELECT
+                COALESCE(SUM(CASE WHEN EventType = 'error' THEN EventCount END), 0) AS error_count,
+                COALESCE(SUM(CASE WHEN EventType = 'warning' THEN EventCount END), 0) AS warning_count,
+                COALESCE(SUM(EventCount), 0) AS timeline_count,
+                COALESCE(SUM(CASE WHEN EventType = 'latency' THEN ValueCount END), 0) AS latency_count,
+                SUM(CASE WHEN EventType = 'latency' THEN ValueSum END)
+                    / NULLIF(SUM(CASE WHEN EventType = 'latency' THEN ValueCount END), 0) AS latency_average,
+                (SELECT COUNT(*) FROM Messages) AS unique_messages
+            FROM EventRollupTotal
+        """)[0]
+        return {
+            "error_count": row["error_count"],
+            "warning_count": row["warning_count"],
+            "timeline_count": row["timeline_count"],
+            "unique_messages": row["unique_messages"],
+            "latency_metrics": {
+                "count": row["latency_count"],
+                "average": round(row["latency_average"], 2) if row["latency_average"] is not None else 0,
+            },
+        }
+
+    def get_ingest_checkpoints(self, key):
+        rows = self._query(
+            "SELECT StartOffset, EndOffset FROM IngestCheckpoints WHERE FileId = ? AND Generation = ? "
+            "ORDER BY StartOffset",
+            (file_id(key), key[2]),
+        )
+        return [(row["StartOffset"], row["EndOffset"]) for row in rows]
+
+    def prune_ingest_checkpoints(self, key, offset=None):
+        def prune(conn):
+            if offset is None:
+                conn.execute("DELETE FROM IngestCheckpoints WHERE FileId = ?", (file_id(key),))
+            else:
+                conn.execute(
+                    "DELETE FROM IngestCheckpoints WHERE FileId = ? AND (Generation <> ? OR EndOffset <= ?)",
+                    (file_id(key), key[2], offset),
+                )
+        self._transaction(prune)
+
+    def delete_event_type(self, event_type):
+        def delete(conn):
+            for table in ("TimelineEvents", "EventRollupMinute", "EventRollupTotal"):
+                conn.execute(f"DELETE FROM {table} WHERE EventType = ?", (event_type,))
+        self._transaction(delete)
+
+    def purge_expired(self, retention_days):
+        """
+        SQLite has no partitions: the expired rows are deleted through the EventTime index, which
+        costs time proportional to the rows removed. Freed pages are reused by later inserts.
+        """
+        if retention_days <= 0:
+            return []
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        cutoff = _to_text(today - timedelta(days=retention_days))
+
+        def purge(conn):
+            oldest = conn.execute("SELECT MIN(EventTime) AS t FROM TimelineEvents").fetchone()["t"]
+            deleted = conn.execute("DELETE FROM TimelineEvents WHERE EventTime < ?", (cutoff,)).rowcount
+            if not deleted:
+                return []
+            conn.execute("DELETE FROM EventRollupMinute WHERE BucketStart < ?", (cutoff,))
+            conn.execute("DELETE FROM EventRollupTotal")
+            conn.execute("""
+                INSERT INTO EventRollupTotal (EventType, EventCount, ValueCount, ValueSum, ValueMin, ValueMax)
+                SELECT EventType, SUM(EventCount), SUM(ValueCount), SUM(ValueSum), MIN(ValueMin), MAX(ValueMax)
+                FROM EventRollupMinute GROUP BY EventType
+            """)
+            return [{"start": _to_datetime(oldest), "end": _to_datetime(cutoff), "rows": deleted}]
+
+        return self._transaction(purge)
+
+    def _latest_points(self, metric, limit):
+        limit = limit if 1 <= limit <= MAX_POINTS else (500 if limit < 1 else MAX_POINTS)
+        message_id = _message_id(metric)
+        if message_id is None:
+            event_type = "latency" if metric.lower() == "latency" else metric
+            rows = self._query("""
+                SELECT BucketStart AS time, ROUND(ValueSum / ValueCount, 2) AS value
+                FROM EventRollupMinute
+                WHERE EventType = ? AND ValueCount > 0
+                ORDER BY BucketStart DESC LIMIT ?
+            """, (event_type, limit))
+        else:
+            rows = self._query(f"""
+                SELECT te.EventTime AS time, ROUND(CAST({FIRST_VALUE_SQL} AS REAL), 2) AS value
+                FROM TimelineEvents te
+                WHERE te.MessageId = ? AND te.MessageValues IS NOT NULL AND {FIRST_VALUE_IS_NUMBER}
+                ORDER BY te.EventId DESC LIMIT ?
+            """, (message_id, limit))
+        return [{"time": _to_datetime(row["time"]), "value": float(row["value"])} for row in rows]
+
+    def _bucket_points(self, metric, start, end, buckets):
+        buckets = buckets if 1 <= buckets <= MAX_POINTS else (500 if buckets < 1 else MAX_POINTS)
+        message_id = _message_id(metric)
+        start, end = _to_datetime(_to_text(start)), _to_datetime(_to_text(end))
+
+        # open range ends default to the first/last point of the metric
+        if message_id is None:
+            if start is None or end is None:
+                row = self._query("SELECT MIN(BucketStart) AS lo, MAX(BucketStart) AS hi FROM EventRollupMinute "
+                                  "WHERE EventType = ?", (metric,))[0]
+                start = start or _to_datetime(row["lo"])
+                end = end or (_to_datetime(row["hi"]) + timedelta(minutes=1) if row["hi"] else None)
+        elif start is None or end is None:
+            row = self._query("SELECT MIN(EventTime) AS lo, MAX(EventTime) AS hi FROM TimelineEvents "
+                              "WHERE MessageId = ?", (message_id,))[0]
+            start = start or _to_datetime(row["lo"])
+            end = end or (_to_datetime(row["hi"]) + timedelta(seconds=1) if row["hi"] else None)
+        if start is None or end is None or end <= start:
+            return []
+
+        span = int((end - start).total_seconds())
+        bucket_seconds = max(1, (span + buckets - 1) // buckets)
+        if message_id is None:
+            # rollups have minute resolution: align the range and use whole-minute buckets
+            start = start.replace(second=0, microsecond=0)
+            bucket_seconds = ((bucket_seconds + 59) // 60) * 60
+            rows = self._query("""
+                SELECT (CAST(strftime('%s', BucketStart) AS INTEGER) - CAST(strftime('%s', ?) AS INTEGER)) / ? AS bucket,
+                       SUM(ValueSum) / SUM(ValueCount) AS value, MIN(ValueMin) AS min, MAX(ValueMax) AS max,
+                       SUM(ValueCount) AS count
+                FROM EventRollupMinute
+                WHERE EventType = ? AND BucketStart >= ? AND BucketStart < ? AND ValueCount > 0
+                GROUP BY bucket ORDER BY bucket
+            """, (_to_text(start), bucket_seconds, metric, _to_text(start), _to_text(end)))
+        else:
+            rows = self._query(f"""
+                SELECT (CAST(strftime('%s', te.EventTime) AS INTEGER) - CAST(strftime('%s', ?) AS INTEGER)) / ? AS bucket,
+                       AVG(CAST({FIRST_VALUE_SQL} AS REAL)) AS value, MIN(CAST({FIRST_VALUE_SQL} AS REAL)) AS min,
+                       MAX(CAST({FIRST_VALUE_SQL} AS REAL)) AS max, COUNT(*) AS count
+                FROM TimelineEvents te
+                WHERE te.MessageId = ? AND te.EventTime >= ? AND te.EventTime < ? AND {FIRST_VALUE_IS_NUMBER}
+                GROUP BY bucket ORDER BY bucket
+            """, (_to_text(start), bucket_seconds, message_id, _to_text(start), _to_text(end)))
+        return [
+            {
+                "time": start + timedelta(seconds=row["bucket"] * bucket_seconds),
+                "value": round(row["value"], 2),
+                "min": round(row["min"], 2),
+                "max": round(row["max"], 2),
+                "count": row["count"],
+            }
+            for row in rows
+        ]
+
+
+def _float(value):
+    return float(value) if value is not None else None
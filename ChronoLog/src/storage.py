@@ -0,0 +1,203 @@
+from datetime import datetime
+from decimal import Decimal
+from config import STORAGE_BACKEND
+from downsample import lttb, LTTB_OVERSAMPLE, DOWNSAMPLE_MODES
+
+# Nothing here may import pyodbc: the SQLite backend, the writers and the API load this module
+# on hosts without an ODBC driver
+
+STORAGE_BACKENDS = ("mssql", "sqlite")
+
+# Length of Messages.Template; longer templates are truncated before lookup
+MAX_TEMPLATE_LENGTH = 500
+
+# Length of TimelineEvents.MessageValues; longer value arrays are shortened before insert
+MAX_VALUES_LENGTH = 500
+
+CENTS = Decimal("0.01")
+
+
+def _minute_bucket(event_time):
+    if isinstance(event_time, datetime):
+        return event_time.replace(second=0, microsecond=0).isoformat()
+    # "YYYY-MM-DDTHH:MM:SS..." as produced by the parser
+    return datetime.fromisoformat(event_time).replace(second=0, microsecond=0).isoformat()
+
+
+def minute_rollups(events):
+    """
+    Aggregates events into one row per (minute, event type) with count, value count, sum, min and max,
+    in the JSON format of sp_MergeEventRollups. Values are rounded like the DECIMAL(18,2) column,
+    so the rollups agree with the stored rows.
+    """
+    buckets = {}
+    for e in events:
+        if e.get("time") is None:
+            continue
+        key = (_minute_bucket(e["time"]), e["event"])
+        b = buckets.get(key)
+        if b is None:
+            b = buckets[key] = [0, 0, None, None, None]
+        b[0] += 1
+        value = e.get("value")
+        if value is not None:
+            value = Decimal(str(value)).quantize(CENTS)
+            b[1] += 1
+            b[2] = value if b[2] is None else b[2] + value
+            b[3] = value if b[3] is None or value < b[3] else b[3]
+            b[4] = value if b[4] is None or value > b[4] else b[4]
+    return [
+        {
+            "bucket": bucket,
+            "event": event,
+            "count": count,
+            "value_count": value_count,
+            "value_sum": str(total) if total is not None else None,
+            "value_min": str(vmin) if vmin is not None else None,
+            "value_max": str(vmax) if vmax is not None else None,
+        }
+        # sorted, so concurrent writers lock the rollup rows in the same order
+        for (bucket, event), (count, value_count, total, vmin, vmax) in sorted(buckets.items(), key=lambda kv: (kv[0][1], kv[0][0]))
+    ]
+
+
+def checkpoint_rows(spans):
+    """
+    Byte ranges acknowledged with a bulk insert, (file key, start, end) with file key = (device,
+    inode, generation), as IngestCheckpoints rows {file, generation, start, end}.
+    """
+    return [
+        {"file": file_id(key), "generation": key[2], "start": start, "end": end}
+        for key, start, end in spans
+    ]
+
+
+def file_id(key):
+    """The file part of a file key: "device:inode"."""
+    return f"{key[0]}:{key[1]}"
+
+
+class DatabaseConnectionError(Exception):
+    """The store cannot be reached; the API answers 503."""
+
+
+class RowsRejectedError(Exception):
+    """
+    The store refused a bulk insert because of the values of some rows (overflow, bad date, constraint).
+    Nothing of the batch was inserted; the other rows can be inserted without the bad ones.
+    """
+
+
+class StorageBackend:
+    """
+    What the writers and the API need from a store: template upserts, bulk inserts with rollups,
+    timeline pages, the summary and timeseries.
+
+    ChronoLogFacade implements it on SQL Server stored procedures, SQLiteBackend on an embedded
+    SQLite database. Both return the same shapes (times as datetime objects), so the API output
+    does not depend on the backend. Timeseries downsampling is shared: a backend only supplies the
+    latest points and the bucketed range.
+    """
+    def get_pool_stats(self):
+        return {}
+
+    def get_ingest_watermark(self):
+        """A tuple that changes whenever events or templates are added (or events deleted)."""
+        raise NotImplementedError
+
+    def get_messages(self):
+        """All templates as {str(id): template}."""
+        raise NotImplementedError
+
+    def get_message_ids(self, limit):
+        """Up to `limit` of the most recently created templates as {template: id}."""
+        raise NotImplementedError
+
+    def get_or_create_message_ids(self, templates):
+        """Ids for many templates in one round trip, creating the missing ones; {template: id}."""
+        raise NotImplementedError
+
+    def get_or_create_message_id(self, template):
+        return self.get_or_create_message_ids([template]).get(template)
+
+    def bulk_insert_timeline_events(self, events, strategy=None, checkpoints=None):
+        """
+        Inserts rows {time, event, msg_id, msg_values, value} and merges their per-minute rollups
+        in the same transaction. checkpoints are the input byte ranges (file key, start, end) the
+        rows complete; they are recorded in IngestCheckpoints in that transaction too, so a restart
+        knows exactly what is committed. Raises RowsRejectedError if values of the rows are refused.
+        """
+        raise NotImplementedError
+
+    def get_ingest_checkpoints(self, key):
+        """Byte ranges [(start, end)] recorded for a file key, ordered by start."""
+        raise NotImplementedError
+
+    def prune_ingest_checkpoints(self, key, offset=None):
+        """
+        Removes the ranges of the file of key that a saved checkpoint covers: those of other
+        generations and those ending at or before offset. offset=None removes all its ranges.
+        """
+        raise NotImplementedError
+
+    def get_timeline_page(self, page=1, per_page=30, event_type=None, before_id=None, after_id=None,
+                          keyset=False, include_total=False):
+        raise NotImplementedError
+
+    def get_summary(self):
+        raise NotImplementedError
+
+    def delete_event_type(self, event_type):
+        """Removes all events of a type and their rollups (benchmark cleanup)."""
+        raise NotImplementedError
+
+    def purge_expired(self, retention_days):
+        """
+        Retention job: removes events older than midnight `retention_days` days ago (0 keeps
+        everything) and their rollups. Returns the purged ranges as [{start, end, rows}].
+        """
+        raise NotImplementedError
+
+    def get_timeseries(self, metric, limit=500, start=None, end=None, points=None, mode="bucket"):
+        """
+        Retrieves timeseries data for a metric.
+
+        Without start, end or points: the latest `limit` points.
+        Otherwise the [start, end) range (open ends: first/last point) is reduced to at most
+        `points` (default: limit) points, so any range returns a bounded payload:
+          mode="bucket": equal-width time buckets with value (average), min, max and count
+          mode="lttb": LTTB-selected points of a finer bucketing, which keeps peaks visible
+        """
+        if mode not in DOWNSAMPLE_MODES:
+            raise ValueError(f"Unknown downsampling mode '{mode}', expected one of {DOWNSAMPLE_MODES}")
+        if start is None and end is None and points is None:
+            return self._latest_points(metric, limit)
+
+        points = points or limit
+        buckets = points * LTTB_OVERSAMPLE if mode == "lttb" else points
+        rows = self._bucket_points(metric, start, end, buckets)
+        if not rows:
+            return []
+        if mode == "lttb":
+            series = [{"time": row["time"], "value": row["value"]} for row in rows]
+            return lttb(series, points, key=lambda p: (p["time"].timestamp(), p["value"]))
+        return rows
+
+    def _latest_points(self, metric, limit):
+        """The newest `limit` points [{time, value}] of a metric, newest first."""
+        raise NotImplementedError
+
+    def _bucket_points(self, metric, start, end, buckets):
+        """At most `buckets` equal-width buckets [{time, value, min, max, count}] of [start, end), oldest first."""
+        raise NotImplementedError
+
+
+def create_storage(backend=STORAGE_BACKEND, **options):
+    """Opens the configured storage backend; options go to its constructor."""
+    if backend == "mssql":
+        from facade import ChronoLogFacade
+        return ChronoLogFacade(**options)
+    if backend == "sqlite":
+        from sqlite_backend import SQLiteBackend
+        return SQLiteBackend(**options)
+    raise ValueError(f"Unknown storage backend '{backend}', expected one of {STORAGE_BACKENDS}")
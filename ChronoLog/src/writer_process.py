@@ -1,21 +1,66 @@
 ﻿import time
-import re
 import json
 import os
 import queue
-from facade import ChronoLogFacade
-from config import WRITER_FLUSH_INTERVAL
+from storage import create_storage, RowsRejectedError, MAX_TEMPLATE_LENGTH, MAX_VALUES_LENGTH
+from message_cache import MessageCache
+from event_stream import FlushNotifier
+import metrics
+from config import (
+    WRITER_FLUSH_INTERVAL, WRITER_BATCH_ROWS, WRITER_BATCH_BYTES, WRITER_RETRY_SECONDS, WRITER_RETRY_MAX_SECONDS,
+    MSG_CACHE_SIZE, METRICS_DIR
+)
+
+# Approximate JSON overhead of one row (keys, quotes, separators) for the batch size estimate
+ROW_OVERHEAD_BYTES = 72
 
 class WriterProcess:
-    def __init__(self, flush_interval=WRITER_FLUSH_INTERVAL):
+    def __init__(self, flush_interval=WRITER_FLUSH_INTERVAL, batch_rows=WRITER_BATCH_ROWS, batch_bytes=WRITER_BATCH_BYTES,
+                 msg_cache_size=MSG_CACHE_SIZE, spill=None, facade=None, metrics_dir=METRICS_DIR):
         self.flush_interval = flush_interval
-        self.facade = ChronoLogFacade()
-        self.msg_cache = {} 
+        self.batch_rows = batch_rows
+        self.batch_bytes = batch_bytes
+        # anything with the facade's message and bulk insert methods, e.g. the benchmark's null sink
+        self.facade = facade if facade is not None else create_storage()
+        self.msg_cache = MessageCache(msg_cache_size)
+        # Tells /api/stream subscribers that new rows are committed
+        self.notifier = FlushNotifier()
+        # Created in run(), so the snapshot file is named after the writer process
+        self.metrics = None
+        self.metrics_dir = metrics_dir
+
+        # Rows accumulated across queue items until the next flush
+        self.pending = []
+        self.pending_bytes = 0
+        self.batch_started = None
+        # [rows in pending, span] per queue item, in queue order; a span (byte range of the input) is
+        # acknowledged once all rows of its item are inserted
+        self.pending_items = []
+        self.ack_queue = None
+        # After a failed insert the batch stays pending and is retried at retry_at (monotonic)
+        self.retry_at = None
+        self.retry_delay = 0.0
+        # Segments spilled by the parse workers while the queue was full; drained before new queue items
+        self.spill = spill
+        # The claimed segment whose rows are pending; deleted once they are inserted
+        self.spill_segment = None
+        self.flush_stats = {
+            "flushes": 0,
+            "rows": 0,
+            "failed": 0,
+            "rejected": 0,
+            "total_latency": 0.0,
+            "max_latency": 0.0,
+            "reasons": {},
+        }
 
-    def run(self, queue, stop_flag):
+    def run(self, queue, stop_flag, ack_queue=None):
         print(f"WriterProcess started. PID: {os.getpid()}")
+        self.ack_queue = ack_queue
+        self.metrics = metrics.Metrics("writer", directory=self.metrics_dir)
+        self._preload_messages()
         try:
-            while not stop_flag.is_set() or not queue.empty():
+            while not stop_flag.is_set() or not queue.empty() or self._spill_ready() or self.retry_at is not None:
                 self._process_queue(queue)
         except KeyboardInterrupt:
             print("WriterProcess interrupted")
@@ -25,63 +70,342 @@ class WriterProcess:
             print("WriterProcess draining queue...")
             while not queue.empty():
                 self._process_queue(queue)
+            while self._drain_spill():
+                pass
+            if not self._flush("shutdown"):
+                print(f"WriterProcess gives up on {len(self.pending)} rows")
+            self._publish_metrics(force=True)
+            self._print_flush_stats()
             print("WriterProcess finished")
 
     def _process_queue(self, queue_obj):
         try:
-            item = queue_obj.get(timeout=0.5)
-            if not item:
-                return
-                
-            delta_events, delta_timeline = item
-            print(f"Writer received chunk with {len(delta_timeline)} events") # DEBUG
-            
-            bulk_data = []
-            for entry in delta_timeline:
-                processed = self._prepare_entry(entry)
-                if processed:
-                    bulk_data.append(processed)
-            
-            if bulk_data:
-                print(f"Bulk inserting {len(bulk_data)} events") # DEBUG
-                self.facade.bulk_insert_timeline_events(bulk_data)
+            if self.retry_at is not None:
+                # the failed batch goes first; meanwhile the queue fills up and the parse workers spill
+                wait = self.retry_at - time.monotonic()
+                if wait > 0:
+                    time.sleep(min(0.5, wait))
+            elif self._spill_ready():
+                # spilled items were produced before the ones queued since: insert them first
+                self._drain_spill()
             else:
-                # pass
-                print("No data to insert") # DEBUG
+                item = queue_obj.get(timeout=self._get_timeout())
+                if item:
+                    self._add_item(item)
 
         except queue.Empty:
-            print("Writer queue empty, waiting...") # DEBUG
             pass
         except Exception as e:
-            print(f"Writer error: {e}") # DEBUG
-            pass
+            self._metric("inc", "writer_errors_total")
+            print(f"Writer could not process a queued item: {e}")
 
-    def _prepare_entry(self, entry):
-        msg_key = entry.get("msg")
-        msg_id = None
-        msg_values = None
+        reason = self._flush_reason()
+        if reason:
+            self._flush(reason)
+        self._publish_metrics()
+
+    def _add_item(self, item):
+        delta_events, delta_timeline = item[0], item[1]
+        self._metric("inc", "writer_chunks_total")
 
-        if msg_key:
-            stripped = re.sub(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2} ", "", msg_key)
-            nums = re.findall(r"\b\d+\b", stripped)
-            tmpl = re.sub(r"\b\d+\b", "{num}", stripped)
+        count = len(self.pending)
+        for entry in delta_timeline:
+            processed = self._prepare_entry(entry)
+            if processed:
+                self._add_row(processed)
+        span = item[2] if len(item) > 2 else None
+        self.pending_items.append([len(self.pending) - count, span])
 
-            # Check local cache first
+    def _spill_ready(self):
+        """Spilled segments wait and no failed insert is waiting for its retry."""
+        return self.spill is not None and self.retry_at is None and self.spill.has_segments()
+
+    def _drain_spill(self):
+        """
+        Claims the oldest spilled segment and inserts its rows; the segment is deleted once they are
+        committed. If the insert fails, the rows stay pending (and the segment claimed) until the retry.
+        Rows already pending from the queue are flushed first, so they never share a batch with a segment.
+        A segment that cannot be read is quarantined. Returns False when there was nothing to claim or
+        an insert failed.
+        """
+        if self.spill is None or self.retry_at is not None:
+            return False
+        if self.pending and not self._flush("spill"):
+            return False
+        path = self.spill.claim()
+        if path is None:
+            return False
+        try:
+            items = self.spill.read(path)
+        except Exception as e:
+            self._metric("inc", "writer_errors_total")
+            quarantined = self.spill.quarantine(path)
+            print(f"Writer could not read spill segment {path}, moved it to {quarantined}: {e}")
+            return True
+        for item in items:
+            self._add_item(item)
+        self.spill_segment = path
+        return self._flush("spill")
+
+    def _preload_messages(self):
+        """
+        Fills the template cache from the Messages table, so known templates never need a lookup.
+        """
+        try:
+            self.msg_cache.load(self.facade.get_message_ids(self.msg_cache.max_size))
+            print(f"Writer preloaded {len(self.msg_cache)} message templates")
+        except Exception as e:
+            print(f"Writer could not preload message templates: {e}")
+
+    def _get_timeout(self):
+        """
+        Waits at most until the pending batch is due, so the flush interval is honoured on an idle queue.
+        """
+        if self.batch_started is None:
+            return 0.5
+        remaining = self.flush_interval - (time.monotonic() - self.batch_started)
+        return min(0.5, max(0.01, remaining))
+
+    def _add_row(self, row):
+        if self.batch_started is None:
+            self.batch_started = time.monotonic()
+        self.pending.append(row)
+        self.pending_bytes += (
+            ROW_OVERHEAD_BYTES
+            + len(row["time"] or "")
+            + len(row["event"])
+            + len(row["msg_values"] or "")
+        )
+
+    def _flush_reason(self):
+        if self.retry_at is not None:
+            return "retry" if time.monotonic() >= self.retry_at else None
+        if not self.pending:
+            return None
+        if len(self.pending) >= self.batch_rows:
+            return "rows"
+        if self.pending_bytes >= self.batch_bytes:
+            return "bytes"
+        if time.monotonic() - self.batch_started >= self.flush_interval:
+            return "interval"
+        return None
+
+    def _flush(self, reason):
+        """
+        Inserts all pending rows in one bulk call and records rows per flush, latency and reason.
+
+        If the database refuses values of the batch, it is split until the bad rows are isolated
+        (see _insert_pending); they are skipped, all other rows are inserted. Any other error keeps
+        the rest of the batch pending for a retry after a back-off, during which the writer takes
+        no new rows. Returns False when the insert failed and waits for its retry.
+        """
+        if not self.pending:
+            self._consume(0)
+            self._release_spill_segment()
+            return True
+
+        start = time.perf_counter()
+        try:
+            self._resolve_message_ids(self.pending)
+            inserted = self._insert_pending()
+        except Exception as e:
+            self.flush_stats["failed"] += 1
+            self._metric("inc", "flush_failures_total")
+            self.retry_delay = min(max(self.retry_delay * 2, WRITER_RETRY_SECONDS), WRITER_RETRY_MAX_SECONDS)
+            self.retry_at = time.monotonic() + self.retry_delay
+            print(f"Writer flush of {len(self.pending)} rows failed, retrying in {self.retry_delay:.0f}s: {e}")
+            return False
+        latency = time.perf_counter() - start
+        self.retry_at = None
+        self.retry_delay = 0.0
+        self.pending_bytes = 0
+        self.batch_started = None
+        self._release_spill_segment()
+        self.notifier.notify(inserted)
+
+        stats = self.flush_stats
+        stats["flushes"] += 1
+        stats["rows"] += len(inserted)
+        stats["total_latency"] += latency
+        stats["max_latency"] = max(stats["max_latency"], latency)
+        stats["reasons"][reason] = stats["reasons"].get(reason, 0) + 1
+        self._metric("inc", "flushes_total")
+        self._metric("inc", "rows_inserted_total", len(inserted))
+        self._metric("observe", "insert_seconds", latency)
+        return True
+
+    def _insert_pending(self):
+        """
+        Inserts the pending rows, front to back, and returns the inserted ones. A batch refused for
+        its values is halved, at a queue item boundary while it holds several items, until the bad
+        rows are single; those are skipped. Inserted and skipped rows leave pending right away, so an
+        error half way only leaves the rest for the retry.
+
+        Each insert records the spans of the items it completes in its own transaction, so a restart
+        knows exactly which rows are in. Only an item cut by a split is committed in parts before its
+        span is recorded.
+        """
+        inserted = []
+        size = len(self.pending)
+        while self.pending:
+            batch = self.pending[:size]
+            spans = [span for _, span in self.pending_items[:self._completed_items(size)] if span is not None]
+            try:
+                if spans:
+                    self.facade.bulk_insert_timeline_events(batch, checkpoints=spans)
+                else:
+                    self.facade.bulk_insert_timeline_events(batch)
+            except RowsRejectedError as e:
+                if size > 1:
+                    size = self._split_size(size)
+                    continue
+                self.flush_stats["rejected"] += 1
+                self._metric("inc", "rows_rejected_total")
+                print(f"Writer skipped a row the database refused ({e}): {batch[0]}")
+                self._consume(1)
+                size = len(self.pending)
+                continue
+            inserted.extend(batch)
+            self._consume(size)
+            size = len(self.pending)
+        return inserted
+
+    def _split_size(self, size):
+        """About half of the first size pending rows, cut between queue items where possible."""
+        best, count = None, 0
+        for rows, _ in self.pending_items:
+            count += rows
+            if count >= size:
+                break
+            if count and (best is None or abs(count - size / 2) < abs(best - size / 2)):
+                best = count
+        return best or size // 2
+
+    def _completed_items(self, count):
+        """Number of pending items (empty ones included) whose rows are all among the first count rows."""
+        done = 0
+        for rows, _ in self.pending_items:
+            if rows > count:
+                break
+            count -= rows
+            done += 1
+        return done
+
+    def _consume(self, count):
+        """Drops the first count pending rows and acknowledges the spans of the items they complete."""
+        del self.pending[:count]
+        done = self._completed_items(count)
+        items, self.pending_items = self.pending_items[:done], self.pending_items[done:]
+        if self.pending_items:
+            self.pending_items[0][0] -= count - sum(rows for rows, _ in items)
+        self._ack([span for _, span in items if span is not None])
+
+    def _release_spill_segment(self):
+        if self.spill_segment is not None:
+            self.spill.release(self.spill_segment)
+            self.spill_segment = None
+
+    def _metric(self, method, name, value=1):
+        # metrics are set up in run(); a writer driven directly (tests, scripts) records nothing
+        if self.metrics is not None:
+            getattr(self.metrics, method)(name, value)
+
+    def _publish_metrics(self, force=False):
+        if self.metrics is None:
+            return
+        m = self.metrics
+        m.set("pending_rows", len(self.pending))
+        m.set("template_cache_size", len(self.msg_cache))
+        m.counters["template_cache_hits_total"] = self.msg_cache.hits
+        m.counters["template_cache_misses_total"] = self.msg_cache.misses
+        m.publish(force=force)
+
+    def _ack(self, spans):
+        if spans and self.ack_queue is not None:
+            self.ack_queue.put(spans)
+
+    def _resolve_message_ids(self, rows):
+        """
+        Replaces each row's template with its MessageId.
+        Templates missing from the cache are created or looked up in one set-based round trip.
+        """
+        resolved = {}
+        unknown = set()
+        # rows of a batch that is retried are resolved already
+        rows = [row for row in rows if "template" in row]
+        for row in rows:
+            tmpl = row["template"]
+            if tmpl is None or tmpl in resolved or tmpl in unknown:
+                continue
             msg_id = self.msg_cache.get(tmpl)
             if msg_id is None:
-                # Get from DB (or create)
-                msg_id = self.facade.get_or_create_message_id(tmpl)
-                if msg_id is not None:
-                    msg_id = int(msg_id)
-                    self.msg_cache[tmpl] = msg_id
+                unknown.add(tmpl)
+            else:
+                resolved[tmpl] = msg_id
+
+        if unknown:
+            for tmpl, msg_id in self.facade.get_or_create_message_ids(unknown).items():
+                self.msg_cache.put(tmpl, msg_id)
+                resolved[tmpl] = msg_id
+
+        for row in rows:
+            row["msg_id"] = resolved.get(row.pop("template"))
 
-            if nums:
-                msg_values = json.dumps(nums)
+    def _print_flush_stats(self):
+        stats = self.flush_stats
+        if not stats["flushes"]:
+            return
+        avg_rows = stats["rows"] / stats["flushes"]
+        avg_latency = stats["total_latency"] / stats["flushes"] * 1000
+        reasons = ", ".join(f"{k}: {v}" for k, v in sorted(stats["reasons"].items()))
+        print(
+            f"Writer flushes: {stats['flushes']} ({reasons}), {stats['rows']} rows, "
+            f"{avg_rows:.0f} rows/flush, avg latency {avg_latency:.1f} ms, "
+            f"max {stats['max_latency'] * 1000:.1f} ms, {stats['failed']} failed"
+        )
+        cache = self.msg_cache.stats()
+        print(
+            f"Template cache: {cache['size']}/{cache['max_size']} entries, {cache['hits']} hits, "
+            f"{cache['misses']} misses ({cache['hit_rate']:.1%} hit rate), {cache['evictions']} evictions"
+        )
+
+    def _prepare_entry(self, entry):
+        """
+        Converts a parsed entry into a row. Templates are extracted by the parse workers;
+        the MessageId is filled in at flush time.
+        """
+        tmpl = entry.get("template")
+        values = entry.get("values")
+        if tmpl is not None:
+            tmpl = tmpl[:MAX_TEMPLATE_LENGTH]
+        msg_values = self._encode_values(values) if values else None
 
         return {
             "time": entry["time"],
             "event": entry["event"],
-            "msg_id": msg_id,
+            "msg_id": None,
+            "template": tmpl,
             "msg_values": msg_values,
             "value": entry.get("value") # Pass as number or None
-        }
\ No newline at end of file
+        }
+
+    @staticmethod
+    def _encode_values(values):
+        """
+        JSON-encodes message values within MAX_VALUES_LENGTH. Oversize arrays are shortened by
+        trimming the longest value (then dropping trailing empty ones), so the result stays valid JSON.
+        """
+        text = json.dumps(values)
+        if len(text) <= MAX_VALUES_LENGTH:
+            return text
+        values = [str(v) for v in values]
+        while len(text) > MAX_VALUES_LENGTH:
+            longest = max(range(len(values)), key=lambda i: len(values[i]))
+            if values[longest]:
+                # every dropped character shortens the encoding by at least one
+                excess = len(text) - MAX_VALUES_LENGTH
+                values[longest] = values[longest][:max(0, len(values[longest]) - excess)]
+            else:
+                values.pop()
+            text = json.dumps(values)
+        return text
\ No newline at end of file
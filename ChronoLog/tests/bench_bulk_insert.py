@@ -0,0 +1,58 @@
+import sys
+import time
+import argparse
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add src to path
+sys.path.append(str(Path(__file__).resolve().parent.parent / "src"))
+
+from facade import ChronoLogFacade, BULK_INSERT_STRATEGIES
+
+BENCH_EVENT_PREFIX = "bench_"
+
+def make_events(count, event_type):
+    base = datetime(2025, 1, 1)
+    events = []
+    for i in range(count):
+        events.append({
+            "time": (base + timedelta(seconds=i)).isoformat(),
+            "event": event_type,
+            "msg_id": None,
+            "msg_values": f'["{i}", "{i % 97}"]' if i % 2 else None,
+            "value": (i % 1000) + 0.25 if i % 3 else None
+        })
+    return events
+
+def bench_strategy(facade, strategy, rows, batch_size):
+    event_type = f"{BENCH_EVENT_PREFIX}{strategy}"
+    events = make_events(rows, event_type)
+    start = time.perf_counter()
+    for i in range(0, rows, batch_size):
+        facade.bulk_insert_timeline_events(events[i:i + batch_size], strategy=strategy)
+    elapsed = time.perf_counter() - start
+    facade.db.execute_non_query("DELETE FROM TimelineEvents WHERE EventType = ?", (event_type,))
+    for table in ("EventRollupMinute", "EventRollupTotal"):
+        facade.db.execute_non_query(f"DELETE FROM {table} WHERE EventType = ?", (event_type,))
+    return elapsed
+
+def main():
+    p = argparse.ArgumentParser(description="Compare bulk insert strategies (rows/sec)")
+    p.add_argument("--rows", type=int, default=50000)
+    p.add_argument("--batch-size", type=int, default=5000)
+    p.add_argument("--strategies", default=",".join(BULK_INSERT_STRATEGIES))
+    args = p.parse_args()
+
+    facade = ChronoLogFacade()
+    print(f"Inserting {args.rows} rows in batches of {args.batch_size}")
+    for strategy in [s.strip() for s in args.strategies.split(",") if s.strip()]:
+        try:
+            elapsed = bench_strategy(facade, strategy, args.rows, args.batch_size)
+            print(f"{strategy:<12} {elapsed:8.2f}s  {args.rows / elapsed:12.0f} rows/sec")
+        except Exception as e:
+            print(f"{strategy:<12} failed: {e}")
+        # a fallback inside the facade must not leak into the next strategy
+        facade.bulk_insert_strategy = "executemany"
+
+if __name__ == "__main__":
+    main()
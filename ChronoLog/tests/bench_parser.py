@@ -0,0 +1,107 @@
+import re
+import sys
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add src to path
+sys.path.append(str(Path(__file__).resolve().parent.parent / "src"))
+
+from log_parser import LogParser
+
+def tracked_regex(count):
+    names = ["processed", "latency"] + [f"metric_{i}" for i in range(max(count - 2, 0))]
+    return {v: re.compile(rf"\b{re.escape(v)}=(\d+)\b") for v in names[:count]}
+
+def per_pattern_scan(lines, var_regex):
+    # The previous approach: substring checks plus one search per tracked variable
+    results = []
+    for line in lines:
+        levels = [lv for lv in ("ERROR", "WARNING") if lv in line]
+        variables = []
+        for var, rx in var_regex.items():
+            m = rx.search(line)
+            if m:
+                variables.append((var, int(m.group(1))))
+        results.append((levels, variables))
+    return results
+
+def make_lines(count, lines_per_second):
+    rnd = random.Random(42)
+    base = datetime(2025, 1, 1)
+    lines = []
+    for i in range(count):
+        ts = (base + timedelta(seconds=i // lines_per_second)).strftime("%Y-%m-%d %H:%M:%S")
+        kind = rnd.random()
+        if kind < 0.1:
+            lines.append(f"{ts} ERROR Timeout after {rnd.randint(1, 60)} seconds on port {rnd.randint(1000, 9999)}")
+        elif kind < 0.2:
+            lines.append(f"{ts} WARNING Memory usage at {rnd.randint(50, 99)}%")
+        else:
+            lines.append(f"{ts} INFO processed={rnd.randint(1, 500)} latency={rnd.randint(1, 900)}")
+    return lines
+
+def make_noisy_log(count, noise):
+    # noise = share of lines without a level keyword or key=value pair (INFO/DEBUG chatter)
+    rnd = random.Random(7)
+    base = datetime(2025, 1, 1)
+    out = []
+    for i, line in enumerate(make_lines(count, 20)):
+        if rnd.random() < noise:
+            ts = (base + timedelta(seconds=i // 20)).strftime("%Y-%m-%d %H:%M:%S")
+            line = f"{ts} DEBUG request {rnd.randint(1, 10 ** 6)} served from cache in worker {rnd.randint(1, 16)}"
+        out.append(line)
+    return ("\n".join(out) + "\n").encode("utf-8")
+
+def bench(label, func, lines, repeat, count=None):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(lines)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{label:<24} {best:8.3f}s  {(count or len(lines)) / best:12.0f} lines/sec")
+    return best
+
+def main():
+    p = argparse.ArgumentParser(description="Parser microbenchmark (lines/sec)")
+    p.add_argument("--lines", type=int, default=200000)
+    p.add_argument("--lines-per-second", type=int, default=20,
+                   help="log lines sharing one timestamp")
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--track", default="0,2,8,32",
+                   help="comma-separated tracked variable counts to compare")
+    p.add_argument("--noise", type=float, default=0.95,
+                   help="share of uninteresting lines in the raw-buffer comparison")
+    args = p.parse_args()
+
+    lines = make_lines(args.lines, args.lines_per_second)
+    parser = LogParser()
+    print(f"Parsing {args.lines} lines, {args.lines_per_second} per timestamp, best of {args.repeat}")
+
+    slow = bench("timestamp (fallback)", lambda ls: [parser._parse_timestamp_fallback(l) for l in ls], lines, args.repeat)
+    fast = bench("timestamp (fast path)", lambda ls: [parser.extract_timestamp(l) for l in ls], lines, args.repeat)
+    print(f"timestamp speedup: {slow / fast:.1f}x")
+    bench("parse_lines", parser.parse_lines, lines, args.repeat)
+
+    for count in [int(c) for c in args.track.split(",") if c.strip()]:
+        if count == 0:
+            continue
+        var_regex = tracked_regex(count)
+        tracked = LogParser(var_regex=var_regex)
+        bench(f"scan ({count} tracked)", lambda ls: [tracked.scan_line(l) for l in ls], lines, args.repeat)
+        bench(f"per-pattern ({count} tracked)", lambda ls: per_pattern_scan(ls, var_regex), lines, args.repeat)
+
+    # Raw buffers as the workers receive them: decode everything vs. bytes prefilter
+    data = make_noisy_log(args.lines, args.noise)
+    print(f"Raw buffer of {len(data) / 1e6:.1f} MB, {args.noise:.0%} uninteresting lines")
+    plain = LogParser(prefilter=False)
+    filtered = LogParser(prefilter=True)
+    decoded = bench("decode + parse_lines", lambda d: plain.parse_bytes(d[0]), [data], args.repeat, args.lines)
+    prefiltered = bench("prefilter + parse_bytes", lambda d: filtered.parse_bytes(d[0]), [data], args.repeat, args.lines)
+    print(f"prefilter speedup: {decoded / prefiltered:.1f}x")
+
+if __name__ == "__main__":
+    main()
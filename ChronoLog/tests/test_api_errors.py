@@ -29,10 +29,71 @@ class TestApiErrors(unittest.TestCase):
         finally:
             facade.get_summary = original_get_summary
 
+    def test_timeline_forwards_cursor(self):
+        original = facade.get_timeline_page
+        facade.get_timeline_page = MagicMock(return_value=[])
+        try:
+            response = self.app.get('/api/timeline?after_id=100&per_page=10&include_total=true')
+            self.assertEqual(response.status_code, 200)
+            facade.get_timeline_page.assert_called_once_with(
+                1, 10, None, before_id=None, after_id=100, keyset=False, include_total=True)
+        finally:
+            facade.get_timeline_page = original
+
+    def test_timeseries_rejects_bad_range(self):
+        response = self.app.get('/api/timeseries?metric=latency&from=yesterday')
+        self.assertEqual(response.status_code, 400)
+        response = self.app.get('/api/timeseries?metric=latency&mode=median')
+        self.assertEqual(response.status_code, 400)
+
+    def test_cached_responses_and_etag(self):
+        import api
+        originals = facade.get_messages, facade.get_ingest_watermark
+        facade.get_messages = MagicMock(return_value={"1": "A {num}"})
+        facade.get_ingest_watermark = MagicMock(return_value=(10, 1, 10))
+        api.response_cache.clear()
+        interval = api.response_cache.watermark_interval
+        api.response_cache.watermark_interval = 0
+        try:
+            first = self.app.get('/api/messages')
+            self.assertEqual(first.status_code, 200)
+            etag = first.headers["ETag"]
+            second = self.app.get('/api/messages')
+            self.assertEqual(second.data, first.data)
+            facade.get_messages.assert_called_once()
+            not_modified = self.app.get('/api/messages', headers={"If-None-Match": etag})
+            self.assertEqual(not_modified.status_code, 304)
+            # new data: the view runs again
+            facade.get_ingest_watermark.return_value = (11, 2, 11)
+            facade.get_messages.return_value = {"1": "A {num}", "2": "B"}
+            self.assertEqual(self.app.get('/api/messages', headers={"If-None-Match": etag}).status_code, 200)
+            self.assertEqual(facade.get_messages.call_count, 2)
+        finally:
+            facade.get_messages, facade.get_ingest_watermark = originals
+            api.response_cache.watermark_interval = interval
+            api.response_cache.clear()
+
     def test_404_handler(self):
         response = self.app.get('/api/nonexistent_endpoint')
         self.assertEqual(response.status_code, 404)
         self.assertEqual(json.loads(response.data), {"error": "Not found"})
 
+    def test_stream_rejects_clients_over_limit(self):
+        import api
+        limit = api.broadcaster.max_clients
+        api.broadcaster.max_clients = 0
+        try:
+            response = self.app.get('/api/stream')
+            self.assertEqual(response.status_code, 503)
+        finally:
+            api.broadcaster.max_clients = limit
+
+    def test_metrics_prometheus_text(self):
+        response = self.app.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith("text/plain; version=0.0.4"))
+        self.assertIn(b"# TYPE chronolog_lines_read_total counter", response.data)
+        self.assertIn(b"chronolog_stream_clients", response.data)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,85 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from src.benchmark import Benchmark, NullSink, generate_log, histogram_quantile, percentile
+from src.log_parser import LogParser
+
+
+class TestBenchmark(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "bench.log")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_generated_log_is_deterministic(self):
+        other = os.path.join(self.tmp.name, "other.log")
+        self.assertEqual(generate_log(self.path, lines=500, seed=3), generate_log(other, lines=500, seed=3))
+        with open(self.path, "rb") as a, open(other, "rb") as b:
+            self.assertEqual(a.read(), b.read())
+        generate_log(other, lines=500, seed=4)
+        with open(self.path, "rb") as a, open(other, "rb") as b:
+            self.assertNotEqual(a.read(), b.read())
+
+    def test_generator_honours_ratios_and_cardinality(self):
+        lines, size = generate_log(self.path, lines=5000, error_ratio=0.2, warning_ratio=0.1, templates=7,
+                                   variables=3)
+        self.assertEqual(lines, 5000)
+        self.assertEqual(size, os.path.getsize(self.path))
+        with open(self.path, "rb") as f:
+            _, timeline = LogParser().parse_bytes(f.read())
+        errors = [e for e in timeline if e["event"] == "error"]
+        self.assertAlmostEqual(len(errors) / lines, 0.2, delta=0.03)
+        # the level is part of the template, so count the ERROR lines only
+        self.assertEqual(len({e["template"] for e in errors}), 7)
+        self.assertTrue(all(len(e["values"]) == 3 for e in errors))
+
+        size_bytes = 20000
+        _, size = generate_log(self.path, size_bytes=size_bytes)
+        self.assertGreaterEqual(size, size_bytes)
+        self.assertLess(size, size_bytes + 200)
+
+    def test_percentiles(self):
+        self.assertEqual(percentile([5, 1, 4, 2, 3], 0.5), 3)
+        self.assertEqual(percentile(list(range(1, 101)), 0.99), 99)
+        self.assertIsNone(percentile([], 0.5))
+        hist = {"buckets": [0, 10, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0], "sum": 0.03, "count": 10}
+        self.assertAlmostEqual(histogram_quantile(hist, 0.5), 0.003)
+
+    def test_stages_without_database(self):
+        generate_log(self.path, lines=3000)
+        bench = Benchmark(self.path, chunk_bytes=16 * 1024, batch_rows=500)
+        results = bench.run(["reader", "parser", "writer", "sink"])
+        self.assertEqual(results["reader"]["lines"], 3000)
+        self.assertGreater(results["parser"]["rows"], 0)
+        self.assertEqual(results["writer"]["rows"], results["parser"]["rows"])
+        self.assertIn("skipped", results["sink"])
+        self.assertIsNotNone(results["parser"]["p99_ms"])
+
+    def test_e2e_keeps_to_its_own_directories_and_rows(self):
+        import metrics
+        from config import METRICS_DIR
+        from sqlite_backend import SQLiteBackend
+        generate_log(self.path, lines=2000)
+        db_path = os.path.join(self.tmp.name, "bench.db")
+        bench = Benchmark(self.path, sink="db", backend="sqlite", storage_options={"path": db_path},
+                          num_processes=1, num_writers=1)
+        with patch("metrics.clear", wraps=metrics.clear) as clear, patch("builtins.print"):
+            result = bench.run(["e2e"])["e2e"]
+        self.assertGreater(result["rows"], 0)
+        self.assertTrue(clear.called)
+        self.assertNotIn(METRICS_DIR, [call.args[0] for call in clear.call_args_list])
+        backend = SQLiteBackend(db_path)
+        self.assertEqual(backend.get_summary()["timeline_count"], 0)
+        backend.close()
+
+    def test_null_sink_assigns_stable_ids(self):
+        sink = NullSink()
+        first = sink.get_or_create_message_ids({"a", "b"})
+        self.assertEqual(sink.get_or_create_message_ids({"a"}), {"a": first["a"]})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+from src.checkpoint import CheckpointTracker
+from src.sqlite_backend import SQLiteBackend
+
+
+class TestCheckpointTracker(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.input = os.path.join(self.dir, "app.log")
+        with open(self.input, "w", encoding="utf-8") as f:
+            f.write("".join(f"line {i}\n" for i in range(100)))
+        self.size = os.path.getsize(self.input)
+        self.tracker = self._tracker()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def _tracker(self, store=None):
+        tracker = CheckpointTracker(self.input, directory=os.path.join(self.dir, "checkpoints"), store=store)
+        with patch("builtins.print"):
+            tracker.resume()
+        return tracker
+
+    def test_out_of_order_commits_advance_watermark(self):
+        key = self.tracker.key
+        self.tracker.commit(key, 20, 30)
+        self.tracker.commit(key, 40, 50)
+        self.assertEqual(self.tracker.offset, 0)
+        self.assertEqual(self.tracker.uncommitted(60), [(0, 20), (30, 40), (50, 60)])
+        self.tracker.commit(key, 0, 20)
+        self.assertEqual(self.tracker.offset, 30)
+        self.tracker.commit(key, 30, 40)
+        self.assertEqual(self.tracker.offset, 50)
+        self.assertEqual(self.tracker.committed, [])
+
+    def test_commits_for_other_file_are_ignored(self):
+        self.tracker.commit((0, 0, 0), 0, 10)
+        self.assertEqual(self.tracker.offset, 0)
+        self.assertFalse(self.tracker.dirty)
+
+    def test_resume_after_save(self):
+        key = self.tracker.key
+        self.tracker.commit(key, 0, 70)
+        self.tracker.commit(key, 140, 210)
+        self.assertTrue(self.tracker.save())
+        self.assertFalse(os.path.exists(str(self.tracker.path) + ".tmp"))
+
+        resumed = self._tracker()
+        self.assertEqual(resumed.offset, 70)
+        self.assertEqual(resumed.committed, [(140, 210)])
+        self.assertEqual(resumed.uncommitted(self.size), [(70, 140), (210, self.size)])
+
+    def test_resume_ignores_truncated_file(self):
+        self.tracker.commit(self.tracker.key, 0, self.size)
+        self.tracker.save()
+        with open(self.input, "r+", encoding="utf-8") as f:
+            f.truncate(10)
+        self.assertEqual(self._tracker().offset, 0)
+
+    def test_resume_ignores_rewritten_head(self):
+        self.tracker.commit(self.tracker.key, 0, 70)
+        self.tracker.save()
+        with open(self.input, "r+", encoding="utf-8") as f:
+            f.write("LINE")
+        self.assertEqual(self._tracker().offset, 0)
+
+    def test_resume_ignores_replaced_file(self):
+        self.tracker.commit(self.tracker.key, 0, 70)
+        self.tracker.save()
+        with open(self.input, "r", encoding="utf-8") as f:
+            content = f.read()
+        os.unlink(self.input)
+        other = os.path.join(self.dir, "keep-inode-busy")
+        with open(other, "w", encoding="utf-8") as f:
+            f.write("x")
+        with open(self.input, "w", encoding="utf-8") as f:
+            f.write(content)
+        with open(self.tracker.path, "r", encoding="utf-8") as f:
+            saved = json.load(f)
+        if saved["inode"] == os.stat(self.input).st_ino:
+            self.skipTest("filesystem reused the inode")
+        self.assertEqual(self._tracker().offset, 0)
+
+
+class TestRecordedCheckpoints(unittest.TestCase):
+    """Ranges the writers record in the store with their rows, between two checkpoint saves."""
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.input = os.path.join(self.dir, "app.log")
+        with open(self.input, "w", encoding="utf-8") as f:
+            f.write("".join(f"line {i}\n" for i in range(100)))
+        self.store = SQLiteBackend(os.path.join(self.dir, "chronolog.db"))
+        self.tracker = self._tracker()
+        self.row = {"time": "2025-01-01T10:00:00", "event": "error", "msg_id": None, "msg_values": None, "value": None}
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def _tracker(self):
+        tracker = CheckpointTracker(self.input, directory=os.path.join(self.dir, "checkpoints"), store=self.store)
+        with patch("builtins.print"):
+            tracker.resume()
+        return tracker
+
+    def _record(self, *ranges):
+        key = self.tracker.key
+        self.store.bulk_insert_timeline_events([self.row], checkpoints=[(key, s, e) for s, e in ranges])
+
+    def test_resume_adds_ranges_recorded_after_the_save(self):
+        self._record((0, 70))
+        self.tracker.commit(self.tracker.key, 0, 70)
+        self.tracker.save()
+        # the save prunes what the file covers
+        self.assertEqual(self.store.get_ingest_checkpoints(self.tracker.key), [])
+
+        # inserted, then the process died before the next save
+        self._record((70, 140), (210, 280))
+        resumed = self._tracker()
+        self.assertEqual(resumed.offset, 140)
+        self.assertEqual(resumed.committed, [(210, 280)])
+        resumed.save()
+        self.assertEqual(self.store.get_ingest_checkpoints(resumed.key), [(210, 280)])
+
+    def test_ignored_checkpoint_forgets_recorded_ranges(self):
+        self.tracker.commit(self.tracker.key, 0, 70)
+        self.tracker.save()
+        self._record((70, 140))
+        with open(self.input, "r+", encoding="utf-8") as f:
+            f.truncate(10)
+        resumed = self._tracker()
+        self.assertEqual((resumed.offset, resumed.committed), (0, []))
+        self.assertEqual(self.store.get_ingest_checkpoints(resumed.key), [])
+
+    def test_ranges_of_a_replaced_file_are_pruned_with_the_next_save(self):
+        old_key = self.tracker.key
+        self._record((0, 70))
+        # created while the old file still exists, so it gets another inode
+        with open(self.input + ".new", "w", encoding="utf-8") as f:
+            f.write("rotated\n")
+        os.replace(self.input + ".new", self.input)
+        new_key = self.tracker.current_key()
+        # live mode noticed the rotation
+        self.tracker.reset(new_key)
+        self.assertTrue(self.tracker.save())
+        self.assertEqual(self.store.get_ingest_checkpoints(old_key), [])
+        self.assertEqual(self.tracker.retired, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+from src.chunk_sizer import AdaptiveChunkSizer
+
+
+class TestAdaptiveChunkSizer(unittest.TestCase):
+    def setUp(self):
+        self.sizer = AdaptiveChunkSizer(target_seconds=0.5, initial_bytes=4000, min_bytes=1000,
+                                        max_bytes=100000, queue_capacity=100)
+
+    def test_initial_size_before_feedback(self):
+        self.assertEqual(self.sizer.chunk_bytes(), 4000)
+
+    def test_size_follows_parse_rate(self):
+        self.sizer.record_parse(20000, 1.0)
+        self.assertEqual(self.sizer.chunk_bytes(), 10000)
+        # the moving average moves 30% towards a new sample
+        self.sizer.record_parse(120000, 1.0)
+        self.assertEqual(self.sizer.chunk_bytes(), 25000)
+
+    def test_queue_depth_scales_size(self):
+        self.sizer.record_parse(20000, 1.0)
+        self.sizer.record_queue(10)
+        self.assertEqual(self.sizer.chunk_bytes(), 5000)
+        self.sizer.record_queue(50)
+        self.assertEqual(self.sizer.chunk_bytes(), 10000)
+        self.sizer.record_queue(90)
+        self.assertEqual(self.sizer.chunk_bytes(), 20000)
+
+    def test_size_is_clamped(self):
+        self.sizer.record_parse(1, 1.0)
+        self.assertEqual(self.sizer.chunk_bytes(), 1000)
+        self.sizer.rate = None
+        self.sizer.record_parse(10 ** 9, 1.0)
+        self.assertEqual(self.sizer.chunk_bytes(), 100000)
+
+    def test_ignores_unusable_samples(self):
+        self.sizer.record_parse(0, 1.0)
+        self.sizer.record_parse(1000, 0)
+        self.sizer.record_queue(None)
+        self.assertEqual(self.sizer.chunk_bytes(), 4000)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import threading
+import time
+import pyodbc
+from src.db import ConnectionPool, SQLConnection, DatabaseConnectionError, is_connection_error
+
+
+class TestConnectionPool(unittest.TestCase):
+    def setUp(self):
+        self.connect_patcher = patch('src.db.pyodbc.connect', side_effect=lambda *a, **k: MagicMock())
+        self.mock_connect = self.connect_patcher.start()
+
+    def tearDown(self):
+        self.connect_patcher.stop()
+
+    def test_connections_are_reused(self):
+        pool = ConnectionPool("conn", size=2)
+        conn = pool.acquire()
+        pool.release(conn)
+        self.assertIs(pool.acquire(), conn)
+        stats = pool.get_stats()
+        self.assertEqual(stats["checkouts"], 2)
+        self.assertEqual(stats["created"], 1)
+        self.assertEqual(stats["in_use"], 1)
+
+    def test_waits_for_free_connection(self):
+        pool = ConnectionPool("conn", size=1, timeout=5)
+        conn = pool.acquire()
+        threading.Timer(0.05, pool.release, args=(conn,)).start()
+        self.assertIs(pool.acquire(), conn)
+        self.assertEqual(pool.get_stats()["waits"], 1)
+        self.assertGreater(pool.get_stats()["wait_time"], 0)
+
+    def test_checkout_timeout(self):
+        pool = ConnectionPool("conn", size=1, timeout=0.05)
+        pool.acquire()
+        with self.assertRaises(DatabaseConnectionError):
+            pool.acquire()
+
+    def test_idle_connections_are_evicted(self):
+        pool = ConnectionPool("conn", size=2, idle_timeout=0.01)
+        conn = pool.acquire()
+        pool.release(conn)
+        time.sleep(0.02)
+        self.assertIsNot(pool.acquire(), conn)
+        conn.close.assert_called()
+        self.assertEqual(pool.get_stats()["evicted"], 1)
+
+    def test_unhealthy_connection_is_replaced(self):
+        pool = ConnectionPool("conn", size=1, health_check_interval=0)
+        conn = pool.acquire()
+        conn.cursor.return_value.execute.side_effect = pyodbc.Error("08S01", "link failure")
+        pool.release(conn)
+        time.sleep(0.01)
+        self.assertIsNot(pool.acquire(), conn)
+        self.assertEqual(pool.get_stats()["reconnects"], 1)
+
+    def test_discarded_connection_frees_slot(self):
+        pool = ConnectionPool("conn", size=1, timeout=0.05)
+        conn = pool.acquire()
+        pool.release(conn, discard=True)
+        self.assertIsNot(pool.acquire(), conn)
+        self.assertEqual(pool.get_stats()["discarded"], 1)
+
+
+class TestSQLConnectionRetry(unittest.TestCase):
+    def setUp(self):
+        self.env_patcher = patch.dict('os.environ', {"DB_CONNECTION_STRING": "DRIVER=x;SERVER=x"})
+        self.env_patcher.start()
+        self.connections = []
+
+        def connect(*args, **kwargs):
+            conn = MagicMock()
+            self.connections.append(conn)
+            return conn
+        self.connect_patcher = patch('src.db.pyodbc.connect', side_effect=connect)
+        self.connect_patcher.start()
+
+    def tearDown(self):
+        self.connect_patcher.stop()
+        self.env_patcher.stop()
+
+    def test_reconnects_once_on_broken_connection(self):
+        db = SQLConnection()
+        first = db.pool.acquire()
+        first.cursor.return_value.execute.side_effect = pyodbc.OperationalError("08S01", "link failure")
+        db.pool.release(first)
+
+        db.execute_query("SELECT 1")
+
+        self.assertEqual(len(self.connections), 2)
+        first.close.assert_called()
+        self.assertEqual(db.get_pool_stats()["reconnects"], 1)
+
+    def test_statement_errors_are_not_retried(self):
+        db = SQLConnection()
+        conn = db.pool.acquire()
+        conn.cursor.return_value.execute.side_effect = pyodbc.ProgrammingError("42S02", "invalid object")
+        db.pool.release(conn)
+
+        with self.assertRaises(pyodbc.ProgrammingError):
+            db.execute_non_query("DELETE FROM Missing")
+        self.assertEqual(len(self.connections), 1)
+        conn.commit.assert_not_called()
+
+    def test_timeouts_and_deadlocks_keep_the_connection(self):
+        db = SQLConnection()
+        conn = db.pool.acquire()
+        conn.cursor.return_value.execute.side_effect = pyodbc.OperationalError("HYT00", "query timeout expired")
+        db.pool.release(conn)
+
+        with self.assertRaises(pyodbc.OperationalError):
+            db.execute_query("SELECT 1")
+        self.assertEqual(len(self.connections), 1)
+        conn.close.assert_not_called()
+        self.assertEqual(db.get_pool_stats()["reconnects"], 0)
+
+    def test_is_connection_error_matches_sqlstates(self):
+        for sqlstate in ("08S01", "08001", "08003", "HYT01"):
+            self.assertTrue(is_connection_error(pyodbc.OperationalError(sqlstate, "x")), sqlstate)
+        for sqlstate in ("HYT00", "40001", "42S02"):
+            self.assertFalse(is_connection_error(pyodbc.OperationalError(sqlstate, "x")), sqlstate)
+        self.assertFalse(is_connection_error(pyodbc.InterfaceError()))
+
+    def test_execute_many_runs_follow_up_procedure_in_same_transaction(self):
+        db = SQLConnection()
+        db.execute_many("INSERT", [(1,), (2,)], then_sp=("sp_After", ("x",)))
+        conn = self.connections[0]
+        cursor = conn.cursor.return_value
+        cursor.executemany.assert_called_once_with("INSERT", [(1,), (2,)])
+        cursor.execute.assert_called_once_with("{CALL sp_After (?)}", ("x",))
+        conn.commit.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,38 @@
+import math
+import unittest
+from datetime import datetime, timedelta
+from src.downsample import lttb
+
+
+class TestLttb(unittest.TestCase):
+    def test_returns_threshold_points_keeping_ends(self):
+        points = [(x, math.sin(x / 10)) for x in range(1000)]
+        sampled = lttb(points, 50)
+        self.assertEqual(len(sampled), 50)
+        self.assertEqual(sampled[0], points[0])
+        self.assertEqual(sampled[-1], points[-1])
+        # x stays sorted and every point comes from the input
+        self.assertEqual(sampled, sorted(sampled))
+        self.assertTrue(set(sampled) <= set(points))
+
+    def test_keeps_spike(self):
+        points = [(x, 1.0) for x in range(500)]
+        points[321] = (321, 100.0)
+        self.assertIn((321, 100.0), lttb(points, 20))
+
+    def test_small_inputs_are_returned_unchanged(self):
+        points = [(0, 1), (1, 2), (2, 3)]
+        self.assertEqual(lttb(points, 10), points)
+        self.assertEqual(lttb(points, 0), points)
+        self.assertEqual(lttb(points, 2), [(0, 1), (2, 3)])
+
+    def test_key_selects_coordinates(self):
+        base = datetime(2025, 1, 1)
+        points = [{"time": base + timedelta(minutes=i), "value": float(i % 7)} for i in range(100)]
+        sampled = lttb(points, 10, key=lambda p: (p["time"].timestamp(), p["value"]))
+        self.assertEqual(len(sampled), 10)
+        self.assertIs(sampled[0], points[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+import json
+import socket
+import time
+import unittest
+from src.event_stream import EventBroadcaster, FlushNotifier, Subscription, format_sse
+
+
+class FakeFacade:
+    """Serves events with ids above the cursor, newest first, like sp_GetTimelineSeek."""
+    def __init__(self):
+        self.events = []
+        self.reads = 0
+
+    def add(self, event_type, committed=True):
+        self.events.append({"id": len(self.events) + 1, "event": event_type, "time": "t", "total_count": None,
+                            "committed": committed})
+
+    def commit(self, event_id):
+        self.events[event_id - 1]["committed"] = True
+
+    def get_ingest_watermark(self):
+        return (len(self.events), 0, len(self.events))
+
+    def get_timeline_page(self, per_page, after_id):
+        self.reads += 1
+        newer = [e for e in self.events if e["id"] > after_id and e["committed"]][:per_page]
+        return list(reversed(newer))
+
+    def get_summary(self):
+        return {"timeline_count": len(self.events)}
+
+
+def drain(sub):
+    messages = []
+    while True:
+        message = sub.next(0)
+        if message is None:
+            return messages
+        messages.append(message)
+
+
+class TestEventStream(unittest.TestCase):
+    def test_format_sse(self):
+        self.assertEqual(format_sse("event", {"a": 1}, 7), 'id: 7\nevent: event\ndata: {"a": 1}\n\n')
+
+    def test_one_read_serves_all_subscribers(self):
+        facade = FakeFacade()
+        facade.add("info")
+        broadcaster = EventBroadcaster(facade, addr="", batch_rows=2)
+        broadcaster.cursor = 1
+        everything = Subscription()
+        errors = Subscription(["error"])
+        broadcaster._subscribers = [everything, errors]
+        for event_type in ("error", "info", "error"):
+            facade.add(event_type)
+
+        self.assertEqual(broadcaster.publish(), 3)
+        # two full pages of 2 and 1 row, whatever the number of subscribers
+        self.assertEqual(facade.reads, 2)
+        self.assertEqual(broadcaster.cursor, 4)
+        ids = [m.split("\n")[0] for m in drain(everything)]
+        self.assertEqual(ids, ["id: 2", "id: 3", "id: 4", "event: summary"])
+        self.assertEqual([m.split("\n")[0] for m in drain(errors)], ["id: 2", "id: 4", "event: summary"])
+
+        self.assertEqual(broadcaster.publish(), 0)
+        self.assertEqual(drain(everything), [])
+
+    def test_rows_committed_out_of_order_are_delivered(self):
+        facade = FakeFacade()
+        broadcaster = EventBroadcaster(facade, addr="", gap_timeout=60)
+        broadcaster.cursor = 0
+        sub = Subscription()
+        broadcaster._subscribers = [sub]
+        facade.add("info", committed=False)  # id 1: a writer still inserting
+        facade.add("info")
+        facade.add("info", committed=False)  # id 3: rolled back, never visible
+
+        self.assertEqual(broadcaster.publish(), 1)
+        self.assertEqual(broadcaster.cursor, 2)
+        self.assertEqual([gap[:2] for gap in broadcaster.gaps], [[1, 1]])
+        facade.commit(1)
+        facade.add("error")
+        self.assertEqual(broadcaster.publish(), 2)
+        self.assertEqual(broadcaster.stats["late"], 1)
+        ids = [m.split("\n")[0] for m in drain(sub) if m.startswith("id:")]
+        self.assertEqual(ids, ["id: 2", "id: 1", "id: 4"])
+        self.assertEqual([gap[:2] for gap in broadcaster.gaps], [[3, 3]])
+
+        broadcaster.gaps[0][2] = time.monotonic() - 1
+        self.assertEqual(broadcaster.publish(), 0)
+        self.assertEqual(broadcaster.gaps, [])
+
+    def test_gaps_are_ranges_and_large_jumps_are_ignored(self):
+        facade = FakeFacade()
+        broadcaster = EventBroadcaster(facade, addr="", max_gap=100)
+        broadcaster.cursor = 0
+        broadcaster._subscribers = [Subscription(max_queue=10000)]
+        for _ in range(50):
+            facade.add("info", committed=False)  # a pending batch
+        facade.add("info")
+        for _ in range(1000):
+            facade.add("info", committed=False)  # an IDENTITY jump
+        facade.add("info")
+
+        self.assertEqual(broadcaster.publish(), 2)
+        self.assertEqual(broadcaster.cursor, 1052)
+        self.assertEqual([gap[:2] for gap in broadcaster.gaps], [[1, 50]])
+
+        for event_id in range(1, 21):
+            facade.commit(event_id)
+        facade.commit(30)
+        self.assertEqual(broadcaster.publish(), 21)
+        self.assertEqual([gap[:2] for gap in broadcaster.gaps], [[21, 29], [31, 50]])
+        self.assertEqual(broadcaster.publish(), 0)
+
+    def test_lagging_subscriber_is_dropped(self):
+        facade = FakeFacade()
+        broadcaster = EventBroadcaster(facade, addr="")
+        broadcaster.cursor = 0
+        slow = Subscription(max_queue=2)
+        broadcaster._subscribers = [slow]
+        for _ in range(5):
+            facade.add("info")
+        broadcaster.publish()
+        self.assertTrue(slow.lagged)
+        self.assertEqual(broadcaster.subscriber_count(), 0)
+
+    def test_flush_notification_wakes_broadcaster(self):
+        probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        probe.bind(("127.0.0.1", 0))
+        addr = "127.0.0.1:%d" % probe.getsockname()[1]
+        probe.close()
+
+        facade = FakeFacade()
+        broadcaster = EventBroadcaster(facade, addr=addr, poll_interval=30, min_interval=0.01)
+        sub = broadcaster.subscribe()
+        try:
+            deadline = time.monotonic() + 5
+            while (broadcaster._sock is None or broadcaster.cursor is None) and time.monotonic() < deadline:
+                time.sleep(0.01)
+            facade.add("error")
+            FlushNotifier(addr).notify([{"event": "error"}])
+            message = sub.next(5)
+            self.assertIsNotNone(message)
+            self.assertEqual(json.loads(message.split("data: ")[1])["id"], 1)
+        finally:
+            broadcaster.unsubscribe(sub)
+
+
+if __name__ == '__main__':
+    unittest.main()
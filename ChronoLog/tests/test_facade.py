@@ -0,0 +1,223 @@
+import unittest
+from unittest.mock import patch
+from decimal import Decimal
+from datetime import datetime, timedelta
+import json
+import pyodbc
+from src.facade import ChronoLogFacade, INSERT_TIMELINE_EVENT_SQL, RowsRejectedError, minute_rollups
+
+
+class TestFacadeBulkInsert(unittest.TestCase):
+    def setUp(self):
+        self.db_patcher = patch('src.facade.SQLConnection')
+        self.MockConnection = self.db_patcher.start()
+        self.db = self.MockConnection.return_value
+        self.events = [
+            {"time": "2023-10-27T10:00:00", "event": "latency", "msg_id": None, "msg_values": None, "value": 12.5},
+            {"time": "2023-10-27T10:00:01", "event": "error", "msg_id": 3, "msg_values": '["42"]', "value": None},
+        ]
+
+    def tearDown(self):
+        self.db_patcher.stop()
+
+    def test_unknown_strategy_rejected(self):
+        with self.assertRaises(ValueError):
+            ChronoLogFacade(bulk_insert_strategy="bcp")
+
+    def test_json_strategy_uses_openjson_procedure(self):
+        facade = ChronoLogFacade(bulk_insert_strategy="json")
+        facade.bulk_insert_timeline_events(self.events)
+        sp_name, params = self.db.execute_sp.call_args[0]
+        self.assertEqual(sp_name, "sp_BulkInsertTimelineEvents")
+        self.assertEqual(json.loads(params[0]), self.events)
+
+    def test_executemany_strategy_sends_typed_rows(self):
+        facade = ChronoLogFacade(bulk_insert_strategy="executemany")
+        facade.bulk_insert_timeline_events(self.events)
+        query, rows = self.db.execute_many.call_args[0]
+        self.assertEqual(query, INSERT_TIMELINE_EVENT_SQL)
+        self.assertEqual(rows[0], (datetime(2023, 10, 27, 10, 0, 0), "latency", None, None, Decimal("12.50")))
+        self.assertEqual(rows[1], (datetime(2023, 10, 27, 10, 0, 1), "error", 3, '["42"]', None))
+        self.db.execute_sp.assert_not_called()
+
+    def test_tvp_strategy_passes_rows_as_one_parameter(self):
+        facade = ChronoLogFacade(bulk_insert_strategy="tvp")
+        facade.bulk_insert_timeline_events(self.events)
+        sp_name, params = self.db.execute_sp.call_args[0]
+        self.assertEqual(sp_name, "sp_BulkInsertTimelineEventsTvp")
+        self.assertEqual(len(params[0]), 2)
+
+    def test_falls_back_to_json_when_unsupported(self):
+        facade = ChronoLogFacade(bulk_insert_strategy="tvp")
+        self.db.execute_sp.side_effect = [pyodbc.ProgrammingError(
+            "42000", "[42000] [SQL Server]Could not find stored procedure 'sp_BulkInsertTimelineEventsTvp'. (2812) (SQLExecDirectW)"
+        ), None]
+        with patch('builtins.print'):
+            facade.bulk_insert_timeline_events(self.events)
+        self.assertEqual(self.db.execute_sp.call_args[0][0], "sp_BulkInsertTimelineEvents")
+        # later calls go straight to the fallback
+        self.assertEqual(facade.bulk_insert_strategy, "json")
+
+    def test_statement_errors_do_not_switch_strategy(self):
+        facade = ChronoLogFacade(bulk_insert_strategy="tvp")
+        for error in (
+            pyodbc.ProgrammingError("42000", "[42000] [SQL Server]The EXECUTE permission was denied. (229) (SQLExecDirectW)"),
+            pyodbc.ProgrammingError("42S22", "[42S22] [SQL Server]Invalid column name 'Value'. (207) (SQLExecDirectW)"),
+            pyodbc.DataError("22003", "[22003] [SQL Server]Arithmetic overflow error. (8115) (SQLExecDirectW)"),
+        ):
+            self.db.execute_sp.reset_mock()
+            self.db.execute_sp.side_effect = error
+            with self.assertRaises(RowsRejectedError if isinstance(error, pyodbc.DataError) else type(error)):
+                facade.bulk_insert_timeline_events(self.events)
+            self.assertEqual(self.db.execute_sp.call_count, 1)
+            self.assertEqual(facade.bulk_insert_strategy, "tvp")
+
+        facade = ChronoLogFacade(bulk_insert_strategy="executemany")
+        self.db.execute_many.side_effect = pyodbc.NotSupportedError("HYC00", "optional feature not implemented")
+        self.db.execute_sp.side_effect = None
+        with patch('builtins.print'):
+            facade.bulk_insert_timeline_events(self.events)
+        self.assertEqual(facade.bulk_insert_strategy, "json")
+
+    def test_rollups_travel_with_the_insert(self):
+        facade = ChronoLogFacade(bulk_insert_strategy="json")
+        facade.bulk_insert_timeline_events(self.events)
+        _, params = self.db.execute_sp.call_args[0]
+        self.assertEqual(json.loads(params[1]), minute_rollups(self.events))
+
+        facade = ChronoLogFacade(bulk_insert_strategy="executemany")
+        facade.bulk_insert_timeline_events(self.events)
+        [(sp_name, sp_params)] = self.db.execute_many.call_args[1]["then_sp"]
+        self.assertEqual(sp_name, "sp_MergeEventRollups")
+        self.assertEqual(json.loads(sp_params[0]), minute_rollups(self.events))
+
+    def test_checkpoints_travel_with_the_insert(self):
+        spans = [((2049, 131, 0), 0, 4096), ((2049, 131, 0), 4096, 8192)]
+        recorded = [
+            {"file": "2049:131", "generation": 0, "start": 0, "end": 4096},
+            {"file": "2049:131", "generation": 0, "start": 4096, "end": 8192},
+        ]
+        for strategy in ("json", "tvp"):
+            facade = ChronoLogFacade(bulk_insert_strategy=strategy, rollups=False)
+            facade.bulk_insert_timeline_events(self.events, checkpoints=spans)
+            _, params = self.db.execute_sp.call_args[0]
+            # the rollups parameter is passed as NULL
+            self.assertEqual((len(params), params[1]), (3, None))
+            self.assertEqual(json.loads(params[2]), recorded)
+
+        facade = ChronoLogFacade(bulk_insert_strategy="executemany")
+        facade.bulk_insert_timeline_events(self.events, checkpoints=spans)
+        calls = self.db.execute_many.call_args[1]["then_sp"]
+        self.assertEqual([name for name, _ in calls], ["sp_MergeEventRollups", "sp_RecordIngestCheckpoints"])
+        self.assertEqual(json.loads(calls[1][1][0]), recorded)
+
+    def test_rollups_can_be_disabled(self):
+        facade = ChronoLogFacade(bulk_insert_strategy="tvp", rollups=False)
+        facade.bulk_insert_timeline_events(self.events)
+        _, params = self.db.execute_sp.call_args[0]
+        self.assertEqual(len(params), 1)
+
+
+class TestMinuteRollups(unittest.TestCase):
+    def test_aggregates_per_minute_and_type(self):
+        events = [
+            {"time": "2025-01-01T10:00:05", "event": "latency", "value": 10},
+            {"time": "2025-01-01T10:00:59", "event": "latency", "value": 2.25},
+            {"time": "2025-01-01T10:00:30", "event": "latency", "value": None},
+            {"time": "2025-01-01T10:01:00", "event": "latency", "value": 7},
+            {"time": datetime(2025, 1, 1, 10, 0, 1), "event": "error"},
+            {"time": None, "event": "error"},
+        ]
+        rollups = minute_rollups(events)
+        self.assertEqual(rollups, [
+            {"bucket": "2025-01-01T10:00:00", "event": "error", "count": 1, "value_count": 0,
+             "value_sum": None, "value_min": None, "value_max": None},
+            {"bucket": "2025-01-01T10:00:00", "event": "latency", "count": 3, "value_count": 2,
+             "value_sum": "12.25", "value_min": "2.25", "value_max": "10.00"},
+            {"bucket": "2025-01-01T10:01:00", "event": "latency", "count": 1, "value_count": 1,
+             "value_sum": "7.00", "value_min": "7.00", "value_max": "7.00"},
+        ])
+
+
+class TestFacadeMessages(unittest.TestCase):
+    def setUp(self):
+        self.db_patcher = patch('src.facade.SQLConnection')
+        self.db = self.db_patcher.start().return_value
+        self.facade = ChronoLogFacade()
+
+    def tearDown(self):
+        self.db_patcher.stop()
+
+    def test_get_or_create_message_ids_single_call(self):
+        row = type("Row", (), {"Template": "A {num}", "MessageId": 7})
+        self.db.execute_sp.return_value = [row]
+        result = self.facade.get_or_create_message_ids({"A {num}"})
+        self.assertEqual(result, {"A {num}": 7})
+        sp_name, params = self.db.execute_sp.call_args[0]
+        self.assertEqual(sp_name, "sp_GetOrInsertMessages")
+        self.assertEqual(json.loads(params[0]), ["A {num}"])
+
+    def test_get_or_create_message_ids_empty(self):
+        self.assertEqual(self.facade.get_or_create_message_ids([]), {})
+        self.db.execute_sp.assert_not_called()
+
+
+class TestFacadeTimeline(unittest.TestCase):
+    def setUp(self):
+        self.db_patcher = patch('src.facade.SQLConnection')
+        self.db = self.db_patcher.start().return_value
+        self.facade = ChronoLogFacade()
+        row = type("Row", (), {"EventId": 41, "time": datetime(2025, 1, 1), "event": "error", "msg_id": 2,
+                               "msg_values": '["5"]', "value": None, "template": "E {num}", "TotalCount": None})
+        self.db.execute_sp.return_value = [row]
+
+    def tearDown(self):
+        self.db_patcher.stop()
+
+    def test_page_number_uses_offset_procedure(self):
+        self.facade.get_timeline_page(3, 30, "error")
+        self.db.execute_sp.assert_called_once_with("sp_GetTimelinePage", (3, 30, "error"))
+
+    def test_cursor_uses_seek_procedure(self):
+        result = self.facade.get_timeline_page(per_page=20, before_id=42)
+        self.db.execute_sp.assert_called_once_with("sp_GetTimelineSeek", (42, None, 20, None, 0))
+        self.assertEqual(result[0]["id"], 41)
+        self.assertEqual(result[0]["msg_values"], ["5"])
+        self.assertIsNone(result[0]["total_count"])
+
+    def test_timeseries_range_uses_buckets(self):
+        row = type("Row", (), {"time": datetime(2025, 1, 1), "value": Decimal("2.50"), "min": Decimal("1.00"),
+                               "max": Decimal("4.00"), "count": 3})
+        self.db.execute_sp.return_value = [row]
+        start = datetime(2025, 1, 1)
+        result = self.facade.get_timeseries("latency", start=start, points=100)
+        self.db.execute_sp.assert_called_once_with("sp_GetTimeseriesBuckets", ("latency", start, None, 100))
+        self.assertEqual(result, [{"time": start, "value": 2.5, "min": 1.0, "max": 4.0, "count": 3}])
+
+    def test_timeseries_lttb_reduces_finer_buckets(self):
+        rows = [type("Row", (), {"time": datetime(2025, 1, 1) + timedelta(minutes=i), "value": Decimal(i % 5),
+                                 "min": Decimal(0), "max": Decimal(4), "count": 1})
+                for i in range(80)]
+        self.db.execute_sp.return_value = rows
+        result = self.facade.get_timeseries("latency", points=10, mode="lttb")
+        self.assertEqual(self.db.execute_sp.call_args[0][1][3], 80)
+        self.assertEqual(len(result), 10)
+        with self.assertRaises(ValueError):
+            self.facade.get_timeseries("latency", points=10, mode="median")
+
+    def test_keyset_first_page_with_total(self):
+        self.facade.get_timeline_page(page=7, keyset=True, include_total=True, event_type="warning")
+        self.db.execute_sp.assert_called_once_with("sp_GetTimelineSeek", (None, None, 30, "warning", 1))
+
+    def test_purge_expired_returns_truncated_partitions(self):
+        row = type("Row", (), {"start": datetime(2025, 1, 1), "end": datetime(2025, 1, 2), "rows": 1200})
+        self.db.execute_sp.return_value = [row]
+        purged = self.facade.purge_expired(30)
+        self.db.execute_sp.assert_called_once_with("sp_MaintainTimelinePartitions", (30,))
+        self.assertEqual(purged, [{"start": datetime(2025, 1, 1), "end": datetime(2025, 1, 2), "rows": 1200}])
+        self.db.execute_sp.return_value = []
+        self.assertEqual(self.facade.purge_expired(0), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
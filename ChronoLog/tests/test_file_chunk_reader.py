@@ -1,6 +1,7 @@
 ﻿import unittest
 import tempfile
-from src.file_chunk_reader import FileChunkReader
+import unittest.mock
+from src.file_chunk_reader import FileChunkReader, iter_byte_ranges, map_byte_range
 
 class TestFileChunkReader(unittest.TestCase):
     def setUp(self):
@@ -32,6 +33,97 @@ class TestFileChunkReader(unittest.TestCase):
         self.assertEqual(chunk1[0].strip(), "line 1")
         self.assertEqual(chunk3[0].strip(), "line 5")
 
+    def test_byte_ranges_are_newline_aligned(self):
+        ranges = list(iter_byte_ranges(self.tmp.name, range_size=10))
+        # ranges cover the whole file without gaps
+        self.assertEqual(ranges[0][0], 0)
+        for (_, end), (start, _) in zip(ranges, ranges[1:]):
+            self.assertEqual(end, start)
+        with open(self.tmp.name, "rb") as f:
+            data = f.read()
+        self.assertEqual(ranges[-1][1], len(data))
+        # every range ends right after a newline
+        for _, end in ranges:
+            self.assertEqual(data[end - 1:end], b"\n")
+
+    def test_map_byte_range_returns_all_lines(self):
+        data = b"".join(map_byte_range(self.tmp.name, start, end)
+                        for start, end in iter_byte_ranges(self.tmp.name, range_size=7))
+        self.assertEqual(data.decode("utf-8"), "".join(self.lines))
+
+    def test_sizer_limits_chunks_by_bytes(self):
+        sizer = unittest.mock.Mock()
+        sizer.chunk_bytes.return_value = 14  # two 7-byte lines
+        reader = FileChunkReader(self.tmp.name, chunk_size=1, live=False, sizer=sizer)
+        chunks = list(reader)
+        self.assertEqual([len(c) for c in chunks], [2, 2, 1])
+
+    def test_raw_chunks_are_bytes_buffers(self):
+        reader = FileChunkReader(self.tmp.name, chunk_size=2, live=False, raw=True)
+        self.assertEqual(list(reader), [b"line 1\nline 2\n", b"line 3\nline 4\n", b"line 5\n"])
+
+    def test_iter_byte_ranges_asks_callable_for_every_range(self):
+        sizes = iter([7, 14, 100])
+        ranges = list(iter_byte_ranges(self.tmp.name, lambda: next(sizes)))
+        self.assertEqual(ranges, [(0, 7), (7, 21), (21, 35)])
+
+    def _live_reader(self, path):
+        return FileChunkReader(path, chunk_size=100, poll_interval=0.01, live=True, watcher_mode="poll")
+
+    def test_live_holds_back_partial_line(self):
+        with open(self.tmp.name, "a", encoding="utf-8") as f:
+            f.write("half")
+        it = iter(self._live_reader(self.tmp.name))
+        self.assertEqual(next(it), self.lines)
+        with open(self.tmp.name, "a", encoding="utf-8") as f:
+            f.write(" done\n")
+        self.assertEqual(next(it), ["half done\n"])
+        it.close()
+
+    def test_live_follows_rotation_by_inode(self):
+        import os
+        it = iter(self._live_reader(self.tmp.name))
+        self.assertEqual(next(it), self.lines)
+        rotated = self.tmp.name + ".1"
+        os.rename(self.tmp.name, rotated)
+        with open(rotated, "a", encoding="utf-8") as f:
+            f.write("late line\n")
+        with open(self.tmp.name, "w", encoding="utf-8") as f:
+            f.write("new file\n")
+        try:
+            self.assertEqual(next(it), ["late line\n"])
+            self.assertEqual(next(it), ["new file\n"])
+        finally:
+            it.close()
+            os.unlink(rotated)
+
+    def test_resume_skips_processed_ranges(self):
+        import os
+        size = os.path.getsize(self.tmp.name)
+        line = len(self.lines[0])
+        # line 1 was processed before the restart and so was line 3
+        reader = FileChunkReader(self.tmp.name, chunk_size=100, live=False,
+                                 start_offset=line, skip_ranges=[(2 * line, 3 * line)])
+        chunks, spans = [], []
+        for chunk in reader:
+            chunks.append(chunk)
+            spans.append(reader.span)
+        self.assertEqual(chunks, [self.lines[1:2], self.lines[3:]])
+        self.assertEqual(spans, [(line, 2 * line), (3 * line, size)])
+
+    def test_live_rereads_after_truncation(self):
+        reader = self._live_reader(self.tmp.name)
+        it = iter(reader)
+        self.assertEqual(next(it), self.lines)
+        key_before = reader.file_key
+        with open(self.tmp.name, "w", encoding="utf-8") as f:
+            f.write("restart\n")
+        self.assertEqual(next(it), ["restart\n"])
+        # offsets of the rewritten file must not be confused with the old content
+        self.assertNotEqual(reader.file_key, key_before)
+        self.assertEqual(reader.span, (0, len("restart\n")))
+        it.close()
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
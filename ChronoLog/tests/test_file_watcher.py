@@ -0,0 +1,60 @@
+import os
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+from src.file_watcher import FileWatcher
+
+
+class TestFileWatcher(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "app.log")
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write("first\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_unknown_mode_rejected(self):
+        with self.assertRaises(ValueError):
+            FileWatcher(self.path, mode="fanotify")
+
+    def test_poll_mode_sleeps_for_timeout(self):
+        with FileWatcher(self.path, poll_interval=0.05, mode="poll") as watcher:
+            self.assertEqual(watcher.mode, "poll")
+            start = time.monotonic()
+            self.assertFalse(watcher.wait())
+            self.assertGreaterEqual(time.monotonic() - start, 0.04)
+
+    def test_inotify_wakes_on_append(self):
+        watcher = FileWatcher(self.path, poll_interval=5.0, mode="auto")
+        if watcher.mode != "inotify":
+            watcher.close()
+            self.skipTest("inotify not available")
+        with watcher:
+            def append():
+                time.sleep(0.05)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write("second\n")
+            t = threading.Thread(target=append)
+            t.start()
+            start = time.monotonic()
+            self.assertTrue(watcher.wait())
+            self.assertLess(time.monotonic() - start, 2.0)
+            t.join()
+
+    def test_inotify_ignores_other_files(self):
+        watcher = FileWatcher(self.path, poll_interval=0.2, mode="auto")
+        if watcher.mode != "inotify":
+            watcher.close()
+            self.skipTest("inotify not available")
+        with watcher:
+            with open(os.path.join(self.dir, "other.log"), "w", encoding="utf-8") as f:
+                f.write("noise\n")
+            self.assertFalse(watcher.wait())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import bz2
+import gzip
+import shutil
+import tempfile
+import unittest
+from src.input_sources import resolve_inputs, open_input, is_compressed
+
+
+class TestInputSources(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.dir, "2025-01"))
+        self.files = {
+            "app.log": 300,
+            "app.log.1.gz": 200,
+            os.path.join("2025-01", "app.log.2.bz2"): 100,
+        }
+        for name, mtime in self.files.items():
+            path = os.path.join(self.dir, name)
+            opener = {".gz": gzip.open, ".bz2": bz2.open}.get(os.path.splitext(name)[1], open)
+            with opener(path, "wb") as f:
+                f.write(f"{name}\n".encode())
+            os.utime(path, (mtime, mtime))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def _names(self, paths):
+        return [os.path.relpath(p, self.dir) for p in paths]
+
+    def test_directory_is_ordered_by_mtime(self):
+        self.assertEqual(
+            self._names(resolve_inputs(self.dir)),
+            [os.path.join("2025-01", "app.log.2.bz2"), "app.log.1.gz", "app.log"]
+        )
+
+    def test_glob_and_path_list(self):
+        pattern = os.path.join(self.dir, "**", "*.bz2")
+        plain = os.path.join(self.dir, "app.log")
+        self.assertEqual(
+            self._names(resolve_inputs(os.pathsep.join([plain, pattern]))),
+            [os.path.join("2025-01", "app.log.2.bz2"), "app.log"]
+        )
+
+    def test_missing_input_resolves_to_nothing(self):
+        self.assertEqual(resolve_inputs(os.path.join(self.dir, "nope.log")), [])
+
+    def test_open_input_decompresses(self):
+        for name in self.files:
+            with self.subTest(name=name):
+                with open_input(os.path.join(self.dir, name)) as f:
+                    self.assertEqual(f.readline(), f"{name}\n".encode())
+        self.assertTrue(is_compressed("x.log.gz"))
+        self.assertTrue(is_compressed("x.log.ZST"))
+        self.assertFalse(is_compressed("x.log"))
+
+    def test_zstd_needs_optional_package(self):
+        try:
+            import zstandard  # noqa: F401
+            self.skipTest("zstandard is installed")
+        except ImportError:
+            pass
+        path = os.path.join(self.dir, "app.log.zst")
+        with open(path, "wb") as f:
+            f.write(b"")
+        with self.assertRaises(RuntimeError):
+            open_input(path)
+
+
+if __name__ == "__main__":
+    unittest.main()
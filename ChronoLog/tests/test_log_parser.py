@@ -15,6 +15,29 @@ class TestLogParser(unittest.TestCase):
         self.assertIsNotNone(ts)
         self.assertTrue(ts.startswith("2025-11-23T12:34:56"))
 
+    def test_extract_timestamp_fast_path_matches_fallback(self):
+        lines = [
+            "2025-11-23 12:34:56 INFO ok",
+            "2025-11-23T12:34:56 INFO iso",
+            "2025-11-23 12:34:56",
+            "2025-11-23T12:34:56",
+            "2025-11-23T12:34:56\tINFO tab",
+            "2025-11-23 12:34:56.789 INFO fractional",
+            "2025-11-23T12:34:56+02:00 INFO offset",
+            "2025-02-30 12:00:00 INFO invalid day",
+            "2025-1x-23 12:00:00 INFO garbage",
+            "no timestamp here",
+        ]
+        for line in lines:
+            with self.subTest(line=line):
+                self.assertEqual(self.parser.extract_timestamp(line), self.parser._parse_timestamp_fallback(line))
+
+    def test_extract_timestamp_memoizes_last_second(self):
+        first = self.parser.extract_timestamp("2025-11-23 12:34:56 ERROR a")
+        self.assertEqual(first, "2025-11-23T12:34:56")
+        self.assertIs(self.parser.extract_timestamp("2025-11-23 12:34:56 WARNING b"), first)
+        self.assertEqual(self.parser.extract_timestamp("2025-11-23 12:34:57 INFO c"), "2025-11-23T12:34:57")
+
     def test_parse_lines_errors_and_warnings(self):
         lines = [
             "2025-11-23 12:00:00 ERROR Database connection failed",
@@ -31,6 +54,14 @@ class TestLogParser(unittest.TestCase):
         self.assertIn("error", event_names)
         self.assertIn("warning", event_names)
 
+    def test_parse_lines_extracts_templates(self):
+        lines = ["2025-11-23 12:00:00 ERROR Timeout after 30 seconds on port 8080"]
+        events, timeline = self.parser.parse_lines(lines)
+        entry = timeline[0]
+        self.assertEqual(entry["template"], "ERROR Timeout after {num} seconds on port {num}")
+        self.assertEqual(entry["values"], ["30", "8080"])
+        self.assertNotIn("msg", entry)
+
     def test_parse_variables_with_keyval(self):
         lines = ["2025-11-23 12:10:00 INFO processed=7 size=123"]
         events, timeline = self.parser.parse_lines(lines)
@@ -52,6 +83,62 @@ class TestLogParser(unittest.TestCase):
         vals = [t["value"] for t in timeline if t.get("event") == "latency"]
         self.assertCountEqual(vals, [250, 120])
 
+    def test_scan_line_matches_per_pattern_search(self):
+        import re
+        key_val_re = re.compile(r"\b([a-zA-Z_][a-zA-Z0-9_]*)=(\d+)\b")
+
+        def reference(line, var_regex):
+            levels = [lv for lv in (("ERROR", "error"), ("WARNING", "warning")) if lv[0] in line]
+            if var_regex:
+                found = [(var, int(m.group(1))) for var, rx in var_regex.items() for m in [rx.search(line)] if m]
+            else:
+                found = [(m.group(1), int(m.group(2))) for m in key_val_re.finditer(line)
+                         if m.group(1).upper() not in ("ERROR", "WARNING")]
+            return levels, found
+
+        tracked = {v: re.compile(rf"\b{re.escape(v)}=(\d+)\b") for v in ("size", "latency", "lat", "ERROR")}
+        tracked["cpu.load"] = re.compile(r"\bcpu\.load=(\d+)\b")
+        tracked["retries"] = re.compile(r"retries=(\d+)")
+        lines = [
+            "2025-11-23 12:00:00 INFO latency=5 size=10 latency=7",
+            "2025-11-23 12:00:00 ERROR=3 error=4 WARNING x=1",
+            "xERRORy=2 myWARNINGS lat=1 latency=2 xlatency=9",
+            "a.size=5 size=6x size=7 cpu.load=80 maxretries=3",
+            "ERRORWARNING=1 WARNINGERROR",
+            "no levels or pairs here",
+            "size=12 lat=3 latency=4",
+        ]
+        for var_regex in (None, tracked):
+            parser = LogParser(var_regex=var_regex)
+            for line in lines:
+                with self.subTest(line=line, tracked=bool(var_regex)):
+                    self.assertEqual(parser.scan_line(line), reference(line, var_regex))
+
+    def test_parse_bytes_matches_parse_lines(self):
+        import re
+        data = (
+            "2025-11-23 12:00:00 INFO started\n"
+            "2025-11-23 12:00:01 ERROR disk full on /var\n"
+            "2025-11-23 12:00:02 DEBUG latency=12 size=4\n"
+            "2025-11-23 12:00:03 INFO caf\u00e9 count=\u0663\n"
+            "2025-11-23 12:00:04 INFO nothing to see\n"
+            "2025-11-23 12:00:05 WARNING retry"
+        ).encode("utf-8") + b" \xff\n"
+        tracked = {v: re.compile(rf"\b{re.escape(v)}=(\d+)\b") for v in ("latency", "count")}
+        for var_regex in (None, tracked):
+            parser = LogParser(var_regex=var_regex)
+            with self.subTest(tracked=bool(var_regex)):
+                expected = parser.parse_lines(data.decode("utf-8", errors="replace").split("\n"))
+                self.assertEqual(parser.parse_bytes(data), expected)
+                # lines without a keyword or pair are never decoded
+                self.assertNotIn("2025-11-23 12:00:04 INFO nothing to see", parser.candidate_lines(data))
+
+    def test_custom_var_regex_disables_prefilter(self):
+        import re
+        parser = LogParser(var_regex={"retries": re.compile(r"retries: (\d+)")})
+        self.assertIsNone(parser.prefilter)
+        self.assertEqual(parser.candidate_lines(b"a\nretries: 3"), ["a", "retries: 3"])
+
 
 if __name__ == "__main__":
     unittest.main()
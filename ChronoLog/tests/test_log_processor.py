@@ -1,6 +1,10 @@
 ﻿import unittest
+import unittest.mock
+import os
 import queue
-from src.log_processor import LogProcessor
+import tempfile
+import threading
+from src.log_processor import LogProcessor, _init_worker, _parse_range, _parse_stream, _queue_put
 
 
 class DummyPool:
@@ -21,17 +25,105 @@ class TestLogProcessor(unittest.TestCase):
         self.lp = LogProcessor(num_processes=1)
         self.lp.queue = queue.Queue()
 
-    def test_safe_queue_put_and_on_result(self):
-        # use _safe_queue_put directly
+    def test_queue_put(self):
         item = ("ev", "tl")
-        self.lp._safe_queue_put(item)
+        self.assertTrue(_queue_put(self.lp.queue, self.lp.stop_flag, item))
         got = self.lp.queue.get_nowait()
         self.assertEqual(got, item)
-        # test _on_result uses safe_queue_put
-        self.lp._on_result(({"ERROR": []}, [{"time": None, "event": "error", "msg": "m"}]))
-        ev, tl = self.lp.queue.get_nowait()
-        self.assertIsInstance(ev, dict)
-        self.assertIsInstance(tl, list)
+
+    def test_queue_put_drops_when_full_during_shutdown(self):
+        full = queue.Queue(maxsize=1)
+        full.put("occupied")
+        stop_flag = threading.Event()
+        stop_flag.set()
+        with unittest.mock.patch("builtins.print"):
+            self.assertFalse(_queue_put(full, stop_flag, "item", timeout=0.01))
+
+    def test_queue_put_spills_when_full(self):
+        full = queue.Queue(maxsize=1)
+        full.put("occupied")
+        spill = unittest.mock.Mock()
+        spill.spill.return_value = True
+        self.assertTrue(_queue_put(full, threading.Event(), "item", spill=spill))
+        spill.spill.assert_called_once_with("item")
+        self.assertEqual(full.get_nowait(), "occupied")
+
+    def test_queue_put_spills_instead_of_dropping_at_shutdown(self):
+        full = queue.Queue(maxsize=1)
+        full.put("occupied")
+        stop_flag = threading.Event()
+        stop_flag.set()
+        spill = unittest.mock.Mock()
+        spill.spill.return_value = True
+        self.assertTrue(_queue_put(full, stop_flag, "item", spill=spill))
+
+    def test_on_result_only_receives_receipt(self):
+        # workers enqueue payloads themselves; the parent only tracks counts
+        self.lp._inflight.acquire()
+        self.lp._on_result({"events": 2, "delivered": True, "parse_seconds": 0.01})
+        self.lp._inflight.acquire()
+        self.lp._on_result({"events": 5, "delivered": False, "parse_seconds": 0.01})
+        self.assertEqual(self.lp.stats["chunks_done"], 2)
+        self.assertEqual(self.lp.stats["events_enqueued"], 2)
+        self.assertEqual(self.lp.stats["dropped_chunks"], 1)
+        self.assertTrue(self.lp.queue.empty())
+
+    def test_on_result_feeds_parse_rate_to_sizer(self):
+        self.lp.sizer = unittest.mock.Mock()
+        self.lp._inflight.acquire()
+        self.lp._on_result({"events": 1, "delivered": True, "parse_seconds": 0.5}, nbytes=1000)
+        self.lp.sizer.record_parse.assert_called_once_with(1000, 0.5)
+
+    def test_empty_result_commits_its_range(self):
+        lp = LogProcessor(num_processes=1, checkpoint=False)
+        tracker = unittest.mock.Mock()
+        lp.checkpoints = {"key": tracker}
+        lp._inflight.acquire()
+        lp._on_result({"events": 0, "delivered": True, "parse_seconds": 0.0}, ("key", 0, 10))
+        lp._inflight.acquire()
+        lp._on_result({"events": 3, "delivered": True, "parse_seconds": 0.0}, ("key", 10, 20))
+        # rows of the second range are acknowledged by the writer after its flush
+        tracker.commit.assert_called_once_with("key", 0, 10)
+        # compressed inputs report the spans of their empty chunks in the receipt
+        lp._inflight.acquire()
+        lp._on_result({"events": 5, "delivered": True, "parse_seconds": 0.0,
+                       "empty_spans": [("key", 20, 30), ("other", 0, 5)], "length": ("key", 30)})
+        tracker.commit.assert_called_with("key", 20, 30)
+        self.assertEqual(tracker.commit.call_count, 2)
+        tracker.set_length.assert_called_once_with("key", 30)
+
+    def test_parse_stream_enqueues_compressed_file_in_chunks(self):
+        import gzip
+        path = os.path.join(tempfile.mkdtemp(), "app.log.gz")
+        lines = [b"2025-11-23 12:00:00 ERROR failed\n", b"2025-11-23 12:00:01 INFO idle\n"]
+        with gzip.open(path, "wb") as f:
+            f.writelines(lines)
+        try:
+            _init_worker(self.lp.queue, self.lp.stop_flag)
+            receipt = _parse_stream(path, file_key="key", chunk_size=1)
+            # offsets refer to the decompressed stream
+            end = len(lines[0]) + len(lines[1])
+            self.assertEqual((receipt["events"], receipt["delivered"]), (1, True))
+            self.assertEqual(receipt["empty_spans"], [("key", len(lines[0]), end)])
+            self.assertEqual(receipt["length"], ("key", end))
+            _, timeline, span = self.lp.queue.get_nowait()
+            self.assertEqual([t["event"] for t in timeline], ["error"])
+            self.assertEqual(span, ("key", 0, len(lines[0])))
+        finally:
+            os.unlink(path)
+
+    def test_parse_range_attaches_span(self):
+        tmp = tempfile.NamedTemporaryFile(mode="w", delete=False, encoding="utf-8")
+        line = "2025-11-23 12:00:00 ERROR Database connection failed\n"
+        tmp.write(line)
+        tmp.close()
+        try:
+            _init_worker(self.lp.queue, self.lp.stop_flag)
+            _parse_range(tmp.name, 0, len(line), file_key=(1, 2, 0))
+            _, timeline, span = self.lp.queue.get_nowait()
+            self.assertEqual(span, ((1, 2, 0), 0, len(line)))
+        finally:
+            os.unlink(tmp.name)
 
     def test_handle_interrupt_sets_stop_and_terminates_pool(self):
         pool = DummyPool()
@@ -42,6 +134,24 @@ class TestLogProcessor(unittest.TestCase):
         self.assertTrue(pool.terminated)
         self.assertTrue(pool.joined)
 
+    def test_parse_range_reads_only_its_range(self):
+        tmp = tempfile.NamedTemporaryFile(mode="w", delete=False, encoding="utf-8")
+        first = "2025-11-23 12:00:00 ERROR Database connection failed\n"
+        tmp.write(first)
+        tmp.write("2025-11-23 12:01:00 WARNING Memory usage high\n")
+        tmp.close()
+        try:
+            _init_worker(self.lp.queue, self.lp.stop_flag)
+            receipt = _parse_range(tmp.name, 0, len(first))
+            self.assertEqual((receipt["events"], receipt["delivered"]), (1, True))
+            self.assertGreater(receipt["parse_seconds"], 0)
+            events, timeline = self.lp.queue.get_nowait()
+            self.assertEqual(len(events["ERROR"]), 1)
+            self.assertEqual(events["WARNING"], [])
+            self.assertEqual([t["event"] for t in timeline], ["error"])
+        finally:
+            os.unlink(tmp.name)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+from src.masking import MessageMasker, template_report
+
+
+class TestMessageMasker(unittest.TestCase):
+    def setUp(self):
+        self.masker = MessageMasker()
+
+    def test_strips_timestamp_and_masks_numbers(self):
+        template, values = self.masker.mask("2025-11-23 12:00:00 WARNING CPU usage > 95%")
+        self.assertEqual(template, "WARNING CPU usage > {num}%")
+        self.assertEqual(values, ["95"])
+
+    def test_line_without_timestamp(self):
+        template, values = self.masker.mask("User 123 logged in from 10")
+        self.assertEqual(template, "User {num} logged in from {num}")
+        self.assertEqual(values, ["123", "10"])
+
+    def test_numbers_inside_words_are_kept(self):
+        template, values = self.masker.mask("ERROR node7 failed")
+        self.assertEqual(template, "ERROR node7 failed")
+        self.assertEqual(values, [])
+
+    def test_num_only_matches_previous_writer_templating(self):
+        import re
+        masker = MessageMasker(types=("num",))
+        line = "2025-11-23 12:00:00 ERROR code 42 at 3 of 7x 9 from 10.0.0.1"
+        stripped = re.sub(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2} ", "", line)
+        expected = (re.sub(r"\b\d+\b", "{num}", stripped), re.findall(r"\b\d+\b", stripped))
+        self.assertEqual(masker.mask(line), expected)
+
+    def test_typed_placeholders(self):
+        line = (
+            "2025-11-23 12:00:00 ERROR request 550e8400-e29b-41d4-a716-446655440000 from 10.0.0.12:8080 "
+            "took 250ms at 0x7ffe12 session deadbeef1234 file /var/log/app-1.log code 42"
+        )
+        template, values = self.masker.mask(line)
+        self.assertEqual(
+            template,
+            "ERROR request {uuid} from {ip} took {duration} at {hex} session {hex} file {path} code {num}"
+        )
+        self.assertEqual(values, [
+            "550e8400-e29b-41d4-a716-446655440000", "10.0.0.12:8080", "250ms",
+            "0x7ffe12", "deadbeef1234", "/var/log/app-1.log", "42"
+        ])
+
+    def test_plain_words_are_not_hex(self):
+        template, _ = self.masker.mask("WARNING cafebabe deadbeef")
+        self.assertEqual(template, "WARNING cafebabe deadbeef")
+
+    def test_unknown_type_rejected(self):
+        with self.assertRaises(ValueError):
+            MessageMasker(types=("num", "email"))
+
+    def test_template_report_counts_reduction(self):
+        lines = [f"2025-11-23 12:00:00 ERROR connect to 10.0.{i}.1 failed after {i * 10}ms\n" for i in range(1, 6)]
+        lines.append("2025-11-23 12:00:00 INFO ignored 1\n")
+        report = template_report(lines)
+        self.assertEqual(report["lines"], 6)
+        self.assertEqual(report["message_lines"], 5)
+        self.assertEqual(report["templates_num_only"], 5)
+        self.assertEqual(report["templates_typed"], 1)
+        self.assertAlmostEqual(report["reduction"], 0.8)
+        self.assertEqual(report["placeholders"], {"ip": 5, "duration": 5})
+
+
+if __name__ == "__main__":
+    unittest.main()
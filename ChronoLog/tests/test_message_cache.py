@@ -0,0 +1,34 @@
+import unittest
+from src.message_cache import MessageCache
+
+
+class TestMessageCache(unittest.TestCase):
+    def test_get_counts_hits_and_misses(self):
+        cache = MessageCache(max_size=10)
+        cache.put("A", 1)
+        self.assertEqual(cache.get("A"), 1)
+        self.assertIsNone(cache.get("B"))
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+    def test_evicts_least_recently_used(self):
+        cache = MessageCache(max_size=2)
+        cache.put("A", 1)
+        cache.put("B", 2)
+        cache.get("A") # A is now more recent than B
+        cache.put("C", 3)
+        self.assertIn("A", cache)
+        self.assertNotIn("B", cache)
+        self.assertIn("C", cache)
+        self.assertEqual(cache.evictions, 1)
+
+    def test_load_does_not_count_lookups(self):
+        cache = MessageCache(max_size=2)
+        cache.load({"A": 1, "B": 2, "C": 3})
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.hits + cache.misses, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import json
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from src.metrics import Metrics, collect, clear, render_prometheus, LATENCY_BUCKETS
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_histogram_buckets(self):
+        m = Metrics("ingest", directory=self.dir)
+        m.observe("parse_seconds", 0.003)
+        m.observe("parse_seconds", 100)
+        hist = m.histograms["parse_seconds"]
+        self.assertEqual(hist["buckets"][1], 1)
+        self.assertEqual(hist["buckets"][len(LATENCY_BUCKETS)], 1)
+        self.assertEqual(hist["count"], 2)
+
+    def test_collect_merges_processes(self):
+        for role, rows in (("writer", 10), ("writer2", 5)):
+            m = Metrics(role, directory=self.dir)
+            m.inc("rows_inserted_total", rows)
+            m.set("pending_rows", 1)
+            m.observe("insert_seconds", 0.02)
+            self.assertTrue(m.publish())
+        merged = collect(self.dir)
+        self.assertEqual(merged["counters"]["rows_inserted_total"], 15)
+        self.assertEqual(merged["gauges"]["pending_rows"], 2)
+        self.assertEqual(merged["histograms"]["insert_seconds"]["count"], 2)
+        self.assertEqual(merged["processes"], {"writer": 1, "writer2": 1})
+
+        # gauges of a process that stopped publishing are left out, its counters stay
+        merged = collect(self.dir, now=time.time() + 3600)
+        self.assertEqual(merged["gauges"], {})
+        self.assertEqual(merged["counters"]["rows_inserted_total"], 15)
+
+        clear(self.dir)
+        self.assertEqual(collect(self.dir)["counters"], {})
+
+    def test_publish_is_throttled(self):
+        m = Metrics("ingest", directory=self.dir, interval=3600)
+        self.assertTrue(m.publish())
+        m.inc("lines_read_total", 3)
+        self.assertFalse(m.publish())
+        self.assertTrue(m.publish(force=True))
+        path = next(self.dir.glob("ingest-*.json"))
+        self.assertEqual(json.loads(path.read_text())["counters"]["lines_read_total"], 3)
+
+    def test_render_prometheus(self):
+        m = Metrics("writer", directory=self.dir)
+        m.inc("rows_inserted_total", 7)
+        m.observe("insert_seconds", 0.02)
+        m.observe("insert_seconds", 0.2)
+        m.publish()
+        text = render_prometheus(collect(self.dir), {"stream_clients": ("Clients", 2)})
+        self.assertIn("# TYPE chronolog_rows_inserted_total counter\nchronolog_rows_inserted_total 7\n", text)
+        self.assertIn('chronolog_insert_seconds_bucket{le="0.025"} 1\n', text)
+        self.assertIn('chronolog_insert_seconds_bucket{le="+Inf"} 2\n', text)
+        self.assertIn("chronolog_insert_seconds_count 2\n", text)
+        self.assertIn('chronolog_processes{role="writer"} 1\n', text)
+        self.assertIn("chronolog_stream_clients 2\n", text)
+
+
+if __name__ == '__main__':
+    unittest.main()
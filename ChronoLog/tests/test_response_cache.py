@@ -0,0 +1,58 @@
+import unittest
+from unittest.mock import patch
+from src.response_cache import ResponseCache, make_etag
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.watermark = 1
+        self.calls = 0
+
+        def watermark_fn():
+            self.calls += 1
+            return self.watermark
+        self.cache = ResponseCache(watermark_fn, max_entries=2, ttl=60, watermark_interval=0)
+
+    def test_hit_until_watermark_moves(self):
+        etag = self.cache.put("a", b"body", self.cache.watermark())
+        self.assertEqual(etag, make_etag(b"body"))
+        self.assertEqual(self.cache.get("a"), (b"body", etag))
+        self.watermark = 2
+        self.assertIsNone(self.cache.get("a"))
+        self.assertEqual(self.cache.stats["invalidations"], 1)
+
+    def test_least_recently_used_is_evicted(self):
+        w = self.cache.watermark()
+        self.cache.put("a", b"1", w)
+        self.cache.put("b", b"2", w)
+        self.cache.get("a")
+        self.cache.put("c", b"3", w)
+        self.assertIsNone(self.cache.get("b"))
+        self.assertIsNotNone(self.cache.get("a"))
+        self.assertEqual(self.cache.stats["evictions"], 1)
+
+    def test_entries_expire_after_ttl(self):
+        self.cache.put("a", b"1", self.cache.watermark())
+        with patch("src.response_cache.time.monotonic", return_value=10 ** 9):
+            self.assertIsNone(self.cache.get("a"))
+
+    def test_watermark_is_polled_at_most_every_interval(self):
+        cache = ResponseCache(lambda: self.calls_inc(), watermark_interval=3600)
+        cache.watermark()
+        cache.watermark()
+        self.assertEqual(self.calls, 1)
+
+    def calls_inc(self):
+        self.calls += 1
+        return 1
+
+    def test_body_rendered_before_a_new_watermark_is_not_stored(self):
+        old = self.cache.watermark()
+        self.watermark = 2
+        self.cache.watermark()
+        self.cache.put("a", b"old", old)
+        self.assertIsNone(self.cache.get("a"))
+
+
+if __name__ == "__main__":
+    unittest.main()
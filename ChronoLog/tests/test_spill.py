@@ -0,0 +1,91 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from src.spill import SpillBuffer
+
+
+def dead_pid():
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    return proc.pid
+
+
+class TestSpillBuffer(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.spill = SpillBuffer(directory=os.path.join(self.dir, "spill"), max_bytes=10**6)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_segments_drain_oldest_first(self):
+        for i in range(3):
+            self.assertTrue(self.spill.spill(({}, [{"event": "e", "value": i}], ("key", i, i + 1))))
+        drained = []
+        while True:
+            path = self.spill.claim()
+            if path is None:
+                break
+            drained.extend(item[1][0]["value"] for item in self.spill.read(path))
+            self.spill.release(path)
+        self.assertEqual(drained, [0, 1, 2])
+        self.assertEqual(self.spill.size(), 0)
+
+    def test_claimed_segment_is_not_claimed_twice(self):
+        self.spill.spill(({}, []))
+        first = self.spill.claim()
+        self.assertIsNotNone(first)
+        self.assertIsNone(self.spill.claim())
+        self.assertFalse(self.spill.has_segments())
+
+    def test_refuses_beyond_max_bytes(self):
+        small = SpillBuffer(directory=self.spill.directory, max_bytes=200)
+        self.assertTrue(small.spill(({}, ["x" * 50])))
+        self.assertFalse(small.spill(({}, ["x" * 200])))
+        self.assertEqual(len(small.segments()), 1)
+
+    def _claim_by(self, pid):
+        path = self.spill.claim()
+        orphan = path.with_name(path.name.replace(f".claimed-{os.getpid()}", f".claimed-{pid}"))
+        os.rename(path, orphan)
+        return orphan
+
+    def test_recover_unclaims_leftovers(self):
+        pid = dead_pid()
+        self.spill.spill(({}, [1]))
+        self._claim_by(pid)
+        self.spill.spill(({}, [2]))
+        open(self.spill.directory / f"{0:020d}-{pid}.seg.tmp", "wb").close()
+        self.assertEqual(self.spill.recover(), 2)
+        drained = []
+        while (path := self.spill.claim()) is not None:
+            drained.extend(self.spill.read(path)[0][1])
+            self.spill.release(path)
+        self.assertEqual(drained, [1, 2])
+        self.assertEqual(self.spill.size(), 0)
+
+    def test_clear_removes_leftovers(self):
+        self.spill.spill(({}, []))
+        self._claim_by(dead_pid())
+        self.spill.spill(({}, []))
+        self.assertEqual(self.spill.clear(), 2)
+        self.assertEqual(self.spill.segments(), [])
+        self.assertEqual(os.listdir(self.spill.directory), [])
+
+    def test_leaves_live_claims_and_foreign_files_alone(self):
+        self.spill.spill(({}, [1]))
+        claimed = self.spill.claim()  # held by this (running) process
+        foreign = self.spill.directory / "notes.txt"
+        foreign.write_text("not a segment")
+        self.assertEqual(self.spill.recover(), 0)
+        self.assertEqual(self.spill.clear(), 0)
+        self.assertTrue(claimed.exists())
+        self.assertTrue(foreign.exists())
+        self.assertEqual(self.spill.size(), claimed.stat().st_size)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,164 @@
+import unittest
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from src.sqlite_backend import SQLiteBackend
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+
+class TestSQLiteBackend(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.backend = SQLiteBackend(os.path.join(self.tmp.name, "chronolog.db"))
+        self.start = datetime(2025, 1, 1, 10, 0, 0)
+
+    def tearDown(self):
+        self.backend.close()
+        self.tmp.cleanup()
+
+    def insert(self, count, msg_id=None):
+        # odd rows are latency measurements, even rows errors carrying the row number as message value
+        events = [
+            {
+                "time": (self.start + timedelta(seconds=7 * i)).isoformat(),
+                "event": "latency" if i % 2 else "error",
+                "msg_id": msg_id,
+                "msg_values": json.dumps([str(i)]),
+                "value": i * 1.5 if i % 2 else None,
+            }
+            for i in range(count)
+        ]
+        self.backend.bulk_insert_timeline_events(events)
+
+    def test_template_upsert_returns_stable_ids(self):
+        first = self.backend.get_or_create_message_ids(["a <*>", "b", "a <*>"])
+        again = self.backend.get_or_create_message_ids(["b", "c"])
+        self.assertEqual(again["b"], first["b"])
+        self.assertNotIn(again["c"], first.values())
+        self.assertEqual(self.backend.get_or_create_message_id("a <*>"), first["a <*>"])
+        self.assertEqual(self.backend.get_messages()[str(first["b"])], "b")
+        self.assertEqual(set(self.backend.get_message_ids(2)), {"b", "c"})
+
+    def test_bulk_insert_updates_summary_and_watermark(self):
+        before = self.backend.get_ingest_watermark()
+        self.insert(100)
+        self.insert(10)
+        summary = self.backend.get_summary()
+        self.assertEqual(summary["timeline_count"], 110)
+        self.assertEqual(summary["error_count"], 55)
+        self.assertEqual(summary["latency_metrics"]["count"], 55)
+        self.assertAlmostEqual(summary["latency_metrics"]["average"], (75 * 50 + 7.5 * 5) / 55, places=2)
+        self.assertNotEqual(self.backend.get_ingest_watermark(), before)
+
+        self.backend.delete_event_type("error")
+        self.assertEqual(self.backend.get_summary()["timeline_count"], 55)
+        self.assertEqual(self.backend.get_timeline_page(event_type="error"), [])
+
+    def test_timeline_offset_and_keyset_pages(self):
+        msg_id = self.backend.get_or_create_message_id("value <*>")
+        self.insert(50, msg_id)
+        page = self.backend.get_timeline_page(page=2, per_page=5)
+        self.assertEqual([row["id"] for row in page], [45, 44, 43, 42, 41])
+        self.assertEqual(page[0]["total_count"], 50)
+        self.assertEqual(page[0]["template"], "value <*>")
+        self.assertEqual(page[0]["msg_values"], ["44"])
+        self.assertIsInstance(page[0]["time"], datetime)
+
+        older = self.backend.get_timeline_page(before_id=41, per_page=3, event_type="error")
+        self.assertEqual([row["id"] for row in older], [39, 37, 35])
+        self.assertIsNone(older[0]["total_count"])
+        newer = self.backend.get_timeline_page(after_id=10, per_page=3, keyset=True, include_total=True)
+        self.assertEqual([row["id"] for row in newer], [13, 12, 11])
+        self.assertEqual(newer[0]["total_count"], 50)
+
+    def test_timeseries_latest_and_buckets(self):
+        msg_id = self.backend.get_or_create_message_id("value <*>")
+        self.insert(100, msg_id)
+        latest = self.backend.get_timeseries("latency", limit=2)
+        self.assertEqual(latest, [
+            {"time": datetime(2025, 1, 1, 10, 11), "value": 145.5},
+            {"time": datetime(2025, 1, 1, 10, 10), "value": 135.0},
+        ])
+        buckets = self.backend.get_timeseries("latency", points=4)
+        self.assertEqual(len(buckets), 4)
+        self.assertEqual(sum(b["count"] for b in buckets), 50)
+        self.assertEqual((buckets[0]["min"], buckets[-1]["max"]), (1.5, 148.5))
+        self.assertEqual(buckets[1]["time"] - buckets[0]["time"], timedelta(minutes=3))
+
+        raw = self.backend.get_timeseries(f"msg_{msg_id}", points=3, mode="lttb")
+        self.assertEqual(len(raw), 3)
+        self.assertEqual(self.backend.get_timeseries(f"msg_{msg_id}", limit=1)[0]["value"], 99.0)
+        self.assertEqual(self.backend.get_timeseries("latency", start=datetime(2030, 1, 1), end=datetime(2030, 1, 2)), [])
+
+    def test_purge_expired_drops_old_events_and_rollups(self):
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.start = today - timedelta(days=5, minutes=1)
+        self.insert(20)
+        self.start = today - timedelta(hours=1)
+        self.insert(10)
+        self.assertEqual(self.backend.purge_expired(0), [])
+
+        purged = self.backend.purge_expired(3)
+        self.assertEqual([(p["end"], p["rows"]) for p in purged], [(today - timedelta(days=3), 20)])
+        summary = self.backend.get_summary()
+        self.assertEqual(summary["timeline_count"], 10)
+        self.assertAlmostEqual(summary["latency_metrics"]["average"], 7.5, places=2)
+        self.assertTrue(all(p["time"] >= self.start for p in self.backend.get_timeseries("latency", points=10)))
+        self.assertEqual(self.backend.purge_expired(3), [])
+
+    def test_refused_batch_inserts_nothing(self):
+        from storage import RowsRejectedError
+        self.insert(3)
+        bad = {"time": "not a time", "event": "latency", "msg_id": None, "msg_values": None, "value": "n/a"}
+        with self.assertRaises(RowsRejectedError):
+            self.backend.bulk_insert_timeline_events([{"time": self.start.isoformat(), "event": "latency",
+                                                       "msg_id": None, "msg_values": None, "value": 1}, bad])
+        self.assertEqual(self.backend.get_summary()["timeline_count"], 3)
+
+    def test_checkpoints_are_recorded_with_the_rows(self):
+        key, other = (2049, 131, 1), (2049, 131, 0)
+        row = {"time": self.start.isoformat(), "event": "latency", "msg_id": None, "msg_values": None, "value": 1}
+        self.backend.bulk_insert_timeline_events([row], checkpoints=[(key, 40, 80), (key, 0, 40), (other, 0, 10)])
+        with self.assertRaises(Exception):
+            self.backend.bulk_insert_timeline_events([row, dict(row, time="not a time")], checkpoints=[(key, 80, 90)])
+        self.assertEqual(self.backend.get_ingest_checkpoints(key), [(0, 40), (40, 80)])
+
+        # other generations of the file and ranges up to the saved offset go
+        self.backend.prune_ingest_checkpoints(key, 40)
+        self.assertEqual(self.backend.get_ingest_checkpoints(key), [(40, 80)])
+        self.assertEqual(self.backend.get_ingest_checkpoints(other), [])
+        self.backend.prune_ingest_checkpoints(key)
+        self.assertEqual(self.backend.get_ingest_checkpoints(key), [])
+
+    def test_pickled_backend_opens_its_own_connection(self):
+        self.insert(4)
+        clone = pickle.loads(pickle.dumps(self.backend))
+        self.assertEqual(clone.get_summary()["timeline_count"], 4)
+        clone.close()
+
+
+class TestWithoutPyodbc(unittest.TestCase):
+    def test_sqlite_path_imports_without_pyodbc(self):
+        # a None entry in sys.modules makes "import pyodbc" raise ImportError, like a host without unixODBC
+        code = (
+            "import sys; sys.modules['pyodbc'] = None\n"
+            "import storage, writer_process, api\n"
+            "backend = storage.create_storage()\n"
+            "assert type(backend).__name__ == 'SQLiteBackend'\n"
+            "assert backend.get_summary()['timeline_count'] == 0\n"
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, PYTHONPATH=SRC_DIR, STORAGE_BACKEND="sqlite",
+                       SQLITE_PATH=os.path.join(tmp, "chronolog.db"), METRICS_DIR=os.path.join(tmp, "metrics"))
+            result = subprocess.run([sys.executable, "-c", code], cwd=tmp, env=env, capture_output=True,
+                                    text=True, timeout=60)
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,7 +2,7 @@
 class TestWriterProcess(unittest.TestCase):
     def setUp(self):
         # Patch the facade class where it is imported in writer_process
-        self.facade_patcher = patch('src.writer_process.ChronoLogFacade')
+        self.facade_patcher = patch('src.writer_process.create_storage')
         self.MockFacade = self.facade_patcher.start()
         self.mock_facade_instance = self.MockFacade.return_value
         
@@ -86,14 +86,16 @@ class TestWriterProcess(unittest.TestCase):
         q.get.return_value = None # Simulate empty or None
 import unittest
 from unittest.mock import MagicMock, patch
+import json
+import os
 import queue
 import time
-from src.writer_process import WriterProcess
+from src.writer_process import WriterProcess, RowsRejectedError
 
 class TestWriterProcess(unittest.TestCase):
     def setUp(self):
         # Patch the facade class where it is imported in writer_process
-        self.facade_patcher = patch('src.writer_process.ChronoLogFacade')
+        self.facade_patcher = patch('src.writer_process.create_storage')
         self.MockFacade = self.facade_patcher.start()
         self.mock_facade_instance = self.MockFacade.return_value
         
@@ -107,48 +109,82 @@ class TestWriterProcess(unittest.TestCase):
         """Test initialization of WriterProcess."""
         self.assertEqual(self.wp.flush_interval, 0.01)
         self.assertEqual(self.wp.facade, self.mock_facade_instance)
-        self.assertEqual(self.wp.msg_cache, {})
+        self.assertEqual(len(self.wp.msg_cache), 0)
+        self.assertEqual(self.wp.pending, [])
 
     def test_prepare_entry_valid(self):
         """Test _prepare_entry with valid data."""
         entry = {
             "time": "2023-10-27T10:00:00",
             "event": "INFO",
-            "msg": "2023-10-27 10:00:00 INFO User 123 logged in",
-            "value": None
+            "template": "INFO User {num} logged in",
+            "values": ["123"]
         }
         
-        # Mock facade behavior
-        self.mock_facade_instance.get_or_create_message_id.return_value = 5
-        
         result = self.wp._prepare_entry(entry)
         
         self.assertEqual(result["time"], "2023-10-27T10:00:00")
         self.assertEqual(result["event"], "INFO")
-        self.assertEqual(result["msg_id"], 5)
+        self.assertEqual(result["template"], "INFO User {num} logged in")
         self.assertEqual(result["msg_values"], '["123"]') # JSON string
         self.assertIsNone(result["value"])
         
-        # Verify cache interaction
-        self.mock_facade_instance.get_or_create_message_id.assert_called_with("INFO User {num} logged in")
-        self.assertEqual(self.wp.msg_cache["INFO User {num} logged in"], 5)
+        # IDs are resolved per batch at flush time, never per entry
+        self.mock_facade_instance.get_or_create_message_ids.assert_not_called()
+        self.mock_facade_instance.get_or_create_message_id.assert_not_called()
 
-    def test_prepare_entry_cached(self):
-        """Test _prepare_entry uses local cache."""
-        entry = {
-            "time": "2023-10-27T10:00:00",
-            "event": "INFO",
-            "msg": "2023-10-27 10:00:00 INFO User 123 logged in",
-            "value": None
-        }
+    def test_prepare_entry_without_values(self):
+        """Test templates without variable parts store no values."""
+        result = self.wp._prepare_entry({"time": None, "event": "error", "template": "ERROR Disk write error", "values": []})
+        self.assertEqual(result["template"], "ERROR Disk write error")
+        self.assertIsNone(result["msg_values"])
+
+    def test_prepare_entry_caps_oversize_values(self):
+        """Test values longer than the MessageValues column are trimmed to valid JSON."""
+        from src.storage import MAX_VALUES_LENGTH
+        values = ["42", "x" * 2000, "\u00e9" * 300]
+        result = self.wp._prepare_entry({"time": None, "event": "error", "template": "a <*> b <*> c <*>", "values": values})
+        self.assertLessEqual(len(result["msg_values"]), MAX_VALUES_LENGTH)
+        decoded = json.loads(result["msg_values"])
+        self.assertEqual(decoded[0], "42")
+        self.assertTrue(values[1].startswith(decoded[1]))
+
+        many = self.wp._prepare_entry({"time": None, "event": "error", "template": "t", "values": [""] * 200})
+        self.assertLessEqual(len(many["msg_values"]), MAX_VALUES_LENGTH)
+        self.assertEqual(json.loads(many["msg_values"]), [""] * 125)
+
+    def test_resolve_message_ids_uses_cache(self):
+        """Test cached templates need no database round trip."""
+        self.wp.msg_cache.put("INFO User {num} logged in", 10)
+        rows = [{"msg_id": None, "template": "INFO User {num} logged in"}, {"msg_id": None, "template": None}]
         
-        # Pre-populate cache
-        self.wp.msg_cache["INFO User {num} logged in"] = 10
+        self.wp._resolve_message_ids(rows)
         
-        result = self.wp._prepare_entry(entry)
+        self.assertEqual(rows, [{"msg_id": 10}, {"msg_id": None}])
+        self.mock_facade_instance.get_or_create_message_ids.assert_not_called()
+        self.assertEqual(self.wp.msg_cache.hits, 1)
+
+    def test_resolve_message_ids_single_round_trip(self):
+        """Test unknown templates of a batch are resolved together."""
+        self.mock_facade_instance.get_or_create_message_ids.return_value = {"A {num}": 1, "B": 2}
+        rows = [
+            {"msg_id": None, "template": "A {num}"},
+            {"msg_id": None, "template": "B"},
+            {"msg_id": None, "template": "A {num}"},
+        ]
         
-        self.assertEqual(result["msg_id"], 10)
-        self.mock_facade_instance.get_or_create_message_id.assert_not_called()
+        self.wp._resolve_message_ids(rows)
+        
+        self.mock_facade_instance.get_or_create_message_ids.assert_called_once_with({"A {num}", "B"})
+        self.assertEqual([r["msg_id"] for r in rows], [1, 2, 1])
+        self.assertEqual(self.wp.msg_cache.get("B"), 2)
+
+    def test_preload_messages(self):
+        """Test the cache is filled from the Messages table at startup."""
+        self.mock_facade_instance.get_message_ids.return_value = {"ERROR Disk write error": 5}
+        with patch('builtins.print'):
+            self.wp._preload_messages()
+        self.assertEqual(self.wp.msg_cache.get("ERROR Disk write error"), 5)
 
     def test_process_queue_bulk_insert(self):
         """Test _process_queue calls bulk_insert_timeline_events."""
@@ -156,20 +192,27 @@ class TestWriterProcess(unittest.TestCase):
         
         events = {"INFO": ["User 123 logged in"]}
         timeline = [
-            {"time": "2023-10-27T10:00:00", "event": "INFO", "msg": "2023-10-27 10:00:00 INFO User 123 logged in", "value": None},
-            {"time": "2023-10-27T10:00:01", "event": "INFO", "msg": "2023-10-27 10:00:01 INFO User 456 logged in", "value": None}
+            {"time": "2023-10-27T10:00:00", "event": "INFO", "template": "INFO User {num} logged in", "values": ["123"]},
+            {"time": "2023-10-27T10:00:01", "event": "INFO", "template": "INFO User {num} logged in", "values": ["456"]}
         ]
         q.put((events, timeline))
         
-        self.mock_facade_instance.get_or_create_message_id.return_value = 1
+        self.mock_facade_instance.get_or_create_message_ids.return_value = {"INFO User {num} logged in": 1}
         
         self.wp._process_queue(q)
+        # rows are buffered until a flush condition is met
+        self.mock_facade_instance.bulk_insert_timeline_events.assert_not_called()
+        self.assertEqual(len(self.wp.pending), 2)
+
+        self.wp._flush("shutdown")
         
         self.mock_facade_instance.bulk_insert_timeline_events.assert_called_once()
         call_args = self.mock_facade_instance.bulk_insert_timeline_events.call_args[0][0]
         self.assertEqual(len(call_args), 2)
         self.assertEqual(call_args[0]["msg_values"], '["123"]')
         self.assertEqual(call_args[1]["msg_values"], '["456"]')
+        self.assertEqual([row["msg_id"] for row in call_args], [1, 1])
+        self.mock_facade_instance.get_or_create_message_ids.assert_called_once()
 
     def test_process_queue_empty_item(self):
         """Test _process_queue handles None/empty item gracefully."""
@@ -180,13 +223,238 @@ class TestWriterProcess(unittest.TestCase):
         
         self.mock_facade_instance.bulk_insert_timeline_events.assert_not_called()
 
+    def _timeline(self, n):
+        return [
+            {"time": "2023-10-27T10:00:00", "event": "latency", "value": i}
+            for i in range(n)
+        ]
+
+    def test_flush_on_row_count(self):
+        wp = WriterProcess(flush_interval=60, batch_rows=3, batch_bytes=10**9)
+        q = queue.Queue()
+        q.put(({}, self._timeline(2)))
+        q.put(({}, self._timeline(2)))
+        wp._process_queue(q)
+        self.mock_facade_instance.bulk_insert_timeline_events.assert_not_called()
+        wp._process_queue(q)
+        # rows accumulate across queue items into one insert
+        rows = self.mock_facade_instance.bulk_insert_timeline_events.call_args[0][0]
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(wp.flush_stats["reasons"], {"rows": 1})
+
+    def test_flush_on_byte_size(self):
+        wp = WriterProcess(flush_interval=60, batch_rows=10**6, batch_bytes=1)
+        q = queue.Queue()
+        q.put(({}, self._timeline(1)))
+        wp._process_queue(q)
+        self.mock_facade_instance.bulk_insert_timeline_events.assert_called_once()
+        self.assertEqual(wp.flush_stats["reasons"], {"bytes": 1})
+
+    def test_flush_on_interval(self):
+        wp = WriterProcess(flush_interval=0.05, batch_rows=10**6, batch_bytes=10**9)
+        q = queue.Queue()
+        q.put(({}, self._timeline(1)))
+        wp._process_queue(q)
+        self.mock_facade_instance.bulk_insert_timeline_events.assert_not_called()
+        time.sleep(0.06)
+        wp._process_queue(q) # empty queue, the pending batch is now due
+        self.mock_facade_instance.bulk_insert_timeline_events.assert_called_once()
+        self.assertEqual(wp.flush_stats["reasons"], {"interval": 1})
+        self.assertEqual(wp.flush_stats["rows"], 1)
+
+    def test_failed_flush_is_counted(self):
+        self.mock_facade_instance.bulk_insert_timeline_events.side_effect = Exception("db down")
+        self.wp._add_row({"time": "2023-10-27T10:00:00", "event": "latency", "msg_id": None, "msg_values": None, "value": 1})
+        with patch("builtins.print"):
+            self.wp._flush("shutdown")
+        self.assertEqual(self.wp.flush_stats["failed"], 1)
+        self.assertEqual(self.wp.flush_stats["flushes"], 0)
+
+    def test_flush_acknowledges_spans(self):
+        acks = queue.Queue()
+        self.wp.ack_queue = acks
+        q = queue.Queue()
+        q.put(({}, self._timeline(2), ("key", 0, 100)))
+        q.put(({}, self._timeline(1), ("key", 100, 150)))
+        self.wp._process_queue(q)
+        self.wp._process_queue(q)
+        self.assertTrue(acks.empty())
+        self.wp._flush("shutdown")
+        self.assertEqual(acks.get_nowait(), [("key", 0, 100), ("key", 100, 150)])
+
+    def test_failed_flush_is_kept_and_retried(self):
+        insert = self.mock_facade_instance.bulk_insert_timeline_events
+        insert.side_effect = Exception("db down")
+        acks = queue.Queue()
+        self.wp.ack_queue = acks
+        q = queue.Queue()
+        q.put(({}, self._timeline(2), ("key", 0, 100)))
+        self.wp._process_queue(q)
+        with patch("builtins.print"):
+            self.assertFalse(self.wp._flush("interval"))
+        self.assertTrue(acks.empty())
+        self.assertEqual(len(self.wp.pending), 2)
+        self.assertEqual(self.wp._flush_reason(), None)  # backing off
+
+        # no new rows are taken until the batch is in
+        q.put(({}, self._timeline(1), ("key", 100, 150)))
+        self.wp._process_queue(q)
+        self.assertEqual(q.qsize(), 1)
+
+        insert.side_effect = None
+        self.wp.retry_at = time.monotonic()
+        self.wp._process_queue(q)
+        self.assertEqual(len(insert.call_args[0][0]), 2)
+        self.assertEqual(acks.get_nowait(), [("key", 0, 100)])
+        self.assertEqual(self.wp.flush_stats["reasons"], {"retry": 1})
+        self.assertIsNone(self.wp.retry_at)
+        self.assertEqual(self.wp.pending, [])
+
+    def test_retry_backoff_doubles_up_to_the_maximum(self):
+        self.mock_facade_instance.bulk_insert_timeline_events.side_effect = Exception("db down")
+        self.wp._add_item(({}, self._timeline(1)))
+        delays = []
+        with patch("builtins.print"), patch("src.writer_process.WRITER_RETRY_SECONDS", 1), \
+                patch("src.writer_process.WRITER_RETRY_MAX_SECONDS", 5):
+            for _ in range(5):
+                self.wp._flush("retry")
+                delays.append(self.wp.retry_delay)
+        self.assertEqual(delays, [1, 2, 4, 5, 5])
+
+    def test_refused_rows_are_isolated(self):
+        bad = 7
+
+        def insert(rows, checkpoints=None):
+            if any(row["value"] == bad for row in rows):
+                raise RowsRejectedError("arithmetic overflow")
+            inserted.extend(row["value"] for row in rows)
+            recorded.append(checkpoints)
+
+        inserted, recorded = [], []
+        self.mock_facade_instance.bulk_insert_timeline_events.side_effect = insert
+        acks = queue.Queue()
+        self.wp.ack_queue = acks
+        self.wp._add_item(({}, self._timeline(4), ("key", 0, 40)))
+        self.wp._add_item(({}, [{"time": "t", "event": "latency", "value": i} for i in range(4, 10)], ("key", 40, 100)))
+        self.wp._add_item(({}, self._timeline(2), ("key", 100, 120)))
+
+        with patch("builtins.print"):
+            self.assertTrue(self.wp._flush("rows"))
+        self.assertEqual(inserted, [0, 1, 2, 3, 4, 5, 6, 8, 9, 0, 1])
+        self.assertEqual(self.wp.flush_stats["rejected"], 1)
+        self.assertEqual(self.wp.flush_stats["rows"], 11)
+        spans = []
+        while not acks.empty():
+            spans.extend(acks.get_nowait())
+        self.assertEqual(spans, [("key", 0, 40), ("key", 40, 100), ("key", 100, 120)])
+        self.assertEqual((self.wp.pending, self.wp.pending_items), ([], []))
+        # whole items are recorded with their rows; the split one with the insert that completes it
+        self.assertEqual(recorded, [[("key", 0, 40)], None, [("key", 40, 100), ("key", 100, 120)]])
+
+    def test_error_after_split_retries_only_the_rest(self):
+        calls = []
+
+        def insert(rows, checkpoints=None):
+            calls.append(len(rows))
+            if len(calls) == 1:
+                raise RowsRejectedError("bad value")
+            if len(calls) == 3:
+                raise Exception("connection lost")
+
+        self.mock_facade_instance.bulk_insert_timeline_events.side_effect = insert
+        self.wp._add_item(({}, self._timeline(2), ("key", 0, 20)))
+        self.wp._add_item(({}, self._timeline(3), ("key", 20, 50)))
+        with patch("builtins.print"):
+            self.assertFalse(self.wp._flush("rows"))
+        # the first item went in on its own; the second waits for the retry
+        self.assertEqual(calls, [5, 2, 3])
+        self.assertEqual(len(self.wp.pending), 3)
+        self.assertEqual(self.wp.pending_items, [[3, ("key", 20, 50)]])
+
+    def _spill_buffer(self):
+        import tempfile, shutil
+        from src.spill import SpillBuffer
+        spill_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, spill_dir, True)
+        return SpillBuffer(directory=spill_dir)
+
+    def test_spilled_segments_drain_before_queue_items(self):
+        spill = self._spill_buffer()
+        spill.spill(({}, self._timeline(3), ("key", 0, 30)))
+        wp = WriterProcess(flush_interval=60, spill=spill)
+        wp.ack_queue = queue.Queue()
+        q = queue.Queue()
+        q.put(({}, self._timeline(1), ("key", 30, 40)))
+        wp._process_queue(q)
+        rows = self.mock_facade_instance.bulk_insert_timeline_events.call_args[0][0]
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(q.qsize(), 1)  # the newer queued item waits for the next call
+        self.assertEqual(wp.flush_stats["reasons"], {"spill": 1})
+        self.assertEqual(wp.ack_queue.get_nowait(), [("key", 0, 30)])
+        self.assertEqual(spill.segments(), [])
+        self.assertEqual(spill.size(), 0)
+
+    def test_queue_rows_are_flushed_before_a_segment(self):
+        spill = self._spill_buffer()
+        insert = self.mock_facade_instance.bulk_insert_timeline_events
+        wp = WriterProcess(flush_interval=60, spill=spill)
+        wp._add_item(({}, self._timeline(2), ("key", 0, 20)))
+        spill.spill(({}, self._timeline(3), ("key", 20, 50)))
+        insert.side_effect = [None, Exception("db down")]
+        with patch("builtins.print"):
+            self.assertFalse(wp._drain_spill())
+        # the queue rows went in on their own; only the segment's rows wait for the retry
+        self.assertEqual([len(c[0][0]) for c in insert.call_args_list], [2, 3])
+        self.assertEqual(len(wp.pending), 3)
+        self.assertIsNotNone(wp.spill_segment)
+
+    def test_unreadable_segment_is_quarantined(self):
+        spill = self._spill_buffer()
+        spill.spill(({}, self._timeline(3), ("key", 0, 30)))
+        wp = WriterProcess(flush_interval=60, spill=spill)
+        with patch.object(spill, "read", side_effect=ValueError("bad pickle")), patch("builtins.print"):
+            self.assertTrue(wp._drain_spill())
+        self.assertEqual(spill.segments(), [])
+        self.assertEqual([p.endswith(".seg.bad") for p in os.listdir(spill.directory)], [True])
+        self.mock_facade_instance.bulk_insert_timeline_events.assert_not_called()
+
+    def test_failed_spill_insert_keeps_segment(self):
+        spill = self._spill_buffer()
+        spill.spill(({}, self._timeline(3), ("key", 0, 30)))
+        self.mock_facade_instance.bulk_insert_timeline_events.side_effect = Exception("db down")
+        wp = WriterProcess(flush_interval=60, spill=spill)
+        with patch("builtins.print"):
+            self.assertFalse(wp._drain_spill())
+        # still claimed by this writer until its rows are in
+        self.assertEqual(spill.segments(), [])
+        self.assertGreater(spill.size(), 0)
+        self.assertFalse(wp._spill_ready())
+
+        self.mock_facade_instance.bulk_insert_timeline_events.side_effect = None
+        wp.retry_at = time.monotonic()
+        wp._process_queue(queue.Queue())
+        self.assertEqual(wp.flush_stats["rows"], 3)
+        self.assertEqual(spill.size(), 0)
+
     def test_process_queue_exception(self):
         """Test _process_queue handles exceptions."""
         q = MagicMock()
         q.get.side_effect = Exception("Queue error")
         
+        self.wp.metrics = MagicMock()
         # Should not raise exception
-        self.wp._process_queue(q)
+        with patch("builtins.print") as mock_print:
+            self.wp._process_queue(q)
+        self.wp.metrics.inc.assert_called_once_with("writer_errors_total", 1)
+        self.assertIn("Queue error", mock_print.call_args[0][0])
+
+    def test_flush_does_not_print(self):
+        """Test successful flushes are only recorded as metrics, not printed."""
+        self.wp.pending = [{"time": "t", "event": "error", "msg_id": None, "template": None, "msg_values": None, "value": None}]
+        with patch("builtins.print") as mock_print:
+            self.assertTrue(self.wp._flush("interval"))
+        mock_print.assert_not_called()
+        self.assertEqual(self.wp.flush_stats["flushes"], 1)
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file